@@ -0,0 +1,74 @@
+"""
+Benchmark for the gallery output encoding profiles.
+
+Renders a gallery card around a synthetic photo-like drawing and a theme
+banner, then encodes each with every profile in `ENCODING_PROFILES`,
+reporting encode time and output size. Sizes are without the upload-limit
+fallback, so they show what each profile produces on its own.
+
+Usage:
+    python benchmarks/bench_image_encoding.py [iterations] [drawing_size]
+"""
+
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from PIL import Image, ImageFilter
+
+from circle_sketch.gallery import gallery
+from circle_sketch.gallery.encoding import ENCODING_PROFILES, encode_image
+
+
+def photo_like(size):
+    """Noise over a gradient, softened a little: compresses like a phone photo."""
+    gradient = Image.linear_gradient('L').resize(size)
+    noise = Image.effect_noise(size, 48)
+    return Image.merge('RGB', (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT))).filter(ImageFilter.GaussianBlur(1))
+
+
+def capture_canvas(render, *args):
+    """Run a render_* function and return the canvas it would have encoded."""
+    captured = {}
+    real_encode = gallery.encode_image
+
+    def capture(image, profile_name, *rest, **kwargs):
+        captured['image'] = image
+        return b''
+
+    gallery.encode_image = capture
+    try:
+        render(*args)
+    finally:
+        gallery.encode_image = real_encode
+    return captured['image']
+
+
+def run(label, image, iterations):
+    print(f"{label} ({image.width}x{image.height})")
+    for name in ENCODING_PROFILES:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            data = encode_image(image, name, max_bytes=float('inf'))
+        elapsed = (time.perf_counter() - start) / iterations
+        print(f"  {name:<14} {elapsed * 1000:>8.1f} ms  {len(data) / 1024:>9.1f} KiB")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 1600
+    drawing = io.BytesIO()
+    photo_like((size, size * 3 // 4)).save(drawing, format='JPEG', quality=92)
+    avatar = io.BytesIO()
+    photo_like((128, 128)).save(avatar, format='PNG')
+    card = capture_canvas(gallery.render_gallery_card, 'Benchmark', '2025-01-01', 'Player', avatar.getvalue(), drawing.getvalue())
+    banner = capture_canvas(gallery.render_theme_announcement, 'Benchmark')
+    run('gallery card', card, iterations)
+    run('theme banner', banner, iterations)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark for the SQLite storage backend.
+
+Compares the old connect-per-call pattern against the pooled, long-lived
+connections now used by `Storage`. Runs against a throwaway database so it
+never touches your real `storage.sqlite3`.
+
+Usage:
+    python benchmarks/bench_storage_sqlite.py [iterations]
+"""
+
+import os
+import sys
+import sqlite3
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+_tmpdir = tempfile.mkdtemp(prefix='circle_sketch_bench_')
+os.environ['CIRCLE_SKETCH_SQLITE_PATH'] = os.path.join(_tmpdir, 'bench.sqlite3')
+
+from circle_sketch.storage import storage_sqlite
+from circle_sketch.storage.storage_sqlite import Storage
+
+
+def legacy_get_conn():
+    """The previous behaviour: a fresh connection for every storage call."""
+    conn = sqlite3.connect(storage_sqlite.DB_PATH)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def workload(get_conn, i):
+    # Mirrors a DM submission: read state, read streak, write streak.
+    conn = get_conn()
+    conn.execute('SELECT state FROM game_state WHERE guild_id=0').fetchone()
+    conn.close()
+    conn = get_conn()
+    conn.execute('SELECT streak FROM user_streaks WHERE guild_id=0 AND user_id=?', (i % 50,)).fetchone()
+    conn.close()
+    conn = get_conn()
+    conn.execute('INSERT INTO user_streaks (guild_id, user_id, streak) VALUES (0, ?, ?) ON CONFLICT(guild_id, user_id) DO UPDATE SET streak=?', (i % 50, i, i))
+    conn.commit()
+    conn.close()
+
+
+def run(label, get_conn, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        workload(get_conn, i)
+    elapsed = time.perf_counter() - start
+    ops = iterations * 3
+    print(f"{label:<10} {ops / elapsed:>12,.0f} ops/sec  ({elapsed * 1000:.1f} ms for {ops} ops)")
+    return ops / elapsed
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    Storage.set_game_state({'theme': 'Benchmark', 'date': '2025-01-01', 'user_ids': list(range(50))})
+    before = run('before', legacy_get_conn, iterations)
+    after = run('after', Storage._get_conn, iterations)
+    print(f"speedup    {after / before:>12.1f}x")
+    Storage.close_connections()
+
+
+if __name__ == '__main__':
+    main()
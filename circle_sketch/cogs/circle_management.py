@@ -15,8 +15,10 @@ queue_listener.start()
 import discord
 from discord import app_commands, Interaction
 from discord.ext import commands
-from ..storage.storage import Storage
-from ..config import CIRCLE_LIMIT, GAME_CHANNEL_ID
+from ..storage.storage import AsyncStorage, game_state_cache
+from ..storage.errors import CircleFullError
+from ..config import CIRCLE_LIMIT
+from ..guild_settings import get_game_channel
 from ..gallery.gallery import make_gallery_image, make_theme_announcement_image
 from ..prompts import PROMPT_LIST
 import random
@@ -39,40 +41,33 @@ class CircleManagement(commands.Cog):
             responded = True
             user_id = interaction.user.id
             username = interaction.user.display_name
-            circle = Storage.get_player_circle(interaction.guild.id)
-            logger.debug(f"Fetched circle for guild {interaction.guild.id}: {circle}")
-            if user_id in circle:
+            try:
+                added, size = await AsyncStorage.add_to_circle(interaction.guild.id, user_id, CIRCLE_LIMIT)
+            except CircleFullError:
+                logger.debug(f"Circle full for guild {interaction.guild.id}")
+                await interaction.followup.send(f"Sorry, the circle is full ({CIRCLE_LIMIT}/10). A spot will open when someone leaves.", ephemeral=True)
+                responded = True
+                logger.warning("Circle is full. User could not join.")
+                return
+            if not added:
                 logger.debug(f"User {user_id} already in circle for guild {interaction.guild.id}")
                 await interaction.followup.send("You are already in the circle.", ephemeral=True)
                 responded = True
                 logger.info(f"User {user_id} attempted to join but is already in the circle.")
                 return
-            if len(circle) >= CIRCLE_LIMIT:
-                logger.debug(f"Circle full for guild {interaction.guild.id}: {circle}")
-                await interaction.followup.send(f"Sorry, the circle is full ({CIRCLE_LIMIT}/10). A spot will open when someone leaves.", ephemeral=True)
-                responded = True
-                logger.warning("Circle is full. User could not join.")
-                return
-            circle.append(user_id)
-            logger.debug(f"Adding user {user_id} to circle for guild {interaction.guild.id}: {circle}")
-            Storage.set_player_circle(interaction.guild.id, circle)
-            logger.debug(f"Circle after update for guild {interaction.guild.id}: {Storage.get_player_circle(interaction.guild.id)}")
-            channel = self.bot.get_channel(GAME_CHANNEL_ID)
+            logger.debug(f"Added user {user_id} to circle for guild {interaction.guild.id} ({size}/{CIRCLE_LIMIT})")
+            channel = await get_game_channel(self.bot, interaction.guild.id)
             await channel.send(f"<@{user_id}> joined the Circle!")
             logger.info(f"User {user_id} joined the circle.")
-            await interaction.followup.send(f"Welcome! The circle now has {len(circle)}/{CIRCLE_LIMIT} players.", ephemeral=True)
+            await interaction.followup.send(f"Welcome! The circle now has {size}/{CIRCLE_LIMIT} players.", ephemeral=True)
             responded = True
-            state = Storage.get_game_state()
+            state = await game_state_cache.get(interaction.guild.id)
             logger.debug(f"Fetched game state: {state}")
             if state and 'theme' in state:
-                if user_id not in state.get('user_ids', []):
-                    state['user_ids'].append(user_id)
-                    logger.debug(f"Added user {user_id} to game state user_ids: {state['user_ids']}")
-                    Storage.set_game_state(state)
-                    logger.debug(f"Game state after update: {Storage.get_game_state()}")
+                if await game_state_cache.add_participant(interaction.guild.id, state['game_id'], user_id):
+                    logger.debug(f"Added user {user_id} to game {state['game_id']}")
                 try:
-                    user = await self.bot.fetch_user(user_id)
-                    await user.send(f"A game is currently running! Today's drawing theme: **{state['theme']}**. Please reply with your drawing as an image attachment.")
+                    await interaction.user.send(f"A game is currently running! Today's drawing theme: **{state['theme']}**. Please reply with your drawing as an image attachment.")
                 except Exception as e:
                     logger.error(f"Failed to DM user {user_id}: {e}")
         except Exception as e:
@@ -88,18 +83,15 @@ class CircleManagement(commands.Cog):
         await interaction.response.defer(ephemeral=True)
         user_id = interaction.user.id
         username = interaction.user.display_name
-        circle = Storage.get_player_circle(interaction.guild.id)
-        if user_id not in circle:
+        if not await AsyncStorage.remove_from_circle(interaction.guild.id, user_id):
             await interaction.followup.send("You are not in the circle.", ephemeral=True)
             return
-        circle.remove(user_id)
-        Storage.set_player_circle(interaction.guild.id, circle)
         await interaction.followup.send("You have left the circle.", ephemeral=True)
 
     @app_commands.command(name="list_circle", description="List current members of the player circle.")
     async def list_circle(self, interaction: Interaction):
         await interaction.response.defer(ephemeral=True)
-        circle = Storage.get_player_circle(interaction.guild.id)
+        circle = await AsyncStorage.get_player_circle(interaction.guild.id)
         if not circle:
             await interaction.followup.send("The player circle is currently empty.", ephemeral=True)
             return
@@ -121,7 +113,7 @@ class CircleManagement(commands.Cog):
                 self.value = None
             @discord.ui.button(label="Yes. I am sure.", style=discord.ButtonStyle.danger)
             async def confirm(self, interaction2: Interaction, button: discord.ui.Button):
-                Storage.set_player_circle(interaction.guild.id, [])
+                await AsyncStorage.set_player_circle(interaction.guild.id, [])
                 await interaction2.response.edit_message(content="Player circle has been reset.", view=None)
                 self.value = True
                 self.stop()
@@ -1,13 +1,36 @@
 import discord
 from discord.ext import commands
 from discord import Message
-from ..storage.storage import Storage
-from ..gallery.gallery import make_gallery_image
-from ..config import GAME_CHANNEL_ID
+from ..storage.storage import AsyncStorage, game_state_cache
+from ..gallery.card_store import gallery_prerenderer
+from ..gallery.ingest import SubmissionRejected, check_attachment
+from ..gallery.submission_store import submission_store
+from ..guild_settings import get_game_channel
+from ..user_resolver import user_resolver
 import logging
 
 logger = logging.getLogger('circle_sketch')
 
+# Discord's limit on options in a select menu
+MAX_SELECT_OPTIONS = 25
+
+class GamePicker(discord.ui.View):
+    """Asks a player in several servers' games which one a submission is for."""
+
+    def __init__(self, games):
+        super().__init__(timeout=120)
+        self.games = games[:MAX_SELECT_OPTIONS]
+        self.choice = None
+        select = discord.ui.Select(placeholder='Pick a game', options=[
+            discord.SelectOption(label=label[:100], value=str(i)) for i, (label, _) in enumerate(self.games)])
+        select.callback = self.picked
+        self.add_item(select)
+
+    async def picked(self, interaction: discord.Interaction):
+        label, self.choice = self.games[int(interaction.data['values'][0])]
+        await interaction.response.edit_message(content=f'Submitting your drawing to {label}.', view=None)
+        self.stop()
+
 class EventsCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -36,38 +59,80 @@ class EventsCog(commands.Cog):
 
     @commands.Cog.listener()
     async def on_message(self, message: Message):
-        if message.author.bot:
-            return
-        state = Storage.get_game_state()
-        if not state or 'theme' not in state:
+        # Only DMs can be submissions; guild chatter never touches storage
+        if message.author.bot or not isinstance(message.channel, discord.DMChannel):
             return
         user_id = message.author.id
-        # Only process DMs for submissions
-        if isinstance(message.channel, discord.DMChannel):
-            logger.info(f'DM from {message.author} (ID: {user_id}): {message.type}')
-            if user_id not in state.get('user_ids', []):
-                return
-            if user_id in state.get('submissions', {}):
-                await message.channel.send("You have already submitted for today's game!")
-                logger.info(f'User {user_id} tried to submit again.')
-                return
-            if not message.attachments:
-                await message.channel.send('Please submit an image attachment.')
-                logger.info(f'User {user_id} submitted without an image.')
+        games = await game_state_cache.games_for_user(user_id)
+        if not games:
+            return
+        logger.info(f'DM from {message.author} (ID: {user_id}): {message.type}')
+        if not message.attachments:
+            await message.channel.send('Please submit an image attachment.')
+            logger.info(f'User {user_id} submitted without an image.')
+            return
+        open_games = [(guild_id, state) for guild_id, state in games
+                      if not await game_state_cache.has_submitted(guild_id, state['game_id'], user_id)]
+        if not open_games:
+            await message.channel.send("You have already submitted for today's game!")
+            logger.info(f'User {user_id} tried to submit again.')
+            return
+        if len(open_games) == 1:
+            guild_id, state = open_games[0]
+        else:
+            # Playing in several servers: ask which game this drawing is for
+            view = GamePicker([(self.game_label(guild_id, state), (guild_id, state)) for guild_id, state in open_games])
+            await message.channel.send("You're playing in more than one server. Which game is this drawing for?", view=view)
+            if await view.wait() or view.choice is None:
+                await message.channel.send('No game was picked, so nothing was submitted. Send your drawing again to retry.')
                 return
-            img_url = message.attachments[0].url
-            # Save submission
-            if 'submissions' not in state:
-                state['submissions'] = {}
-            if 'gallery' not in state:
-                state['gallery'] = {}
-            state['submissions'][user_id] = img_url
-            state['gallery'][user_id] = img_url
-            Storage.set_game_state(state)
-            await message.channel.send('Submission received! Thank you.')
-            logger.info(f'User {user_id} submitted their drawing.')
-            channel = self.bot.get_channel(GAME_CHANNEL_ID)
-            await channel.send(f'<@{user_id}> has submitted their image for today! You can still join the current game by typing `/join_circle`.')
+            guild_id, state = view.choice
+        attachment = message.attachments[0]
+        img_url = attachment.url
+        # Check the image before accepting it, and keep a local copy before the
+        # attachment URL can expire
+        try:
+            check_attachment(attachment)
+            # Answer straight away; the download below can take a few seconds
+            await message.channel.send('Got it! Checking your drawing...')
+            image_hash = await submission_store.save(img_url)
+        except SubmissionRejected as e:
+            await message.channel.send(e.reason)
+            logger.info(f'Rejected submission from user {user_id}: {e.reason}')
+            return
+        except Exception as e:
+            await message.channel.send("Sorry, I couldn't download your image. Please try sending it again.")
+            logger.warning(f'Could not download the submission from user {user_id}: {e}')
+            return
+        # The game may have ended while the player picked it or the image
+        # downloaded; nothing stops a row being written for an archived game
+        if not await game_state_cache.is_participant(guild_id, state['game_id'], user_id):
+            await message.channel.send(f'The game for {self.game_label(guild_id, state)} has ended, so your drawing was not submitted.')
+            logger.info(f'User {user_id} submitted after the game in guild {guild_id} ended.')
+            return
+        # Save submission; the insert is what decides whether this is a duplicate
+        if not await game_state_cache.record_submission(guild_id, state['game_id'], user_id, img_url):
+            await message.channel.send("You have already submitted for today's game!")
+            logger.info(f'User {user_id} tried to submit again.')
+            return
+        await AsyncStorage.set_submission_image_hash(state['game_id'], user_id, image_hash)
+        # Render the gallery card now so the end of the game only has to post it.
+        # The profile is resolved in the guild, as at game end (the DM author
+        # is a User, without the server nickname or avatar), so the card isn't
+        # thrown away as stale then.
+        try:
+            player = await user_resolver.resolve(self.bot, user_id, guild=self.bot.get_guild(guild_id))
+        except discord.HTTPException:
+            player = user_resolver.remember(message.author)
+        gallery_prerenderer.schedule(state['game_id'], state['theme'], state.get('date', 'unknown'), player, img_url)
+        await message.channel.send(f'Submission received for {self.game_label(guild_id, state)}! Thank you.')
+        logger.info(f'User {user_id} submitted their drawing for guild {guild_id}.')
+        channel = await get_game_channel(self.bot, guild_id)
+        await channel.send(f'<@{user_id}> has submitted their image for today! You can still join the current game by typing `/join_circle`.')
+
+    def game_label(self, guild_id, state):
+        guild = self.bot.get_guild(guild_id)
+        return f"{guild.name if guild else f'server {guild_id}'}: '{state['theme']}'"
 
     @commands.Cog.listener()
     async def on_member_join(self, member):
@@ -1,17 +1,25 @@
 import discord
 from discord import app_commands, Interaction
 from discord.ext import commands
-from ..storage.storage import Storage
-from ..config import GAME_CHANNEL_ID
+from ..storage.storage import AsyncStorage, game_state_cache
+from ..storage.errors import StaleGameStateError
+from .. import guild_settings
+from ..guild_settings import DEFAULT_GAME_TIME, get_game_channel, get_game_time, next_game_time
 from ..prompts import PROMPT_LIST
-from ..gallery.gallery import make_gallery_image, make_theme_announcement_image
+from ..dm_dispatch import dm_dispatcher, summarize
+from ..gallery.card_store import gallery_prerenderer
+from ..gallery.encoding import image_extension, upload_batches
+from ..gallery.mosaic import GALLERY_MODE
+from ..gallery.render_service import render_service
+from ..gallery.submission_store import submission_store
+from ..user_resolver import user_resolver
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 import pytz
+import asyncio
 import random
 import datetime
-import os
-import shutil
+import functools
 import io
 import logging
 import queue
@@ -34,33 +42,54 @@ queue_listener.start()
 def is_admin(interaction: Interaction):
     return interaction.user.guild_permissions.administrator
 
-IMAGE_STORAGE_DIR = os.path.join(os.path.dirname(__file__), '..', 'gallery', 'submissions')
-os.makedirs(IMAGE_STORAGE_DIR, exist_ok=True)
-
-def save_submission_image(user_id, img_url):
-    import requests
-    ext = os.path.splitext(img_url)[-1].split('?')[0] or '.png'
-    local_path = os.path.join(IMAGE_STORAGE_DIR, f"{user_id}{ext}")
-    r = requests.get(img_url, stream=True)
-    with open(local_path, 'wb') as f:
-        shutil.copyfileobj(r.raw, f)
-    return local_path
-
-def clear_submission_images(user_ids):
-    for user_id in user_ids:
-        for ext in ['.png', '.jpg', '.jpeg', '.webp']:
-            try:
-                os.remove(os.path.join(IMAGE_STORAGE_DIR, f"{user_id}{ext}"))
-            except FileNotFoundError:
-                pass
+HISTORY_PAGE_SIZE = 5
+# Discord's limit on attachments per message
+MAX_FILES_PER_MESSAGE = 10
+LEADERBOARD_SIZE = 10
+
+def format_history(games, user_id=None):
+    lines = []
+    for game in games:
+        if user_id is None:
+            lines.append(f"**{game['date']}** - {game['theme']}: {len(game['submissions'])}/{game['players']} submitted")
+        elif game['image_url']:
+            lines.append(f"**{game['date']}** - {game['theme']}: [drawing]({game['image_url']})")
+        else:
+            lines.append(f"**{game['date']}** - {game['theme']}: missed")
+    return "\n".join(lines)
+
+class HistoryView(discord.ui.View):
+    """Pages through the game archive, newest first, one keyset cursor at a time."""
+
+    def __init__(self, guild_id, user_id=None):
+        super().__init__(timeout=300)
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.cursor = None
+
+    async def next_page(self):
+        games, self.cursor = await AsyncStorage.get_game_history(
+            guild_id=self.guild_id, user_id=self.user_id, before=self.cursor, limit=HISTORY_PAGE_SIZE)
+        if not games:
+            return None
+        heading = f"Past games for <@{self.user_id}>:" if self.user_id else "Past games:"
+        return heading + "\n" + format_history(games, self.user_id)
+
+    @discord.ui.button(label="Older", style=discord.ButtonStyle.secondary)
+    async def older(self, interaction: Interaction, button: discord.ui.Button):
+        content = await self.next_page()
+        if not self.cursor:
+            button.disabled = True
+        await interaction.response.edit_message(content=content or "No older games.", view=self)
 
 class GameManagement(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.scheduler = AsyncIOScheduler(timezone=EST)
-        # End game at 5:00 PM, then start new game at 5:00:10 PM
-        self.scheduler.add_job(self.scheduled_end_game, CronTrigger(hour=17, minute=0, timezone=EST))
-        self.scheduler.add_job(self.scheduled_start_game, CronTrigger(hour=17, minute=0, second=10, timezone=EST))
+        # guild_id -> its running scheduled end/start, see scheduled_tick
+        self.schedule_tasks = {}
+        # Every minute, end and restart the games of guilds scheduled for it
+        self.scheduler.add_job(self.scheduled_tick, CronTrigger(minute='*', second=0, timezone=EST))
         self.scheduler.start()
 
     @commands.Cog.listener()
@@ -70,12 +99,13 @@ class GameManagement(commands.Cog):
     @app_commands.command(name="start_manual_game", description="Start a manual game (ends only when ended by the starter)")
     async def start_manual_game(self, interaction: Interaction):
         await interaction.response.defer(ephemeral=True)
-        state = Storage.get_game_state() or {}
+        guild_id = interaction.guild.id
+        state = await game_state_cache.get(guild_id) or {}
         # If a game is running, block start
         if state.get('theme') and state.get('manual_game_starter_id'):
             await interaction.followup.send("A manual game is already running.", ephemeral=True)
             return
-        circle = Storage.get_player_circle(interaction.guild.id)
+        circle = await AsyncStorage.get_player_circle(guild_id)
         if len(circle) < 1:
             await interaction.followup.send("Not enough players to start the game.", ephemeral=True)
             logger.warning("Not enough players to start the game.")
@@ -89,99 +119,123 @@ class GameManagement(commands.Cog):
             'submissions': {},
             'gallery': {},
             'manual_game_starter_id': interaction.user.id,
-            'guild_id': interaction.guild.id
+            'guild_id': guild_id
         }
-        Storage.set_game_state(new_state)
-        channel = self.bot.get_channel(GAME_CHANNEL_ID)
-        img_bytes = make_theme_announcement_image(prompt)
-        file = discord.File(img_bytes, filename="theme.png")
+        try:
+            await game_state_cache.set(guild_id, new_state)
+        except StaleGameStateError:
+            await interaction.followup.send("The game state changed while starting. Please try again.", ephemeral=True)
+            logger.warning("Manual game start raced with another game state update.")
+            return
+        channel = await get_game_channel(self.bot, guild_id)
+        img_bytes = await render_service.theme_announcement_image(prompt)
+        file = discord.File(img_bytes, filename=f"theme.{image_extension(img_bytes)}")
         await channel.send(content="@everyone Today's game is starting!", file=file)
         logger.info(f"Manual game started with prompt: {prompt}")
-        for user_id in circle:
-            try:
-                user = await self.bot.fetch_user(user_id)
-                await user.send(f"Today's drawing theme: **{prompt}**. Please reply with your drawing as an image attachment.")
-            except Exception as e:
-                logger.error(f"Failed to DM user {user_id}: {e}")
-        await interaction.followup.send("Manual game started! Prompt posted.", ephemeral=True)
-
-    async def end_game_phase(self, channel, state):
+        deliveries = await self.announce_theme(guild_id, circle, prompt)
+        undelivered = [f"<@{d.user_id}>" for d in deliveries if d.status != 'sent']
+        if undelivered:
+            await interaction.followup.send(f"Manual game started! Prompt posted, but these players could not be DMed: {', '.join(undelivered)}", ephemeral=True)
+        else:
+            await interaction.followup.send("Manual game started! Prompt posted.", ephemeral=True)
+
+    async def post_gallery_cards(self, channel, game_id, theme, date, gallery, players, missing):
+        # Cards were rendered as submissions came in; any that are missing or
+        # stale are rendered concurrently now. Post them in submission order.
+        async def render_card(user_id, drawing_url):
+            if int(user_id) in missing:
+                raise missing[int(user_id)]
+            return io.BytesIO(await gallery_prerenderer.card(game_id, theme, date, players[int(user_id)], drawing_url))
+
+        cards = await asyncio.gather(*(render_card(uid, url) for uid, url in gallery.items()), return_exceptions=True)
+        for user_id, card in zip(gallery.keys(), cards):
+            if isinstance(card, Exception):
+                await channel.send(f"Failed to generate gallery image for <@{user_id}>: {card}")
+                continue
+            await channel.send(file=discord.File(card, filename=f"gallery_{user_id}.{image_extension(card)}"))
+
+    async def post_mosaic_gallery(self, channel, game_id, theme, date, gallery, players, missing):
+        # Every submission on a few images, posted together instead of one upload per player
+        failures = dict(missing)
+        entries = [(players[int(uid)], url) for uid, url in gallery.items() if int(uid) not in missing]
+        images, render_failures = await render_service.gallery_mosaics(
+            theme, date, entries, tile=lambda user, drawing_url: gallery_prerenderer.tile(game_id, user, drawing_url))
+        failures.update(render_failures)
+        # Discord's size limit is per message, so pages are grouped by size as well as count
+        number = 0
+        for batch in upload_batches(images, MAX_FILES_PER_MESSAGE):
+            files = []
+            for image in batch:
+                number += 1
+                files.append(discord.File(image, filename=f"gallery_{number}.{image_extension(image)}"))
+            await channel.send(files=files)
+        for user_id, error in failures.items():
+            await channel.send(f"Failed to generate gallery image for <@{user_id}>: {error}")
+
+    async def end_game_phase(self, guild_id, channel, state):
         theme = state['theme']
         date = state.get('date', 'unknown')
         gallery = state.get('gallery', {})
-        streak = Storage.get_group_streak()
-        user_streaks = {}
-        if not gallery:
-            await channel.send(f"No submissions for today's theme: **{theme}**. The streak has ended at {streak}.")
-            Storage.set_group_streak(0)
-            # Reset all user streaks
-            for user_id in state.get('user_ids', []):
-                Storage.set_user_streak(user_id, 0)
-        else:
-            # Increment group streak
-            Storage.set_group_streak(streak + 1)
-            # Increment user streaks for submitters, reset for non-submitters
-            submitted_ids = set(int(uid) for uid in gallery.keys())
-            all_ids = set(int(uid) for uid in state.get('user_ids', []))
-            for user_id in all_ids:
-                if user_id in submitted_ids:
-                    new_streak = Storage.get_user_streak(user_id) + 1
-                    Storage.set_user_streak(user_id, new_streak)
-                    user_streaks[user_id] = new_streak
+        all_ids = [int(uid) for uid in state.get('user_ids', [])]
+        submitted_ids = set(int(uid) for uid in gallery.keys())
+        # Settle the group streak and every player's streak in one transaction
+        streak, new_group_streak, user_streaks = await AsyncStorage.apply_streak_results(
+            [uid for uid in all_ids if uid in submitted_ids],
+            [uid for uid in all_ids if uid not in submitted_ids],
+            guild_id=guild_id,
+        )
+        # Streaks are settled now, so the game is cleared even if posting fails;
+        # otherwise the next run would settle them a second time
+        try:
+            if not gallery:
+                await channel.send(f"No submissions for today's theme: **{theme}**. The streak has ended at {streak}.")
+            else:
+                # Compose streak summary
+                streak_lines = [f"<@{uid}>: {user_streaks[uid]} 🔥" if user_streaks[uid] > 0 else f"<@{uid}>: 0" for uid in all_ids]
+                await channel.send(f"Gallery for '**{theme}**' - {date}! Current group streak: {new_group_streak} 🔥\nUser streaks:\n" + "\n".join(streak_lines))
+                # Drawings stored locally as they were submitted are read from disk
+                image_hashes = await AsyncStorage.get_submission_image_hashes(state['game_id'])
+                urls = {int(uid): url for uid, url in gallery.items()}
+                for user_id, image_hash in image_hashes.items():
+                    if user_id in urls:
+                        submission_store.remember(urls[user_id], image_hash)
+                # Players come from the gateway cache; only missing ones are looked up
+                players, missing = await user_resolver.resolve_many(self.bot, list(urls), guild=self.bot.get_guild(guild_id))
+                if GALLERY_MODE == 'mosaic':
+                    await self.post_mosaic_gallery(channel, state['game_id'], theme, date, gallery, players, missing)
                 else:
-                    Storage.set_user_streak(user_id, 0)
-                    user_streaks[user_id] = 0
-            # Compose streak summary
-            streak_lines = [f"<@{uid}>: {user_streaks[uid]} 🔥" if user_streaks[uid] > 0 else f"<@{uid}>: 0" for uid in user_streaks]
-            await channel.send(f"Gallery for '**{theme}**' - {date}! Current group streak: {streak + 1} 🔥\nUser streaks:\n" + "\n".join(streak_lines))
-            for user_id, img_path in gallery.items():
-                temp_path = None
-                try:
-                    user = await self.bot.fetch_user(int(user_id))
-                    # If img_path is a Discord URL, use it directly for make_gallery_image
-                    if img_path.startswith('http'):
-                        drawing_url = img_path
-                    else:
-                        # Save local file to a temporary URL for preview (simulate Discord URL)
-                        drawing_url = img_path
-                    from ..gallery.gallery import make_gallery_image
-                    preview_bytes = make_gallery_image(theme, date, user, drawing_url)
-                    file = discord.File(preview_bytes, filename=f"gallery_{user_id}.png")
-                    await channel.send(file=file)
-                except Exception as e:
-                    await channel.send(f"Failed to generate gallery image for <@{user_id}>: {e}")
-                finally:
-                    # Clean up temp file if used
-                    if temp_path:
-                        try:
-                            os.remove(temp_path)
-                        except Exception:
-                            pass
-            # Clean up local images
-            clear_submission_images(gallery.keys())
-        Storage.set_game_state({})
+                    await self.post_gallery_cards(channel, state['game_id'], theme, date, gallery, players, missing)
+                render_stats = gallery_prerenderer.clear(state['game_id'])
+                logger.info(f"Gallery for guild {guild_id}: {render_stats['ready']}/{len(gallery)} cards ready in time, "
+                            f"{render_stats['waited']} still rendering, {render_stats['rendered_late']} rendered at game end.")
+                # Apply the submission store's retention policy
+                await asyncio.to_thread(submission_store.prune)
+        finally:
+            await game_state_cache.set(guild_id, {})
 
     @app_commands.command(name="end_manual_game", description="End the current manual game and post the gallery.")
     async def end_manual_game(self, interaction: Interaction):
         await interaction.response.defer(ephemeral=True)
-        state = Storage.get_game_state() or {}
+        guild_id = interaction.guild.id
+        state = await game_state_cache.get(guild_id, include_players=True) or {}
         starter_id = state.get('manual_game_starter_id')
         if not (state.get('theme') and starter_id):
-            Storage.set_game_state({})
+            await game_state_cache.set(guild_id, {})
             await interaction.followup.send("No manual game is currently running.", ephemeral=True)
             return
         if interaction.user.id != starter_id and not is_admin(interaction):
             await interaction.followup.send("Only the game starter or an admin can end the game.", ephemeral=True)
             return
-        channel = self.bot.get_channel(GAME_CHANNEL_ID)
-        await self.end_game_phase(channel, state)
-        Storage.set_game_state({})
+        channel = await get_game_channel(self.bot, guild_id)
+        await self.end_game_phase(guild_id, channel, state)
+        await game_state_cache.set(guild_id, {})
         await interaction.followup.send("Manual game ended and gallery posted.", ephemeral=True)
 
     @app_commands.command(name="game_status", description="Show the current game status.")
     async def game_status(self, interaction: Interaction):
         await interaction.response.defer(ephemeral=True)
-        state = Storage.get_game_state()
+        guild_id = interaction.guild.id
+        state = await game_state_cache.get(guild_id, include_players=True)
         if not state or 'theme' not in state:
             await interaction.followup.send("No game is currently running.", ephemeral=True)
             return
@@ -191,9 +245,7 @@ class GameManagement(commands.Cog):
         gallery = state.get('gallery', {})
         # Calculate time left if scheduled game
         now = datetime.datetime.now(EST)
-        next_end = now.replace(hour=17, minute=0, second=0, microsecond=0)
-        if now >= next_end:
-            next_end += datetime.timedelta(days=1)
+        next_end = next_game_time(await get_game_time(guild_id), now)
         time_left = next_end - now
         hours, remainder = divmod(time_left.seconds, 3600)
         minutes, seconds = divmod(remainder, 60)
@@ -212,28 +264,50 @@ class GameManagement(commands.Cog):
     @app_commands.command(name="show_streaks", description="Show the current group and per-user streaks.")
     async def show_streaks(self, interaction: Interaction):
         await interaction.response.defer(ephemeral=True)
-        group_streak = Storage.get_group_streak()
-        state = Storage.get_game_state() or {}
+        guild_id = interaction.guild.id
+        group_streak = await AsyncStorage.get_group_streak(guild_id=guild_id)
+        state = await game_state_cache.get(guild_id, include_players=True) or {}
         user_ids = state.get('user_ids', [])
-        # If no game running, show all streaks in DB
+        # If no game running, show all of this guild's streaks in DB
         if not user_ids:
-            # Try to get all user streaks from DB
-            try:
-                conn = Storage._get_conn()
-                c = conn.cursor()
-                c.execute('SELECT user_id, streak FROM user_streaks')
-                rows = c.fetchall()
-                conn.close()
-                if not rows:
-                    await interaction.followup.send(f"Current group streak: {group_streak}\nNo user streaks found.", ephemeral=True)
-                    return
-                streak_lines = [f"<@{row['user_id']}>: {row['streak']} 🔥" if row['streak'] > 0 else f"<@{row['user_id']}>: 0" for row in rows]
-            except Exception:
-                streak_lines = []
+            user_streaks = await AsyncStorage.get_user_streaks(guild_id=guild_id)
+            if not user_streaks:
+                await interaction.followup.send(f"Current group streak: {group_streak}\nNo user streaks found.", ephemeral=True)
+                return
         else:
-            streak_lines = [f"<@{uid}>: {Storage.get_user_streak(uid)} 🔥" if Storage.get_user_streak(uid) > 0 else f"<@{uid}>: 0" for uid in user_ids]
+            user_streaks = await AsyncStorage.get_user_streaks(user_ids, guild_id=guild_id)
+        streak_lines = [f"<@{uid}>: {streak} 🔥" if streak > 0 else f"<@{uid}>: 0" for uid, streak in user_streaks.items()]
         await interaction.followup.send(f"Current group streak: {group_streak} 🔥\n\nUser streaks:\n" + "\n".join(streak_lines), ephemeral=True)
 
+    @app_commands.command(name="leaderboard", description="Show this server's top players.")
+    @app_commands.choices(order_by=[
+        app_commands.Choice(name="Total submissions", value="submissions"),
+        app_commands.Choice(name="Current streak", value="streak"),
+        app_commands.Choice(name="Best streak", value="best_streak"),
+    ])
+    async def leaderboard(self, interaction: Interaction, order_by: str = "submissions"):
+        await interaction.response.defer(ephemeral=True)
+        entries = await AsyncStorage.get_leaderboard(interaction.guild.id, order_by=order_by, limit=LEADERBOARD_SIZE)
+        if not entries:
+            await interaction.followup.send("Nobody has finished a game yet.", ephemeral=True)
+            return
+        lines = [
+            f"{rank}. <@{entry['user_id']}>: {entry['submissions']} submissions, streak {entry['streak']} "
+            f"(best {entry['best_streak']}), {entry['participation']:.0%} participation"
+            for rank, entry in enumerate(entries, start=1)
+        ]
+        await interaction.followup.send("**Leaderboard**\n" + "\n".join(lines), ephemeral=True)
+
+    @app_commands.command(name="history", description="Show past games in this server, or one player's past games.")
+    async def history(self, interaction: Interaction, player: discord.Member = None):
+        await interaction.response.defer(ephemeral=True)
+        view = HistoryView(interaction.guild.id, player.id if player else None)
+        content = await view.next_page()
+        if content is None:
+            await interaction.followup.send("No finished games yet.", ephemeral=True)
+            return
+        await interaction.followup.send(content, view=view if view.cursor else None, ephemeral=True)
+
     @app_commands.command(name="test_image_submission", description="Admin only: Simulate a gallery submission preview for your image.")
     async def test_image_submission(self, interaction: Interaction):
         # Admin check
@@ -265,13 +339,11 @@ class GameManagement(commands.Cog):
         # Save image to a temporary URL (simulate Discord URL)
         # For preview, we can use the attachment's URL directly
         drawing_url = attachment.url
-        from ..gallery.gallery import make_gallery_image
-        import datetime
         theme = "[TESTING]"
         date_str = datetime.datetime.now().strftime('%Y-%m-%d')
         # Generate preview image
-        preview_bytes = make_gallery_image(theme, date_str, interaction.user, drawing_url)
-        file = discord.File(preview_bytes, filename="test_submission_preview.png")
+        preview_bytes = await render_service.gallery_image(theme, date_str, user_resolver.remember(interaction.user), drawing_url)
+        file = discord.File(preview_bytes, filename=f"test_submission_preview.{image_extension(preview_bytes)}")
 
         # Send the preview image in the original Discord channel
         try:
@@ -280,32 +352,88 @@ class GameManagement(commands.Cog):
         except Exception:
             await interaction.followup.send("Failed to post preview image in channel.", ephemeral=True)
 
-    async def scheduled_start_game(self):
-        circle = Storage.get_player_circle()
+    @app_commands.command(name="set_game_channel", description="[Admin] Post this server's games in this channel.")
+    @app_commands.check(is_admin)
+    async def set_game_channel(self, interaction: Interaction):
+        await guild_settings.set_game_channel(interaction.guild.id, interaction.channel.id)
+        await interaction.response.send_message(f"Games will be posted in {interaction.channel.mention}.", ephemeral=True)
+
+    @app_commands.command(name="set_game_time", description="[Admin] Set the daily time (HH:MM, New York time) games end and start.")
+    @app_commands.check(is_admin)
+    async def set_game_time(self, interaction: Interaction, time: str):
+        try:
+            await guild_settings.set_game_time(interaction.guild.id, time)
+        except ValueError:
+            await interaction.response.send_message("Please give the time as HH:MM, for example 17:00.", ephemeral=True)
+            return
+        await interaction.response.send_message(f"Daily games will now end and start at {time.strip()} (New York time).", ephemeral=True)
+
+    @set_game_channel.error
+    @set_game_time.error
+    async def settings_error(self, interaction: Interaction, error):
+        if isinstance(error, app_commands.errors.CheckFailure):
+            await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
+
+    async def scheduled_start_game(self, guild_id):
+        circle = await AsyncStorage.get_player_circle(guild_id)
         if len(circle) < 1:
             return
         prompt = random.choice(PROMPT_LIST)
         today = datetime.datetime.now().strftime('%Y-%m-%d')
-        Storage.set_game_state({'theme': prompt, 'date': today, 'user_ids': circle, 'submissions': {}, 'gallery': {}})
-        channel = self.bot.get_channel(GAME_CHANNEL_ID)
-        img_bytes = make_theme_announcement_image(prompt)
-        file = discord.File(img_bytes, filename="theme.png")
+        await game_state_cache.set(guild_id, {'theme': prompt, 'date': today, 'user_ids': circle, 'submissions': {}, 'gallery': {}, 'guild_id': guild_id})
+        channel = await get_game_channel(self.bot, guild_id)
+        img_bytes = await render_service.theme_announcement_image(prompt)
+        file = discord.File(img_bytes, filename=f"theme.{image_extension(img_bytes)}")
         await channel.send(content="@everyone Today's game is starting!", file=file)
-        for user_id in circle:
-            try:
-                user = await self.bot.fetch_user(user_id)
-                await user.send(f"Today's drawing theme: **{prompt}**. Please reply with your drawing as an image attachment.")
-            except Exception:
-                pass
+        await self.announce_theme(guild_id, circle, prompt)
+
+    async def announce_theme(self, guild_id, circle, prompt):
+        """DM the theme to the whole circle at once; returns a Delivery per player."""
+        deliveries = await dm_dispatcher.send(
+            self.bot, circle, f"Today's drawing theme: **{prompt}**. Please reply with your drawing as an image attachment.",
+            guild=self.bot.get_guild(guild_id))
+        logger.info(f"Theme DMs for guild {guild_id}: {summarize(deliveries)}")
+        for delivery in deliveries:
+            if delivery.status != 'sent':
+                logger.warning(f"Could not DM user {delivery.user_id} ({delivery.status}): {delivery.error}")
+        return deliveries
 
     # Utility for scheduled/timer-based end
-    async def scheduled_end_game(self):
-        state = Storage.get_game_state()
+    async def scheduled_end_game(self, guild_id):
+        state = await game_state_cache.get(guild_id, include_players=True)
         if not state or 'theme' not in state:
             return
-        channel = self.bot.get_channel(GAME_CHANNEL_ID)
-        await self.end_game_phase(channel, state)
-        self.manual_game_starter_id = None
+        channel = await get_game_channel(self.bot, guild_id)
+        await self.end_game_phase(guild_id, channel, state)
+
+    async def run_schedule(self, guild_id):
+        # End the current game before starting the next one
+        await self.scheduled_end_game(guild_id)
+        await self.scheduled_start_game(guild_id)
+
+    async def scheduled_tick(self):
+        now = datetime.datetime.now(EST).strftime('%H:%M')
+        guild_ids = await AsyncStorage.get_scheduled_guilds(now, DEFAULT_GAME_TIME)
+        if not guild_ids:
+            return
+        logger.info(f"Running scheduled games for {len(guild_ids)} guild(s) at {now}")
+        # Guilds run side by side as background tasks, so the tick returns at
+        # once: a slow gallery must not make the scheduler skip the next minute
+        for guild_id in guild_ids:
+            running = self.schedule_tasks.get(guild_id)
+            if running is not None and not running.done():
+                logger.warning(f"Scheduled game for guild {guild_id} is still running; skipping the {now} run")
+                continue
+            task = asyncio.create_task(self.run_schedule(guild_id))
+            self.schedule_tasks[guild_id] = task
+            task.add_done_callback(functools.partial(self.schedule_done, guild_id))
+
+    def schedule_done(self, guild_id, task):
+        if self.schedule_tasks.get(guild_id) is task:
+            del self.schedule_tasks[guild_id]
+        # One guild failing doesn't hold up the rest
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Scheduled game failed for guild {guild_id}: {task.exception()}")
 
 async def setup(bot):
     await bot.add_cog(GameManagement(bot))
@@ -0,0 +1,73 @@
+# Sending the same DM to a whole circle at once.
+#
+# Announcing a game used to fetch each player over REST and then DM them, one
+# after the other: 2N sequential requests. DmDispatcher sends to every
+# recipient concurrently, and skips what Discord's caches already have: the
+# member or user object comes from the gateway cache (any Snowflake will do
+# to open a DM, so an uncached player costs no extra lookup), and a DM
+# channel that is already open is reused.
+#
+# Concurrency is bounded separately for the two routes involved, because
+# Discord rate limits them differently. Opening a DM channel is
+# POST /users/@me/channels, a single bucket shared by every recipient, so
+# only DM_OPEN_CONCURRENCY of those run at once. Sending is
+# POST /channels/{id}/messages, a bucket per DM channel, so up to
+# DM_SEND_CONCURRENCY run side by side and are only held back by the global
+# limit. discord.py waits out 429s within each bucket. One dispatcher is
+# shared by every guild, so games starting in many servers at the same minute
+# don't add up to a burst.
+#
+# send() reports a Delivery per recipient instead of swallowing failures.
+
+import asyncio
+import os
+from collections import Counter, namedtuple
+import discord
+
+DM_OPEN_CONCURRENCY = int(os.environ.get('CIRCLE_SKETCH_DM_OPEN_CONCURRENCY', 4))
+DM_SEND_CONCURRENCY = int(os.environ.get('CIRCLE_SKETCH_DM_SEND_CONCURRENCY', 16))
+
+# status is 'sent', 'forbidden' (DMs closed or bot blocked), 'not_found' or 'failed'
+Delivery = namedtuple('Delivery', ['user_id', 'status', 'error'])
+
+def summarize(deliveries):
+    """'3 sent, 1 forbidden'-style summary of send()'s results."""
+    counts = Counter(delivery.status for delivery in deliveries)
+    return ', '.join(f'{count} {status}' for status, count in counts.most_common()) or 'nobody to DM'
+
+class DmDispatcher:
+    def __init__(self, open_concurrency=DM_OPEN_CONCURRENCY, send_concurrency=DM_SEND_CONCURRENCY):
+        self._open_slots = asyncio.Semaphore(open_concurrency)
+        self._send_slots = asyncio.Semaphore(send_concurrency)
+
+    async def send(self, bot, user_ids, content, guild=None):
+        """DM `content` to every user; returns a Delivery per user, in order."""
+        return await asyncio.gather(*(self._deliver(bot, user_id, content, guild) for user_id in user_ids))
+
+    def _recipient(self, bot, user_id, guild):
+        user = (guild and guild.get_member(user_id)) or bot.get_user(user_id)
+        return user or discord.Object(id=user_id)
+
+    async def _dm_channel(self, bot, recipient):
+        channel = getattr(recipient, 'dm_channel', None)
+        if channel is not None:
+            return channel
+        async with self._open_slots:
+            # Returns the cached channel without a request if one is open
+            return await bot.create_dm(recipient)
+
+    async def _deliver(self, bot, user_id, content, guild):
+        try:
+            channel = await self._dm_channel(bot, self._recipient(bot, user_id, guild))
+            async with self._send_slots:
+                await channel.send(content)
+        except discord.Forbidden as e:
+            return Delivery(user_id, 'forbidden', e)
+        except discord.NotFound as e:
+            return Delivery(user_id, 'not_found', e)
+        except Exception as e:
+            return Delivery(user_id, 'failed', e)
+        return Delivery(user_id, 'sent', None)
+
+# Shared by the cogs
+dm_dispatcher = DmDispatcher()
@@ -0,0 +1,63 @@
+# Disk cache of rendered theme banners.
+#
+# A banner depends only on the theme text, the font, the encoding profile and
+# the renderer itself, so it is stored under a hash of exactly those. Starting
+# a game with a theme that was rendered before is then a file read. A new
+# font or a bump of ANNOUNCEMENT_RENDER_VERSION changes every key, so old
+# banners are never served by mistake.
+#
+# Render every prompt ahead of time with:
+#     python -m circle_sketch.gallery.prerender_announcements
+
+import functools
+import hashlib
+import os
+import PIL
+from .encoding import ANNOUNCEMENT_PROFILE, ENCODING_PROFILES
+from .gallery import ANNOUNCEMENT_RENDER_VERSION, FONT_PATH
+
+ANNOUNCEMENT_CACHE_DIR = os.environ.get('CIRCLE_SKETCH_ANNOUNCEMENT_CACHE_DIR',
+                                        os.path.join(os.path.dirname(__file__), 'cache', 'announcements'))
+
+@functools.lru_cache(maxsize=None)
+def font_fingerprint():
+    """Hash of the bundled font, or of Pillow's version when it falls back to the default font."""
+    try:
+        with open(FONT_PATH, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return f'default-{PIL.__version__}'
+
+def announcement_key(theme, profile=ANNOUNCEMENT_PROFILE):
+    parts = (str(ANNOUNCEMENT_RENDER_VERSION), font_fingerprint(), profile, theme)
+    return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+
+class AnnouncementCache:
+    def __init__(self, directory=ANNOUNCEMENT_CACHE_DIR, profile=ANNOUNCEMENT_PROFILE):
+        self.directory = directory
+        self.profile = profile
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, theme):
+        extension = ENCODING_PROFILES[self.profile].extension
+        return os.path.join(self.directory, f'{announcement_key(theme, self.profile)}.{extension}')
+
+    def load(self, theme):
+        """The cached banner's bytes, or None."""
+        try:
+            with open(self.path(theme), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def store(self, theme, data):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(theme)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
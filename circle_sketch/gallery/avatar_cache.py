@@ -0,0 +1,147 @@
+# Cache of processed gallery avatars.
+#
+# The same circle members appear in every day's gallery, so instead of
+# downloading and resizing/masking each avatar for every card, AvatarCache
+# keeps the processed PNG keyed by Discord's avatar hash. A player who changes
+# their avatar gets a new hash, so the stale entry is simply never asked for
+# again and ages out.
+#
+# Entries live in an in-memory LRU and in a directory on disk that survives
+# restarts. The disk tier is capped at CIRCLE_SKETCH_AVATAR_CACHE_BYTES and
+# evicts the least recently used files first.
+
+import asyncio
+import os
+import re
+import threading
+from collections import OrderedDict
+from ..http_client import http_client
+
+AVATAR_CACHE_DIR = os.environ.get('CIRCLE_SKETCH_AVATAR_CACHE_DIR',
+                                  os.path.join(os.path.dirname(__file__), 'cache', 'avatars'))
+AVATAR_CACHE_BYTES = int(os.environ.get('CIRCLE_SKETCH_AVATAR_CACHE_BYTES', 32 * 1024 * 1024))
+AVATAR_CACHE_MEMORY_ITEMS = int(os.environ.get('CIRCLE_SKETCH_AVATAR_CACHE_MEMORY_ITEMS', 512))
+
+class AvatarCache:
+    def __init__(self, directory=AVATAR_CACHE_DIR, max_bytes=AVATAR_CACHE_BYTES,
+                 memory_items=AVATAR_CACHE_MEMORY_ITEMS, fetch=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self._fetch = fetch or http_client.get_bytes
+        self._memory = OrderedDict()
+        # key -> file size, oldest use first; read from the directory on first use
+        self._disk = None
+        self._disk_bytes = 0
+        # Disk reads and writes run in worker threads
+        self._disk_lock = threading.Lock()
+        # Concurrent misses for one avatar share a single download
+        self._pending = {}
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'memory_items': len(self._memory),
+            'disk_items': len(self._disk or ()),
+            'disk_bytes': self._disk_bytes,
+        }
+
+    async def get(self, key, url, process):
+        """Return the processed avatar for `key`, downloading `url` and running
+        `await process(raw_bytes)` on a miss."""
+        key = self._safe_key(key)
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return self._memory[key]
+        if key in self._pending:
+            return await asyncio.shield(self._pending[key])
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            data = await asyncio.to_thread(self._read_disk, key)
+            if data is not None:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+                data = await process(await self._fetch(url))
+                await asyncio.to_thread(self._write_disk, key, data)
+            self._remember(key, data)
+            future.set_result(data)
+            return data
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; don't warn about an unretrieved exception
+            future.exception()
+            raise
+        finally:
+            del self._pending[key]
+
+    @staticmethod
+    def _safe_key(key):
+        return re.sub(r'[^A-Za-z0-9_-]', '_', str(key))
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.png')
+
+    def _remember(self, key, data):
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _load_disk_index(self):
+        if self._disk is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.png'):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        self._disk = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self._disk_bytes = sum(self._disk.values())
+
+    def _read_disk(self, key):
+        with self._disk_lock:
+            return self._read_disk_locked(key)
+
+    def _write_disk(self, key, data):
+        with self._disk_lock:
+            self._write_disk_locked(key, data)
+
+    def _read_disk_locked(self, key):
+        self._load_disk_index()
+        if key not in self._disk:
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+            # mtime records recency across restarts
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            self._disk_bytes -= self._disk.pop(key)
+            return None
+        self._disk.move_to_end(key)
+        return data
+
+    def _write_disk_locked(self, key, data):
+        self._load_disk_index()
+        tmp_path = self._path(key) + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+        self._disk_bytes += len(data) - self._disk.pop(key, 0)
+        self._disk[key] = len(data)
+        while self._disk_bytes > self.max_bytes and len(self._disk) > 1:
+            old_key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            try:
+                os.remove(self._path(old_key))
+            except FileNotFoundError:
+                pass
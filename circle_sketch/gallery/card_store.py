@@ -0,0 +1,159 @@
+# Gallery cards rendered as submissions arrive.
+#
+# Rendering every card when the game ends makes the gallery post slower with
+# every extra player. Instead on_message calls GalleryPrerenderer.schedule()
+# for each submission, which renders the player's card (or mosaic tile, in
+# mosaic mode) in the background and keeps it in a CardStore on disk. When
+# the game ends, card()/tile() hand back the stored result. If it is missing,
+# or stale because something it was rendered from changed (display name,
+# avatar, render settings), it is rendered there and then.
+#
+# stats() counts how many cards were ready in time, how many were still
+# rendering and had to be waited for, and how many were rendered at the end.
+
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+from collections import Counter, defaultdict
+from .encoding import GALLERY_PROFILE
+from .gallery import MAX_DRAWING_SIZE
+from .mosaic import GALLERY_MODE, MOSAIC_TILE_SIZE
+from .render_service import render_service
+
+logger = logging.getLogger('circle_sketch')
+
+CARD_STORE_DIR = os.environ.get('CIRCLE_SKETCH_CARD_STORE_DIR',
+                                os.path.join(os.path.dirname(__file__), 'cache', 'cards'))
+# Bump when the card or tile layout changes so stored ones are re-rendered
+CARD_RENDER_VERSION = 1
+
+def card_fingerprint(kind, user, drawing_url, theme=None, date_str=None):
+    """Hash of everything a card or tile is rendered from."""
+    if kind == 'card':
+        settings = (GALLERY_PROFILE, MAX_DRAWING_SIZE, theme, date_str)
+    else:
+        settings = (MOSAIC_TILE_SIZE,)
+    parts = (kind, CARD_RENDER_VERSION, *settings, user.display_name, user.avatar_key, drawing_url)
+    return hashlib.sha256('\0'.join(map(str, parts)).encode('utf-8')).hexdigest()
+
+class CardStore:
+    """Rendered cards on disk, one directory per game."""
+
+    def __init__(self, directory=CARD_STORE_DIR):
+        self.directory = directory
+
+    def _path(self, game_id, kind, user_id, fingerprint):
+        return os.path.join(self.directory, str(game_id), f'{kind}-{user_id}-{fingerprint[:32]}')
+
+    def load(self, game_id, kind, user_id, fingerprint):
+        try:
+            with open(self._path(game_id, kind, user_id, fingerprint), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def store(self, game_id, kind, user_id, fingerprint, data):
+        path = self._path(game_id, kind, user_id, fingerprint)
+        game_dir = os.path.dirname(path)
+        os.makedirs(game_dir, exist_ok=True)
+        # Drop whatever an older submission or display name left behind
+        prefix = f'{kind}-{user_id}-'
+        for name in os.listdir(game_dir):
+            if name.startswith(prefix):
+                os.remove(os.path.join(game_dir, name))
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def clear(self, game_id):
+        shutil.rmtree(os.path.join(self.directory, str(game_id)), ignore_errors=True)
+
+class GalleryPrerenderer:
+    def __init__(self, service=render_service, store=None):
+        self.service = service
+        self.store = store or CardStore()
+        # (game_id, kind, user_id) -> (fingerprint, task)
+        self._tasks = {}
+        # Totals since startup, and per game until clear()
+        self.totals = Counter()
+        self._games = defaultdict(Counter)
+
+    def stats(self, game_id=None):
+        """Counts of cards that were 'ready' when asked for, still rendering
+        ('waited') or missing/stale and 'rendered_late'."""
+        counts = self.totals if game_id is None else self._games.get(game_id, Counter())
+        return {name: counts[name] for name in ('ready', 'waited', 'rendered_late')}
+
+    def schedule(self, game_id, theme, date_str, user, drawing_url, kind=None):
+        """Start rendering a submission's card in the background (a tile in mosaic mode)."""
+        kind = kind or ('tile' if GALLERY_MODE == 'mosaic' else 'card')
+        fingerprint = card_fingerprint(kind, user, drawing_url, theme, date_str)
+        key = (game_id, kind, user.id)
+        previous = self._tasks.get(key)
+        if previous and previous[0] == fingerprint:
+            return previous[1]
+        if previous:
+            previous[1].cancel()
+        task = asyncio.ensure_future(self._render_and_store(game_id, kind, theme, date_str, user, drawing_url, fingerprint))
+        self._tasks[key] = (fingerprint, task)
+        task.add_done_callback(lambda done: self._finished(key, done))
+        return task
+
+    async def card(self, game_id, theme, date_str, user, drawing_url):
+        """The encoded card for a submission, rendering it now if it isn't ready."""
+        return await self._get(game_id, 'card', theme, date_str, user, drawing_url)
+
+    async def tile(self, game_id, user, drawing_url):
+        """The mosaic tile for a submission, rendering it now if it isn't ready."""
+        return await self._get(game_id, 'tile', None, None, user, drawing_url)
+
+    def clear(self, game_id):
+        """Forget a finished game's cards, cancelling any still rendering; returns its stats()."""
+        stats = self.stats(game_id)
+        for key in [key for key in self._tasks if key[0] == game_id]:
+            self._tasks.pop(key)[1].cancel()
+        self._games.pop(game_id, None)
+        self.store.clear(game_id)
+        return stats
+
+    async def _get(self, game_id, kind, theme, date_str, user, drawing_url):
+        fingerprint = card_fingerprint(kind, user, drawing_url, theme, date_str)
+        pending = self._tasks.get((game_id, kind, user.id))
+        if pending and pending[0] == fingerprint and not pending[1].done():
+            try:
+                data = await asyncio.shield(pending[1])
+                self._count(game_id, 'waited')
+                return data
+            except Exception:
+                pass
+        else:
+            data = await asyncio.to_thread(self.store.load, game_id, kind, user.id, fingerprint)
+            if data is not None:
+                self._count(game_id, 'ready')
+                return data
+        self._count(game_id, 'rendered_late')
+        return await self._render_and_store(game_id, kind, theme, date_str, user, drawing_url, fingerprint)
+
+    async def _render_and_store(self, game_id, kind, theme, date_str, user, drawing_url, fingerprint):
+        if kind == 'card':
+            data = await self.service.gallery_card(theme, date_str, user, drawing_url)
+        else:
+            data = await self.service.mosaic_tile(user, drawing_url)
+        await asyncio.to_thread(self.store.store, game_id, kind, user.id, fingerprint, data)
+        return data
+
+    def _count(self, game_id, name):
+        self.totals[name] += 1
+        self._games[game_id][name] += 1
+
+    def _finished(self, key, task):
+        if self._tasks.get(key, (None, None))[1] is task:
+            del self._tasks[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Pre-rendering gallery {key[1]} for user {key[2]} failed: {task.exception()}")
+
+# Shared by the cogs
+gallery_prerenderer = GalleryPrerenderer()
@@ -0,0 +1,87 @@
+# Output encoding for gallery cards and theme banners.
+#
+# Lossless PNG is slow to encode and large for photo-like drawings, so the
+# format is chosen by profile: CIRCLE_SKETCH_GALLERY_PROFILE for cards and
+# CIRCLE_SKETCH_ANNOUNCEMENT_PROFILE for banners. Whatever the profile, the
+# result has to fit in one Discord upload (CIRCLE_SKETCH_UPLOAD_LIMIT_BYTES):
+# lossy profiles step their quality down until it does, and lossless ones
+# fall back to FALLBACK_PROFILE.
+#
+# Compare the profiles with benchmarks/bench_image_encoding.py.
+
+import io
+import os
+from collections import namedtuple
+from PIL import Image
+
+EncodingProfile = namedtuple('EncodingProfile', ['format', 'extension', 'options', 'qualities'])
+
+ENCODING_PROFILES = {
+    'png': EncodingProfile('PNG', 'png', {}, ()),
+    'png_optimized': EncodingProfile('PNG', 'png', {'optimize': True}, ()),
+    'webp_lossless': EncodingProfile('WEBP', 'webp', {'lossless': True, 'method': 4}, ()),
+    'webp': EncodingProfile('WEBP', 'webp', {'method': 4}, (90, 82, 75, 65, 50)),
+    'jpeg': EncodingProfile('JPEG', 'jpg', {'optimize': True, 'subsampling': 0}, (95, 90, 85, 75, 65, 50)),
+}
+FALLBACK_PROFILE = 'jpeg'
+
+GALLERY_PROFILE = os.environ.get('CIRCLE_SKETCH_GALLERY_PROFILE', 'png')
+ANNOUNCEMENT_PROFILE = os.environ.get('CIRCLE_SKETCH_ANNOUNCEMENT_PROFILE', 'png')
+# Discord's attachment limit for servers without boosts, with some headroom
+UPLOAD_LIMIT_BYTES = int(os.environ.get('CIRCLE_SKETCH_UPLOAD_LIMIT_BYTES', 9 * 1024 * 1024))
+# If even the lowest quality is too big, shrink the image by this much and retry
+DOWNSCALE_STEP = 0.75
+
+def _save(image, profile, quality=None):
+    if profile.format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    options = dict(profile.options)
+    if quality is not None:
+        options['quality'] = quality
+    out = io.BytesIO()
+    image.save(out, format=profile.format, **options)
+    return out.getvalue()
+
+def encode_image(image, profile_name, max_bytes=UPLOAD_LIMIT_BYTES):
+    """Encode `image` with the named profile, returning bytes no larger than `max_bytes`."""
+    profile = ENCODING_PROFILES[profile_name]
+    if not profile.qualities:
+        data = _save(image, profile)
+        if len(data) <= max_bytes:
+            return data
+        profile = ENCODING_PROFILES[FALLBACK_PROFILE]
+    while True:
+        for quality in profile.qualities:
+            data = _save(image, profile, quality)
+            if len(data) <= max_bytes:
+                return data
+        if min(image.size) < 64:
+            # Nothing sensible left to try
+            return data
+        image = image.resize((int(image.width * DOWNSCALE_STEP), int(image.height * DOWNSCALE_STEP)), Image.Resampling.LANCZOS)
+
+def image_extension(data):
+    """File extension for encoded image bytes (or a BytesIO), from its signature."""
+    if isinstance(data, io.BytesIO):
+        data = data.getbuffer()
+    header = bytes(data[:12])
+    if header.startswith(b'\xff\xd8'):
+        return 'jpg'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    return 'png'
+
+def upload_batches(images, max_files, max_bytes=UPLOAD_LIMIT_BYTES):
+    """Split encoded images (bytes or BytesIO) into consecutive groups that
+    can go in one message: at most `max_files`, and `max_bytes` together,
+    since Discord's upload limit covers all of a message's attachments."""
+    batches = []
+    total = 0
+    for image in images:
+        size = image.getbuffer().nbytes if isinstance(image, io.BytesIO) else len(image)
+        if not batches or len(batches[-1]) >= max_files or total + size > max_bytes:
+            batches.append([])
+            total = 0
+        batches[-1].append(image)
+        total += size
+    return batches
@@ -1,29 +1,100 @@
+import functools
 import io
 import requests
 from PIL import Image, ImageDraw, ImageFont
 import discord
 import os
+from .encoding import ANNOUNCEMENT_PROFILE, GALLERY_PROFILE, encode_image
+from .palette import dominant_color
 
 FONT_PATH = os.path.join(os.path.dirname(__file__), "fonts", "DejaVuSans.ttf")
 
+# Submitted photos can be 12-48MP. They're scaled down so neither side of the
+# drawing on a card is larger than this, which also bounds the card itself.
+MAX_DRAWING_SIZE = int(os.environ.get('CIRCLE_SKETCH_MAX_DRAWING_SIZE', 1600))
+# Images claiming more pixels than this are rejected before being decoded
+MAX_IMAGE_PIXELS = int(os.environ.get('CIRCLE_SKETCH_MAX_IMAGE_PIXELS', 64_000_000))
+AVATAR_DECODE_SIZE = 256
+# Bump when render_theme_announcement's output changes, so cached banners
+# (see announcement_cache.py) are re-rendered
+ANNOUNCEMENT_RENDER_VERSION = 1
+
+class ImageTooLarge(ValueError):
+    pass
+
+# Only a handful of sizes are used, so every font is loaded once per process
+@functools.lru_cache(maxsize=None)
 def get_font(font_size):
     try:
         return ImageFont.truetype(FONT_PATH, font_size)
     except Exception:
         return ImageFont.load_default()
 
+@functools.lru_cache(maxsize=1024)
+def text_bbox(text, font_size):
+    """Bounding box of `text` drawn at (0, 0) in the gallery font (memoized)."""
+    return get_font(font_size).getbbox(text)
+
+def decode_image(data, max_size, max_pixels=MAX_IMAGE_PIXELS):
+    """Decode image bytes so that neither side exceeds `max_size`.
+
+    JPEGs are decoded at a reduced scale (draft mode) so a huge photo is never
+    held in memory at full resolution; the rest of the way is a LANCZOS
+    downscale.
+    """
+    image = Image.open(io.BytesIO(data))
+    # Only the header has been read so far
+    if image.width * image.height > max_pixels:
+        raise ImageTooLarge(f"{image.width}x{image.height} image is larger than {max_pixels} pixels")
+    if image.width > max_size or image.height > max_size:
+        image.draft("RGB", (max_size, max_size))
+        image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    return image
+
+def fetch_image_bytes(url):
+    return requests.get(url).content
+
 def make_gallery_image(theme, date_str, user: discord.User, drawing_url):
-    # Download user profile picture
-    pfp_bytes = requests.get(user.display_avatar.url).content
-    pfp = Image.open(io.BytesIO(pfp_bytes)).convert("RGBA").resize((64, 64))
+    """Download the avatar and drawing, then render the card. Blocks; see render_service."""
+    return io.BytesIO(render_gallery_card_from_urls(theme, date_str, user.display_name, user.display_avatar.url, drawing_url))
+
+def render_gallery_card_from_urls(theme, date_str, display_name, avatar_url, drawing_url):
+    return render_gallery_card(theme, date_str, display_name, fetch_image_bytes(avatar_url), fetch_image_bytes(drawing_url))
+
+# The render_* functions only take and return plain values so they can run in
+# a worker process.
+
+def avatar_image(avatar_bytes):
+    """The avatar resized to 64x64 with a circular mask, as an RGBA image."""
+    pfp = decode_image(avatar_bytes, AVATAR_DECODE_SIZE).convert("RGBA").resize((64, 64))
     # Make circular mask for PFP
     mask = Image.new("L", (64, 64), 0)
     draw = ImageDraw.Draw(mask)
     draw.ellipse((0, 0, 64, 64), fill=255)
     pfp.putalpha(mask)
-    # Download drawing
-    drawing_bytes = requests.get(drawing_url).content
-    drawing = Image.open(io.BytesIO(drawing_bytes)).convert("RGBA")
+    return pfp
+
+def render_avatar(avatar_bytes):
+    """Process an avatar for the gallery (see avatar_image) and return it as PNG bytes."""
+    out = io.BytesIO()
+    avatar_image(avatar_bytes).save(out, format="PNG")
+    return out.getvalue()
+
+def render_gallery_card(theme, date_str, display_name, avatar_bytes, drawing_bytes, profile=None):
+    """Compose a player's gallery card and return it encoded with `profile` (see encoding.py)."""
+    return compose_gallery_card(theme, date_str, display_name, avatar_image(avatar_bytes), drawing_bytes, profile)
+
+def render_gallery_card_with_avatar(theme, date_str, display_name, avatar_png, drawing_bytes, profile=None):
+    """render_gallery_card for an avatar already processed by render_avatar."""
+    pfp = Image.open(io.BytesIO(avatar_png)).convert("RGBA")
+    return compose_gallery_card(theme, date_str, display_name, pfp, drawing_bytes, profile)
+
+def border_color(drawing):
+    """Dominant color of the drawing, used for the border around it (see palette.py)."""
+    return dominant_color(drawing)
+
+def compose_gallery_card(theme, date_str, display_name, pfp, drawing_bytes, profile=None):
+    drawing = decode_image(drawing_bytes, MAX_DRAWING_SIZE).convert("RGBA")
     # Padding
     pad = 40
     # Fonts
@@ -32,9 +103,7 @@ def make_gallery_image(theme, date_str, user: discord.User, drawing_url):
     # Title
     title = f"{theme} - {date_str}"
     # Calculate title width
-    dummy_img = Image.new("RGBA", (1, 1))
-    dummy_draw = ImageDraw.Draw(dummy_img)
-    bbox = dummy_draw.textbbox((0, 0), title, font=font_title)
+    bbox = text_bbox(title, 28)
     title_w = bbox[2] - bbox[0]
     title_h = bbox[3] - bbox[1]
     # Calculate canvas size
@@ -56,30 +125,27 @@ def make_gallery_image(theme, date_str, user: discord.User, drawing_url):
     author_y = pad + title_h + between_title_author
     pfp_x = (width - 64 - 40 - 200) // 2
     name_x = pfp_x + 64 + 40
-    uname = user.display_name
-    bbox2 = draw_bg.textbbox((0, 0), uname, font=font_author)
+    uname = display_name
+    bbox2 = text_bbox(uname, 32)
     uw, uh = bbox2[2] - bbox2[0], bbox2[3] - bbox2[1]
     draw_bg.text((name_x, author_y + (64-uh)//2), uname, font=font_author, fill=(255,255,255,255))  # white username
     bg.paste(pfp, (pfp_x, author_y), pfp)
     # Drawing (centered) with rounded rectangle border
     dx = (width - img_w) // 2
     dy = top_extra
-    # Get most common color in drawing for border
-    small = drawing.resize((32, 32)).convert('RGB')
-    colors = small.getcolors(32*32)
-    most_common = max(colors, key=lambda x: x[0])[1] if colors else (60, 60, 70)
+    most_common = border_color(drawing)
     border_pad = 16
     border_rect = [dx - border_pad, dy - border_pad, dx + img_w + border_pad, dy + img_h + border_pad]
     radius = 32
     draw_bg.rounded_rectangle(border_rect, radius=radius, fill=most_common)
     bg.paste(drawing, (dx, dy), drawing)
-    # Save to BytesIO
-    out = io.BytesIO()
-    bg.save(out, format="PNG")
-    out.seek(0)
-    return out
+    return encode_image(bg, profile or GALLERY_PROFILE)
 
 def make_theme_announcement_image(theme: str):
+    return io.BytesIO(render_theme_announcement(theme))
+
+def render_theme_announcement(theme, profile=None):
+    """Render the daily theme banner and return it encoded with `profile` (see encoding.py)."""
     width, height = 1000, 300
     bg = Image.new("RGBA", (width, height), (30, 30, 40, 255))
     draw = ImageDraw.Draw(bg)
@@ -88,14 +154,11 @@ def make_theme_announcement_image(theme: str):
     font2 = get_font(54)
     # Title
     title = "Theme for today is:"
-    bbox1 = draw.textbbox((0, 0), title, font=font1)
+    bbox1 = text_bbox(title, 36)
     w1, h1 = bbox1[2] - bbox1[0], bbox1[3] - bbox1[1]
     draw.text(((width-w1)//2, 70), title, font=font1, fill=(200,200,255,255))
     # Theme (colorful)
-    bbox2 = draw.textbbox((0, 0), theme, font=font2)
+    bbox2 = text_bbox(theme, 54)
     w2, h2 = bbox2[2] - bbox2[0], bbox2[3] - bbox2[1]
     draw.text(((width-w2)//2, 140), theme, font=font2, fill=(180,120,255,255))
-    out = io.BytesIO()
-    bg.save(out, format="PNG")
-    out.seek(0)
-    return out
+    return encode_image(bg, profile or ANNOUNCEMENT_PROFILE)
@@ -0,0 +1,88 @@
+# Checks on submitted images, before and while they are downloaded.
+#
+# A submission is whatever a player attached to a DM, so nothing about it can
+# be trusted. check_attachment() looks at what Discord reports about the
+# attachment (size, content type, dimensions) and rejects it without
+# downloading anything. download_submission() then streams the file with a
+# hard cap of SUBMISSION_MAX_BYTES and parses the image header as soon as
+# enough of it has arrived, so a file that isn't a supported image, or is too
+# many pixels to render, is abandoned after its first chunk. The player is
+# waiting for an answer, so the whole download gets SUBMISSION_DOWNLOAD_TIMEOUT
+# seconds and one retry rather than the shared client's defaults.
+#
+# Both raise SubmissionRejected, whose `reason` is meant for the player.
+
+import asyncio
+import io
+import os
+from PIL import Image
+from ..http_client import ResponseTooLarge, http_client
+from .gallery import MAX_IMAGE_PIXELS
+
+SUBMISSION_MAX_BYTES = int(os.environ.get('CIRCLE_SKETCH_SUBMISSION_MAX_BYTES', 25 * 1024 ** 2))
+SUBMISSION_DOWNLOAD_TIMEOUT = float(os.environ.get('CIRCLE_SKETCH_SUBMISSION_DOWNLOAD_TIMEOUT', 20))
+SUBMISSION_DOWNLOAD_RETRIES = 1
+# Headers are parsed from at most this much of the file; JPEG metadata can
+# put the dimensions a long way in
+PROBE_BYTES = 512 * 1024
+
+ACCEPTED_FORMATS = {'PNG', 'JPEG', 'WEBP', 'GIF'}
+ACCEPTED_CONTENT_TYPES = {'image/png', 'image/jpeg', 'image/webp', 'image/gif'}
+
+class SubmissionRejected(ValueError):
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+def _megabytes(size):
+    return f'{size / 1024 ** 2:.1f} MB'
+
+def _check_dimensions(width, height, max_pixels):
+    if width * height > max_pixels:
+        raise SubmissionRejected(f'That image is {width}x{height} pixels, which is too large. '
+                                 f'Please send one under {max_pixels // 1_000_000} megapixels.')
+
+def check_attachment(attachment, max_bytes=SUBMISSION_MAX_BYTES, max_pixels=MAX_IMAGE_PIXELS):
+    """Reject an attachment from its metadata alone."""
+    if attachment.size > max_bytes:
+        raise SubmissionRejected(f'That file is {_megabytes(attachment.size)}; '
+                                 f'please send an image under {_megabytes(max_bytes)}.')
+    content_type = (attachment.content_type or '').split(';')[0].strip().lower()
+    # Discord doesn't always know the type; the header is checked on download anyway
+    if content_type and content_type not in ACCEPTED_CONTENT_TYPES:
+        raise SubmissionRejected('Please submit a PNG, JPEG, WebP or GIF image.')
+    if attachment.width and attachment.height:
+        _check_dimensions(attachment.width, attachment.height, max_pixels)
+
+def probe_header(head, complete, max_pixels=MAX_IMAGE_PIXELS):
+    """True once `head` (the start of a file) is known to be an acceptable image.
+
+    Returns False if more of the file is needed to tell.
+    """
+    try:
+        # Only parses the header; nothing is decoded
+        image = Image.open(io.BytesIO(head))
+        image_format, (width, height) = image.format, image.size
+    except Image.DecompressionBombError:
+        raise SubmissionRejected('That image is too large. '
+                                 f'Please send one under {max_pixels // 1_000_000} megapixels.')
+    except Exception:
+        if complete or len(head) >= PROBE_BYTES:
+            raise SubmissionRejected("That file doesn't look like an image I can read. "
+                                     'Please submit a PNG, JPEG, WebP or GIF image.')
+        return False
+    if image_format not in ACCEPTED_FORMATS:
+        raise SubmissionRejected('Please submit a PNG, JPEG, WebP or GIF image.')
+    _check_dimensions(width, height, max_pixels)
+    return True
+
+async def download_submission(url, max_bytes=SUBMISSION_MAX_BYTES, client=http_client, timeout=SUBMISSION_DOWNLOAD_TIMEOUT):
+    """The submitted file's bytes, streamed with a size cap and checked as it arrives.
+
+    Raises asyncio.TimeoutError if it takes longer than `timeout` seconds.
+    """
+    try:
+        return await asyncio.wait_for(
+            client.get_bytes(url, max_bytes=max_bytes, inspect=probe_header, retries=SUBMISSION_DOWNLOAD_RETRIES), timeout)
+    except ResponseTooLarge:
+        raise SubmissionRejected(f'That file is over {_megabytes(max_bytes)}; please send a smaller image.')
@@ -0,0 +1,94 @@
+# Mosaic galleries: every submission of a game on one image (or a few).
+#
+# Posting one card per player means one upload per player, which runs into
+# Discord's rate limits on big circles. In mosaic mode (CIRCLE_SKETCH_GALLERY_MODE
+# =mosaic) each submission becomes a fixed-size tile - avatar, name and the
+# drawing fitted into a square - and the tiles are laid out in a grid of at
+# most MOSAIC_MAX_TILES per image. Tiles are rendered in parallel by
+# RenderService; a page is then just pasting them onto a canvas.
+#
+# Like gallery.py's render_* functions, everything here takes and returns
+# plain values so it can run in a worker process.
+
+import math
+import os
+from collections import namedtuple
+from PIL import Image, ImageDraw, ImageOps
+from .encoding import GALLERY_PROFILE, encode_image
+from .gallery import border_color, decode_image, get_font, text_bbox
+
+# 'cards' posts one image per submission, 'mosaic' posts grids
+GALLERY_MODE = os.environ.get('CIRCLE_SKETCH_GALLERY_MODE', 'cards')
+MOSAIC_TILE_SIZE = int(os.environ.get('CIRCLE_SKETCH_MOSAIC_TILE_SIZE', 400))
+MOSAIC_MAX_TILES = int(os.environ.get('CIRCLE_SKETCH_MOSAIC_MAX_TILES', 16))
+
+PAD = 24
+HEADER_HEIGHT = 64
+TITLE_FONT_SIZE = 36
+NAME_FONT_SIZE = 24
+BACKGROUND = (40, 40, 40, 255)
+TILE_BACKGROUND = (55, 55, 60, 255)
+
+# `tiles` is a slice into the submissions; columns x rows is the grid
+MosaicPage = namedtuple('MosaicPage', ['tiles', 'columns', 'rows'])
+
+def mosaic_layout(count, max_tiles=MOSAIC_MAX_TILES):
+    """Split `count` tiles into pages of at most `max_tiles`, each as square a grid as possible.
+
+    Pages are filled evenly, so 17 tiles with a 16 tile maximum become two
+    pages of 9 and 8 rather than 16 and 1.
+    """
+    if count <= 0:
+        return []
+    pages = math.ceil(count / max_tiles)
+    per_page = math.ceil(count / pages)
+    layout = []
+    for start in range(0, count, per_page):
+        n = min(per_page, count - start)
+        columns = math.ceil(math.sqrt(n))
+        layout.append(MosaicPage(slice(start, start + n), columns, math.ceil(n / columns)))
+    return layout
+
+def tile_height(tile_size=MOSAIC_TILE_SIZE):
+    return HEADER_HEIGHT + PAD + tile_size
+
+def render_mosaic_tile(display_name, avatar_png, drawing_bytes, tile_size=MOSAIC_TILE_SIZE):
+    """One submission's tile as raw RGBA bytes (tile_size wide, tile_height() tall)."""
+    tile = Image.new("RGBA", (tile_size, tile_height(tile_size)), TILE_BACKGROUND)
+    draw = ImageDraw.Draw(tile)
+    pfp = decode_image(avatar_png, HEADER_HEIGHT).convert("RGBA").resize((HEADER_HEIGHT - 16, HEADER_HEIGHT - 16))
+    tile.paste(pfp, (8, 8), pfp)
+    bbox = text_bbox(display_name, NAME_FONT_SIZE)
+    draw.text((HEADER_HEIGHT + 4, (HEADER_HEIGHT - (bbox[3] - bbox[1])) // 2), display_name,
+              font=get_font(NAME_FONT_SIZE), fill=(255, 255, 255, 255))
+    drawing = decode_image(drawing_bytes, tile_size).convert("RGBA")
+    # decode_image only shrinks; small drawings are scaled up to fill the tile
+    drawing = ImageOps.contain(drawing, (tile_size - 16, tile_size - 16), Image.Resampling.LANCZOS)
+    area_y = HEADER_HEIGHT + PAD // 2
+    draw.rounded_rectangle([0, area_y, tile_size - 1, area_y + tile_size - 1], radius=16, fill=border_color(drawing))
+    tile.paste(drawing, ((tile_size - drawing.width) // 2, area_y + (tile_size - drawing.height) // 2), drawing)
+    return tile.tobytes()
+
+def render_mosaic(theme, date_str, tiles, columns, tile_size=MOSAIC_TILE_SIZE, page=None, profile=None):
+    """Paste rendered tiles into a grid under a title; returns the encoded image.
+
+    `page` is an optional (number, total) shown in the title.
+    """
+    rows = math.ceil(len(tiles) / columns)
+    cell_w, cell_h = tile_size + PAD, tile_height(tile_size) + PAD
+    title = f"{theme} - {date_str}"
+    if page and page[1] > 1:
+        title += f" ({page[0]}/{page[1]})"
+    bbox = text_bbox(title, TITLE_FONT_SIZE)
+    title_w, title_h = bbox[2] - bbox[0], bbox[3] - bbox[1]
+    top = PAD * 2 + title_h
+    width = max(columns * cell_w + PAD, title_w + PAD * 2)
+    height = top + rows * cell_h
+    canvas = Image.new("RGBA", (width, height), BACKGROUND)
+    ImageDraw.Draw(canvas).text(((width - title_w) // 2, PAD), title, font=get_font(TITLE_FONT_SIZE), fill=(255, 255, 255, 255))
+    left = (width - columns * cell_w + PAD) // 2
+    for i, tile_bytes in enumerate(tiles):
+        row, column = divmod(i, columns)
+        tile = Image.frombytes("RGBA", (tile_size, tile_height(tile_size)), tile_bytes)
+        canvas.paste(tile, (left + column * cell_w, top + row * cell_h))
+    return encode_image(canvas, profile or GALLERY_PROFILE)
@@ -0,0 +1,52 @@
+# Dominant color of a drawing, for the border around it on gallery cards.
+#
+# Exact RGB tuples are too noisy for photos: every pixel of a phone shot of
+# white paper is a slightly different white. Instead each image is box-reduced
+# to at most SAMPLE_SIZE pixels a side, which bounds the work no matter how big
+# the drawing is, and its colors are quantized to QUANT_BITS per channel. The
+# most populated bin wins, and the result is the mean of the pixels in it.
+#
+# dominant_colors() does this for a whole batch of images with one histogram.
+
+import numpy as np
+from PIL import Image
+
+SAMPLE_SIZE = 64
+QUANT_BITS = 4
+BINS = 1 << (3 * QUANT_BITS)
+FALLBACK_COLOR = (60, 60, 70)
+
+def sample_pixels(image, size=SAMPLE_SIZE):
+    """The visible pixels of a reduced copy of `image`, as an (N, 3) uint8 array."""
+    factor = max(1, -(-max(image.size) // size))
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+    small = image.convert('RGBA' if has_alpha else 'RGB').reduce(factor)
+    pixels = np.asarray(small).reshape(-1, 4 if has_alpha else 3)
+    if has_alpha:
+        pixels = pixels[pixels[:, 3] > 127, :3]
+    return pixels
+
+def dominant_colors(images):
+    """The dominant color of each image, as a list of RGB tuples."""
+    samples = [sample_pixels(image) for image in images]
+    counts = np.array([len(sample) for sample in samples])
+    colors = [FALLBACK_COLOR] * len(samples)
+    if not counts.sum():
+        return colors
+    pixels = np.concatenate(samples)
+    owner = np.repeat(np.arange(len(samples)), counts)
+    quantized = (pixels >> (8 - QUANT_BITS)).astype(np.int64)
+    bins = (quantized[:, 0] << (2 * QUANT_BITS)) | (quantized[:, 1] << QUANT_BITS) | quantized[:, 2]
+    # One histogram row per image
+    histogram = np.bincount(owner * BINS + bins, minlength=len(samples) * BINS).reshape(len(samples), BINS)
+    best = histogram.argmax(axis=1)
+    in_best = bins == best[owner]
+    best_counts = histogram[np.arange(len(samples)), best]
+    sums = np.stack([np.bincount(owner[in_best], weights=pixels[in_best, channel], minlength=len(samples))
+                     for channel in range(3)], axis=1)
+    for i in np.flatnonzero(counts):
+        colors[i] = tuple(int(round(value)) for value in sums[i] / best_counts[i])
+    return colors
+
+def dominant_color(image):
+    return dominant_colors([image])[0]
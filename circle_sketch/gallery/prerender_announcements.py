@@ -0,0 +1,36 @@
+"""
+Render the theme banner for every prompt in PROMPT_LIST into the announcement
+cache, so starting a game never has to render one.
+
+    python -m circle_sketch.gallery.prerender_announcements          # render missing banners
+    python -m circle_sketch.gallery.prerender_announcements --force  # re-render all of them
+
+Uses the same CIRCLE_SKETCH_ANNOUNCEMENT_PROFILE and cache directory as the
+bot. Run it after editing prompts.py or changing the font.
+"""
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from ..prompts import PROMPT_LIST
+from .announcement_cache import AnnouncementCache
+from .gallery import render_theme_announcement
+
+
+def main(cache=None):
+    cache = cache or AnnouncementCache()
+    force = '--force' in sys.argv[1:]
+    themes = list(dict.fromkeys(PROMPT_LIST))
+    todo = [theme for theme in themes if force or not os.path.exists(cache.path(theme))]
+    if todo:
+        with ProcessPoolExecutor() as pool:
+            banners = pool.map(render_theme_announcement, todo, [cache.profile] * len(todo), chunksize=8)
+            for theme, data in zip(todo, banners):
+                cache.store(theme, data)
+    print(f"Rendered {len(todo)} theme banners ({len(themes) - len(todo)} already cached) into {cache.directory}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
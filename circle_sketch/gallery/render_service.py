@@ -0,0 +1,168 @@
+# Gallery rendering off the event loop.
+#
+# Decoding, resizing, compositing and PNG encoding are CPU-bound and hold the
+# GIL, so running them on the event loop (or a thread) freezes the bot for
+# every image. RenderService runs the render_* functions from gallery.py in a
+# process pool instead, so a whole gallery renders in parallel across cores.
+#
+# At most CIRCLE_SKETCH_RENDER_QUEUE_SIZE jobs are queued or running at once;
+# further callers wait for a slot. A job that takes longer than
+# CIRCLE_SKETCH_RENDER_TIMEOUT seconds raises RenderTimeout (the worker
+# finishes it in the background, it just isn't waited for, and it keeps its
+# queue slot until then). Each worker's
+# address space is capped at CIRCLE_SKETCH_RENDER_MEMORY_MB, so a render that
+# would blow past it fails with MemoryError instead of starving the host.
+#
+# Images are read from the submission store or downloaded through the shared
+# http_client on the event loop before a job is queued, so workers only ever
+# do CPU work.
+
+import asyncio
+import functools
+import io
+import multiprocessing
+import os
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from . import gallery, mosaic
+from .announcement_cache import AnnouncementCache
+from .avatar_cache import AvatarCache
+from .submission_store import submission_store
+
+RENDER_WORKERS = int(os.environ.get('CIRCLE_SKETCH_RENDER_WORKERS', 0)) or os.cpu_count() or 1
+RENDER_QUEUE_SIZE = int(os.environ.get('CIRCLE_SKETCH_RENDER_QUEUE_SIZE', 64))
+RENDER_TIMEOUT = float(os.environ.get('CIRCLE_SKETCH_RENDER_TIMEOUT', 30))
+# 0 disables the limit
+RENDER_MEMORY_MB = int(os.environ.get('CIRCLE_SKETCH_RENDER_MEMORY_MB', 1024))
+
+class RenderTimeout(Exception):
+    pass
+
+def _limit_worker_memory(limit_mb):
+    if resource is not None and limit_mb:
+        limit = limit_mb * 1024 * 1024
+        hard = resource.getrlimit(resource.RLIMIT_AS)[1]
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+class RenderService:
+    def __init__(self, max_workers=RENDER_WORKERS, max_queue=RENDER_QUEUE_SIZE, timeout=RENDER_TIMEOUT, avatars=None,
+                 announcements=None, drawings=None, memory_limit_mb=RENDER_MEMORY_MB):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.avatars = avatars or AvatarCache()
+        self.announcements = announcements or AnnouncementCache()
+        # Where drawings are read from: the local submission store, else their URL
+        self.drawings = drawings or submission_store
+        self._executor = None
+        self._slots = None
+        # Jobs waiting for a queue slot right now
+        self.waiting = 0
+
+    def _get_executor(self):
+        # Started on first use; spawn rather than fork, since the bot process
+        # already runs storage and logging threads.
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=_limit_worker_memory, initargs=(self.memory_limit_mb,))
+        return self._executor
+
+    async def render(self, fn, *args, **kwargs):
+        """Run `fn(*args)` in a worker process and return its result."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_queue)
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._get_executor(), functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is freed when the worker is done with the job, not when we
+        # stop waiting for it, so timed-out jobs still count against the queue
+        future.add_done_callback(self._job_done)
+        try:
+            # shield: a timeout mustn't cancel the future while a worker still runs it
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise RenderTimeout(f"{getattr(fn, '__name__', fn)} took longer than {self.timeout}s") from None
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool next time
+            self._executor = None
+            raise
+
+    def _job_done(self, future):
+        self._slots.release()
+        if not future.cancelled():
+            # Marks the error of a job nobody waited for as retrieved
+            future.exception()
+
+    async def gallery_image(self, theme, date_str, user, drawing_url):
+        """Async make_gallery_image: the card for one player's drawing, as a BytesIO."""
+        return io.BytesIO(await self.gallery_card(theme, date_str, user, drawing_url))
+
+    async def gallery_card(self, theme, date_str, user, drawing_url):
+        """The encoded card for one player's drawing."""
+        avatar_png, drawing_bytes = await asyncio.gather(self.avatar(user), self.drawings.get_bytes(drawing_url))
+        return await self.render(gallery.render_gallery_card_with_avatar, theme, date_str, user.display_name, avatar_png, drawing_bytes)
+
+    async def mosaic_tile(self, user, drawing_url):
+        """One player's mosaic tile, as raw RGBA bytes."""
+        avatar_png, drawing_bytes = await asyncio.gather(self.avatar(user), self.drawings.get_bytes(drawing_url))
+        return await self.render(mosaic.render_mosaic_tile, user.display_name, avatar_png, drawing_bytes)
+
+    async def gallery_mosaics(self, theme, date_str, entries, tile=None):
+        """Mosaic gallery images for [(user, drawing_url)], as BytesIOs.
+
+        `tile(user, drawing_url)` supplies each tile (mosaic_tile by default).
+        Returns (images, failures) where failures maps the user id of every
+        submission that couldn't be fetched or rendered to the exception,
+        including everyone on a page that failed to render.
+        """
+        tile = tile or self.mosaic_tile
+        results = await asyncio.gather(*(tile(user, url) for user, url in entries), return_exceptions=True)
+        failures = {user.id: result for (user, _), result in zip(entries, results) if isinstance(result, Exception)}
+        rendered = [(user, result) for (user, _), result in zip(entries, results) if not isinstance(result, Exception)]
+        tiles = [result for _, result in rendered]
+        layout = mosaic.mosaic_layout(len(tiles))
+        pages = await asyncio.gather(*(
+            self.render(mosaic.render_mosaic, theme, date_str, tiles[page.tiles], page.columns, page=(number, len(layout)))
+            for number, page in enumerate(layout, 1)), return_exceptions=True)
+        for page, result in zip(layout, pages):
+            if isinstance(result, Exception):
+                failures.update((user.id, result) for user, _ in rendered[page.tiles])
+        return [io.BytesIO(page) for page in pages if not isinstance(page, Exception)], failures
+
+    async def avatar(self, user):
+        """The user's resized, circle-masked avatar as PNG bytes, from the avatar cache.
+
+        `user`, here and above, is a PlayerProfile (see user_resolver.py).
+        """
+        return await self.avatars.get(user.avatar_key, user.avatar_url, lambda raw: self.render(gallery.render_avatar, raw))
+
+    async def theme_announcement_image(self, theme):
+        """Async make_theme_announcement_image, served from the announcement cache when possible."""
+        data = await asyncio.to_thread(self.announcements.load, theme)
+        if data is None:
+            data = await self.render(gallery.render_theme_announcement, theme, self.announcements.profile)
+            await asyncio.to_thread(self.announcements.store, theme, data)
+        return io.BytesIO(data)
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+# Shared by the cogs
+render_service = RenderService()
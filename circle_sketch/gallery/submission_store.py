@@ -0,0 +1,127 @@
+# Local copies of submitted drawings, named by content hash.
+#
+# A submission is only a Discord attachment URL, and signed CDN URLs can
+# expire before the gallery is posted hours later. So as soon as a submission
+# arrives, save() downloads it (through ingest.py's checks) into SUBMISSION_DIR
+# under the sha256 of its bytes (identical images are stored once), and the
+# hash is recorded with the submission in storage. Rendering then reads
+# drawings via get_bytes(), which serves the local copy and only falls back to
+# the URL if there is none.
+#
+# prune() applies the retention policy: files not used for
+# CIRCLE_SKETCH_SUBMISSION_RETENTION_DAYS are removed, then the least recently
+# used ones until the store fits in CIRCLE_SKETCH_SUBMISSION_STORE_BYTES.
+
+import asyncio
+import hashlib
+import os
+import time
+from .ingest import download_submission
+
+SUBMISSION_DIR = os.environ.get('CIRCLE_SKETCH_SUBMISSION_DIR', os.path.join(os.path.dirname(__file__), 'submissions'))
+SUBMISSION_RETENTION_DAYS = float(os.environ.get('CIRCLE_SKETCH_SUBMISSION_RETENTION_DAYS', 30))
+SUBMISSION_STORE_BYTES = int(os.environ.get('CIRCLE_SKETCH_SUBMISSION_STORE_BYTES', 2 * 1024 ** 3))
+
+class SubmissionStore:
+    def __init__(self, directory=SUBMISSION_DIR, retention_days=SUBMISSION_RETENTION_DAYS,
+                 max_bytes=SUBMISSION_STORE_BYTES, fetch=None):
+        self.directory = directory
+        self.retention_days = retention_days
+        self.max_bytes = max_bytes
+        self._fetch = fetch or download_submission
+        # url -> content hash, for submissions this process stored or was told about
+        self._hashes = {}
+        # url -> task saving it
+        self._pending = {}
+
+    def path(self, image_hash):
+        return os.path.join(self.directory, image_hash[:2], image_hash)
+
+    async def save(self, url):
+        """Download `url` into the store and return its content hash."""
+        if url not in self._pending:
+            task = asyncio.ensure_future(self._save(url))
+            self._pending[url] = task
+            task.add_done_callback(lambda done: self._pending.pop(url, None))
+        return await asyncio.shield(self._pending[url])
+
+    async def _save(self, url):
+        data = await self._fetch(url)
+        image_hash = hashlib.sha256(data).hexdigest()
+        await asyncio.to_thread(self._write, image_hash, data)
+        self._hashes[url] = image_hash
+        return image_hash
+
+    def remember(self, url, image_hash):
+        """Note that `url` is stored under `image_hash` (e.g. as recorded in storage before a restart)."""
+        self._hashes[url] = image_hash
+
+    async def get_bytes(self, url):
+        """The image at `url`, from the store if it has been saved there."""
+        pending = self._pending.get(url)
+        if pending is not None:
+            # Still being saved; don't download it twice
+            try:
+                await asyncio.shield(pending)
+            except Exception:
+                pass
+        image_hash = self._hashes.get(url)
+        if image_hash is not None:
+            data = await asyncio.to_thread(self.load, image_hash)
+            if data is not None:
+                return data
+        return await self._fetch(url)
+
+    def load(self, image_hash):
+        try:
+            with open(self.path(image_hash), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        # mtime marks last use for prune()
+        os.utime(self.path(image_hash))
+        return data
+
+    def _write(self, image_hash, data):
+        path = self.path(image_hash)
+        if os.path.exists(path):
+            os.utime(path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def prune(self, now=None):
+        """Apply the retention policy; returns (files removed, bytes freed)."""
+        now = time.time() if now is None else now
+        cutoff = now - self.retention_days * 86400
+        entries = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        removed = freed = 0
+        for mtime, size, path in entries:
+            if mtime >= cutoff and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            removed += 1
+            freed += size
+        if removed:
+            self._hashes = {url: h for url, h in self._hashes.items() if os.path.exists(self.path(h))}
+        return removed, freed
+
+# Shared by the cogs and the render service
+submission_store = SubmissionStore()
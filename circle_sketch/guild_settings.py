@@ -0,0 +1,45 @@
+# Per-guild game settings: the channel games are announced in and the daily
+# time (America/New_York) when one game ends and the next starts. Guilds that
+# haven't configured them use GAME_CHANNEL_ID and DEFAULT_GAME_TIME.
+
+import datetime
+from .config import GAME_CHANNEL_ID
+from .storage.storage import AsyncStorage
+
+DEFAULT_GAME_TIME = '17:00'
+
+# Settings only change through the setters below, so read each guild's once.
+_settings = {}
+
+def parse_game_time(value):
+    """Return a 'HH:MM' string for a valid 24-hour time, or raise ValueError."""
+    return datetime.datetime.strptime(value.strip(), '%H:%M').strftime('%H:%M')
+
+def next_game_time(game_time, now):
+    """The next occurrence of `game_time` ('HH:MM') after the aware datetime `now`."""
+    hour, minute = map(int, game_time.split(':'))
+    next_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if now >= next_time:
+        next_time += datetime.timedelta(days=1)
+    return next_time
+
+async def get_settings(guild_id):
+    if guild_id not in _settings:
+        _settings[guild_id] = await AsyncStorage.get_guild_settings(guild_id)
+    return _settings[guild_id]
+
+async def get_game_channel(bot, guild_id):
+    settings = await get_settings(guild_id)
+    return bot.get_channel(settings['channel_id'] or GAME_CHANNEL_ID)
+
+async def get_game_time(guild_id):
+    settings = await get_settings(guild_id)
+    return settings['game_time'] or DEFAULT_GAME_TIME
+
+async def set_game_channel(guild_id, channel_id):
+    await AsyncStorage.set_guild_settings(guild_id, channel_id=channel_id)
+    _settings.pop(guild_id, None)
+
+async def set_game_time(guild_id, game_time):
+    await AsyncStorage.set_guild_settings(guild_id, game_time=parse_game_time(game_time))
+    _settings.pop(guild_id, None)
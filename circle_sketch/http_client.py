@@ -0,0 +1,115 @@
+# One aiohttp session for the whole bot.
+#
+# Avatars, drawings and submission downloads all go through `http_client`, so
+# connections to Discord's CDN are kept alive and reused instead of opening a
+# new session (and TLS handshake) per image. The connector caps how many
+# requests run at once in total and per host, every request has a timeout, and
+# connection errors, timeouts and 429/5xx responses are retried with backoff.
+#
+# get_bytes() can also cap the body size: the Content-Length is checked before
+# anything is read, and the body is streamed in chunks so a server that lies
+# about it is cut off as soon as the cap is passed. An `inspect` callback sees
+# the body as it arrives and can reject it early, e.g. after the image header.
+
+import asyncio
+import os
+import aiohttp
+
+HTTP_MAX_CONNECTIONS = int(os.environ.get('CIRCLE_SKETCH_HTTP_MAX_CONNECTIONS', 100))
+HTTP_MAX_PER_HOST = int(os.environ.get('CIRCLE_SKETCH_HTTP_MAX_PER_HOST', 16))
+HTTP_TIMEOUT = float(os.environ.get('CIRCLE_SKETCH_HTTP_TIMEOUT', 20))
+HTTP_RETRIES = int(os.environ.get('CIRCLE_SKETCH_HTTP_RETRIES', 3))
+HTTP_RETRY_BACKOFF = float(os.environ.get('CIRCLE_SKETCH_HTTP_RETRY_BACKOFF', 0.5))
+
+HTTP_CHUNK_SIZE = 64 * 1024
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class HttpError(Exception):
+    def __init__(self, url, status):
+        super().__init__(f"GET {url} failed with HTTP {status}")
+        self.url = url
+        self.status = status
+
+class ResponseTooLarge(Exception):
+    def __init__(self, url, max_bytes):
+        super().__init__(f"GET {url} returned more than {max_bytes} bytes")
+        self.url = url
+        self.max_bytes = max_bytes
+
+class HttpClient:
+    def __init__(self, max_connections=HTTP_MAX_CONNECTIONS, max_per_host=HTTP_MAX_PER_HOST,
+                 timeout=HTTP_TIMEOUT, retries=HTTP_RETRIES, backoff=HTTP_RETRY_BACKOFF):
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._session = None
+
+    def _get_session(self):
+        # Created on first use so it binds to the running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.max_per_host)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def get_bytes(self, url, max_bytes=None, inspect=None, retries=None):
+        """Download `url` and return the body, retrying transient failures.
+
+        With `max_bytes`, raises ResponseTooLarge rather than reading a bigger
+        body. `inspect(body, complete)` is called with the body read so far
+        after each chunk until it returns True; it can raise to abandon the
+        download. `complete` is True once the whole body has been read.
+        `retries` overrides the client's retry count for this request.
+        """
+        session = self._get_session()
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            last_attempt = attempt == retries
+            try:
+                async with session.get(url) as resp:
+                    if resp.status == 200:
+                        if max_bytes is None and inspect is None:
+                            return await resp.read()
+                        return await self._read_capped(url, resp, max_bytes, inspect)
+                    if resp.status not in RETRY_STATUSES or last_attempt:
+                        raise HttpError(url, resp.status)
+                    retry_after = resp.headers.get('Retry-After')
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError):
+                if last_attempt:
+                    raise
+                retry_after = None
+            delay = self.backoff * 2 ** attempt
+            if retry_after:
+                try:
+                    delay = max(delay, float(retry_after))
+                except ValueError:
+                    pass
+            await asyncio.sleep(delay)
+
+    async def _read_capped(self, url, resp, max_bytes, inspect):
+        if max_bytes is not None and resp.content_length is not None and resp.content_length > max_bytes:
+            raise ResponseTooLarge(url, max_bytes)
+        body = bytearray()
+        async for chunk in resp.content.iter_chunked(HTTP_CHUNK_SIZE):
+            body += chunk
+            if max_bytes is not None and len(body) > max_bytes:
+                raise ResponseTooLarge(url, max_bytes)
+            if inspect is not None and inspect(body, False):
+                inspect = None
+        if inspect is not None:
+            inspect(body, True)
+        return bytes(body)
+
+    async def get_many(self, urls):
+        """Download every url concurrently; returns bodies in the same order."""
+        return await asyncio.gather(*(self.get_bytes(url) for url in urls))
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+# Shared by the cogs, gallery rendering and storage
+http_client = HttpClient()
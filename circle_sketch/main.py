@@ -50,29 +50,28 @@ def console_control():
             print("Shutting down bot...")
             os._exit(0)
         elif cmd.strip().lower() == "status":
-            # Print detailed game status
+            # Print detailed game status for every guild with a game running
             from .storage.storage_sqlite import Storage
             import datetime
-            from .config import GAME_CHANNEL_ID
+            from .guild_settings import DEFAULT_GAME_TIME, next_game_time
             from pytz import timezone
             EST = timezone('America/New_York')
-            state = Storage.get_game_state()
-            if not state or 'theme' not in state:
+            guild_ids = Storage.get_active_game_guilds()
+            if not guild_ids:
                 print("No game is currently running.")
-            else:
+            for guild_id in guild_ids:
+                state = Storage.get_game_state(guild_id=guild_id)
                 theme = state['theme']
                 date = state.get('date', 'unknown')
                 user_ids = state.get('user_ids', [])
                 gallery = state.get('gallery', {})
                 now = datetime.datetime.now(EST)
-                next_end = now.replace(hour=17, minute=0, second=0, microsecond=0)
-                if now >= next_end:
-                    next_end += datetime.timedelta(days=1)
-                time_left = next_end - now
+                game_time = Storage.get_guild_settings(guild_id)['game_time'] or DEFAULT_GAME_TIME
+                time_left = next_game_time(game_time, now) - now
                 hours, remainder = divmod(time_left.seconds, 3600)
                 minutes, seconds = divmod(remainder, 60)
                 time_left_str = f"{hours}h {minutes}m {seconds}s"
-                print(f"\n=== CircleSketch Game Status ===\n"
+                print(f"\n=== CircleSketch Game Status (guild {guild_id}) ===\n"
                       f"Theme: {theme}\n"
                       f"Started: {date}\n"
                       f"Players in circle: {len(user_ids)}\n"
@@ -82,8 +81,28 @@ def console_control():
             from .storage.storage_sqlite import Storage
             Storage.reset_all_streaks()
             print("All streaks have been reset.")
+        elif cmd.strip().lower() == "reload_state":
+            # Use after another process changed the game state in the shared database
+            from .storage.storage import game_state_cache
+            game_state_cache.invalidate()
+            print("Cached game state dropped; it will be reloaded on next use.")
+        elif cmd.strip().lower() == "avatar_cache":
+            from .gallery.render_service import render_service
+            stats = render_service.avatars.stats()
+            print(f"Avatar cache: {stats['memory_hits']} memory hits, {stats['disk_hits']} disk hits, {stats['misses']} misses; "
+                  f"{stats['memory_items']} in memory, {stats['disk_items']} on disk ({stats['disk_bytes']} bytes)")
+        elif cmd.strip().lower() == "gallery_cards":
+            from .gallery.card_store import gallery_prerenderer
+            stats = gallery_prerenderer.stats()
+            print(f"Gallery cards since startup: {stats['ready']} ready in time, {stats['waited']} still rendering, "
+                  f"{stats['rendered_late']} rendered at game end")
+        elif cmd.strip().lower() == "user_cache":
+            from .user_resolver import user_resolver
+            stats = user_resolver.stats()
+            print(f"Player lookups: {stats['gateway_cache']} from the gateway cache, {stats['profile_cache']} from the profile cache, "
+                  f"{stats['member_query']} by member query, {stats['rest']} over REST; {stats['profiles']} profiles cached")
         elif cmd.strip().lower() == "help":
-            print("Available commands: stop, status, reset_streaks, help")
+            print("Available commands: stop, status, reset_streaks, reload_state, avatar_cache, gallery_cards, user_cache, help")
 
 def handle_sigint(sig, frame):
     print("\nReceived Ctrl+C, shutting down bot gracefully...")
@@ -143,7 +162,12 @@ def run_bot():
         while not shutdown_event.is_set():
             await asyncio.sleep(0.2)
         await bot.close()
+        from .gallery.render_service import render_service
+        render_service.shutdown(wait=False)
+        from .http_client import http_client
+        await http_client.close()
         log_success("Bot shutdown complete.")
     return runner()
 
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# Async facade over the synchronous storage backends.
+#
+# Every Storage call does blocking database I/O. Running it straight from a
+# discord.py handler stalls the gateway heartbeat and every other interaction,
+# so the cogs go through AsyncStorage instead, which runs each call on a
+# dedicated thread pool and awaits the result.
+
+import asyncio
+import functools
+import inspect
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+DB_WORKERS = int(os.environ.get('CIRCLE_SKETCH_DB_WORKERS', 4))
+
+class AsyncStorageFacade:
+    """Awaitable mirror of a Storage class: `await AsyncStorage.get_game_state()`."""
+
+    def __init__(self, storage, max_workers=DB_WORKERS):
+        self._storage = storage
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='storage')
+        self._wrappers = {}
+
+    def __getattr__(self, name):
+        try:
+            return self._wrappers[name]
+        except KeyError:
+            pass
+        attr = getattr(self._storage, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+        if inspect.iscoroutinefunction(attr):
+            wrapper = attr
+        else:
+            wrapper = self._wrap(attr)
+        self._wrappers[name] = wrapper
+        return wrapper
+
+    def _wrap(self, fn):
+        @functools.wraps(fn)
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        return call
+
+    async def run(self, fn, *args, **kwargs):
+        """Run `fn(storage, *args)` on the storage pool, for ad-hoc queries."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, self._storage, *args, **kwargs))
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,17 @@
+# Exceptions shared by the storage backends.
+
+class StaleGameStateError(Exception):
+    """Raised when a game state write was based on an outdated version."""
+
+    def __init__(self, expected_version, current_version):
+        super().__init__(f"Game state is at version {current_version}, write expected {expected_version}")
+        self.expected_version = expected_version
+        self.current_version = current_version
+
+class CircleFullError(Exception):
+    """Raised when adding a player would take a circle past its limit."""
+
+    def __init__(self, guild_id, limit):
+        super().__init__(f"Circle for guild {guild_id} is full ({limit} players)")
+        self.guild_id = guild_id
+        self.limit = limit
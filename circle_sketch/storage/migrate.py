@@ -0,0 +1,41 @@
+"""
+Apply or inspect schema migrations without starting the bot.
+
+    python -m circle_sketch.storage.migrate           # apply pending migrations
+    python -m circle_sketch.storage.migrate --status  # show current and latest version
+
+Uses the same backend selection as the bot (CIRCLE_SKETCH_DB_BACKEND). Run it
+before deploying when CIRCLE_SKETCH_AUTO_MIGRATE=0.
+"""
+
+import os
+import sys
+
+# Don't let importing the backend migrate (or exit) on its own
+os.environ['CIRCLE_SKETCH_SKIP_INIT'] = '1'
+
+from .migrations import latest_version
+from .storage import Storage, backend
+
+
+def main():
+    migrations = sys.modules[Storage.__module__].MIGRATIONS
+    current = Storage.schema_version()
+    latest = latest_version(migrations)
+    if '--status' in sys.argv[1:]:
+        print(f"{backend}: schema version {current}, latest {latest}")
+        for migration in migrations:
+            mark = 'x' if migration.version <= current else ' '
+            print(f"  [{mark}] {migration.version}: {migration.name}")
+        return 0 if current >= latest else 1
+    applied = Storage.migrate()
+    if not applied:
+        print(f"{backend}: schema is up to date (version {current})")
+    else:
+        print(f"{backend}: migrated from version {current} to {applied[-1].version}")
+    Storage.close_connections()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+# Versioned schema migrations shared by the storage backends.
+#
+# Each backend lists its migrations in order. A migration has a version, a
+# name and a list of steps; a step is either an SQL string or a callable that
+# takes the cursor. Applied versions are recorded in schema_version, so
+# startup only compares one number instead of re-running DDL every time.
+#
+# Pending migrations are applied on startup unless CIRCLE_SKETCH_AUTO_MIGRATE
+# is set to 0, in which case run them offline first:
+#     python -m circle_sketch.storage.migrate
+
+import json
+import os
+import time
+from collections import namedtuple
+
+Migration = namedtuple('Migration', ['version', 'name', 'steps'])
+
+AUTO_MIGRATE = os.environ.get('CIRCLE_SKETCH_AUTO_MIGRATE', '1') != '0'
+
+SCHEMA_VERSION_DDL = '''CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR(128) NOT NULL,
+    applied_at DOUBLE NOT NULL
+)'''
+
+def latest_version(migrations):
+    return migrations[-1].version if migrations else 0
+
+def get_schema_version(cursor):
+    """Highest applied migration, or 0 for a database that predates migrations."""
+    try:
+        cursor.execute('SELECT MAX(version) FROM schema_version')
+    except Exception:
+        return 0
+    row = cursor.fetchone()
+    return row[0] if row and row[0] is not None else 0
+
+def apply_migrations(conn, migrations, placeholder='?', begin=None, log=print):
+    """Apply every migration newer than the recorded version; return those applied.
+
+    `begin` opens the per-migration transaction (e.g. BEGIN IMMEDIATE on
+    SQLite, which also keeps two processes from migrating at once).
+    """
+    cursor = conn.cursor()
+    cursor.execute(SCHEMA_VERSION_DDL)
+    conn.commit()
+    applied = []
+    current = get_schema_version(cursor)
+    for migration in [m for m in migrations if m.version > current]:
+        if begin:
+            cursor.execute(begin)
+        try:
+            # Re-check under the lock: another process may have got here first
+            if get_schema_version(cursor) >= migration.version:
+                conn.rollback()
+                continue
+            log(f"Applying schema migration {migration.version}: {migration.name}")
+            for step in migration.steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+            cursor.execute(f'INSERT INTO schema_version (version, name, applied_at) VALUES ({placeholder}, {placeholder}, {placeholder})',
+                           (migration.version, migration.name, time.time()))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(migration)
+    return applied
+
+def legacy_guild_id(cursor):
+    """The guild that owns data from before game state was kept per guild.
+
+    That is the guild recorded in the game state, else the only guild with
+    players, else 0.
+    """
+    cursor.execute('SELECT state FROM game_state')
+    row = cursor.fetchone()
+    if row and row[0]:
+        guild_id = json.loads(row[0]).get('guild_id')
+        if guild_id is not None:
+            return guild_id
+    cursor.execute('SELECT DISTINCT guild_id FROM player_circle WHERE guild_id IS NOT NULL')
+    rows = cursor.fetchall()
+    return rows[0][0] if len(rows) == 1 else 0
+
+def split_game_state_blob(cursor, placeholder, insert_ignore):
+    """Move user_ids/submissions/gallery out of a pre-normalization game_state blob."""
+    player_keys = ('user_ids', 'submissions', 'gallery')
+    cursor.execute('SELECT state FROM game_state WHERE id=1')
+    row = cursor.fetchone()
+    if not (row and row[0]):
+        return
+    state = json.loads(row[0])
+    if not any(key in state for key in player_keys):
+        return
+    game_id = state.get('game_id')
+    if game_id is None and 'theme' in state:
+        cursor.execute(f'INSERT INTO games (theme, date) VALUES ({placeholder}, {placeholder})', (state['theme'], state.get('date')))
+        game_id = state['game_id'] = cursor.lastrowid
+    if game_id is not None:
+        for uid in state.get('user_ids', []):
+            cursor.execute(f'{insert_ignore} INTO game_participants (game_id, user_id) VALUES ({placeholder}, {placeholder})',
+                           (game_id, int(uid)))
+        submissions = {**state.get('gallery', {}), **state.get('submissions', {})}
+        for uid, url in submissions.items():
+            cursor.execute(f'{insert_ignore} INTO game_submissions (game_id, user_id, image_url, submitted_at) '
+                           f'VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder})',
+                           (game_id, int(uid), url, time.time()))
+    core = {key: value for key, value in state.items() if key not in player_keys}
+    cursor.execute(f'UPDATE game_state SET state={placeholder} WHERE id=1', (json.dumps(core),))
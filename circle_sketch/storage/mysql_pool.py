@@ -0,0 +1,172 @@
+# Bounded connection pool for the MySQL backend.
+#
+# Opening a MySQL connection costs a TCP handshake plus authentication, which
+# on a hosted database is most of the latency of a small query. The pool keeps
+# up to `size` connections open, hands them out LIFO so the warmest one is
+# reused, pings connections that have sat idle before handing them out again,
+# and transparently replaces ones that have gone away.
+
+import threading
+import time
+
+class PoolError(Exception):
+    pass
+
+class PoolTimeout(PoolError):
+    pass
+
+class PooledConnection:
+    """Proxy for a pooled connection. close() returns it to the pool."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise PoolError("Connection has already been returned to the pool")
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._conn is not None:
+            # Don't hand a connection that just failed to the next caller.
+            conn, self._conn = self._conn, None
+            self._pool.discard(conn)
+
+class ConnectionPool:
+    def __init__(self, connect, size=5, timeout=10.0, health_check_interval=30.0,
+                 connect_retries=3, retry_backoff=0.5):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.connect_retries = connect_retries
+        self.retry_backoff = retry_backoff
+        self._idle = []  # (conn, returned_at), most recently used last
+        self._open = 0
+        self._cond = threading.Condition()
+        self._metrics = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'timeouts': 0,
+            'connects': 0,
+            'reconnects': 0,
+            'failures': 0,
+        }
+
+    def acquire(self, verify=False):
+        """A connection, waiting up to `timeout` for one to be free.
+
+        With `verify`, an idle connection is pinged however recently it was
+        used, for callers that can't safely retry a statement on a dead one.
+        """
+        deadline = time.monotonic() + self.timeout
+        waited_since = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    # Reserve the slot now and connect outside the lock.
+                    self._open += 1
+                    conn, returned_at = None, None
+                    break
+                if waited_since is None:
+                    waited_since = time.monotonic()
+                    self._metrics['waits'] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._metrics['timeouts'] += 1
+                    raise PoolTimeout(f"No MySQL connection available within {self.timeout}s")
+                self._cond.wait(remaining)
+            if waited_since is not None:
+                self._metrics['wait_time'] += time.monotonic() - waited_since
+        try:
+            if conn is None:
+                conn = self._new_connection()
+            elif (verify or time.monotonic() - returned_at > self.health_check_interval) and not self._is_healthy(conn):
+                self._close_quietly(conn)
+                with self._cond:
+                    self._metrics['reconnects'] += 1
+                conn = self._new_connection()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._metrics['checkouts'] += 1
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def discard(self, conn):
+        """Drop a connection that is known to be broken instead of reusing it."""
+        self._close_quietly(conn)
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def metrics(self):
+        with self._cond:
+            stats = dict(self._metrics)
+            stats['size'] = self.size
+            stats['open'] = self._open
+            stats['idle'] = len(self._idle)
+        return stats
+
+    def _new_connection(self):
+        last_error = None
+        for attempt in range(self.connect_retries):
+            try:
+                conn = self._connect()
+            except Exception as e:
+                last_error = e
+                with self._cond:
+                    self._metrics['failures'] += 1
+                if attempt + 1 < self.connect_retries:
+                    time.sleep(self.retry_backoff * (2 ** attempt))
+                continue
+            with self._cond:
+                self._metrics['connects'] += 1
+            return conn
+        raise PoolError(f"Could not connect to MySQL after {self.connect_retries} attempts: {last_error}")
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -0,0 +1,178 @@
+# In-process write-through cache of each guild's active game state.
+#
+# on_message sees every DM the bot receives, and the status commands and
+# join_circle all need the current game. Instead of a database read plus JSON
+# parse each time, the cogs go through GameStateCache, which loads a guild's
+# state once and then keeps it up to date as this process writes to it.
+#
+# Writes carry the version the cache last saw, so if something else changed
+# the state in the meantime the write is rejected with StaleGameStateError
+# and the cache reloads. When several processes share one database, call
+# invalidate() (or set CIRCLE_SKETCH_STATE_CACHE_TTL) after another process
+# writes so this one picks the change up.
+
+import asyncio
+import os
+import time
+from collections import defaultdict
+from .errors import StaleGameStateError
+
+PLAYER_KEYS = ('user_ids', 'submissions', 'gallery')
+
+# Seconds before a cached state is re-read even without a write; 0 never expires.
+STATE_CACHE_TTL = float(os.environ.get('CIRCLE_SKETCH_STATE_CACHE_TTL', 0))
+
+class _GuildState:
+    """What the cache knows about one guild's game."""
+
+    def __init__(self):
+        self.loaded = False
+        self.loaded_at = 0.0
+        self.core = None
+        self.version = 0
+        self.participants = set()
+        self.submissions = {}
+
+class GameStateCache:
+    def __init__(self, storage, ttl=STATE_CACHE_TTL):
+        self._storage = storage
+        self.ttl = ttl
+        self._guilds = defaultdict(_GuildState)
+        # One lock per guild so loads and writes for different guilds overlap
+        self._locks = defaultdict(asyncio.Lock)
+        self._all_loaded = False
+        self._all_loaded_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self, guild_id=None):
+        """Forget one guild's cached state, or every guild's. Safe from any thread."""
+        if guild_id is None:
+            self._all_loaded = False
+            for entry in list(self._guilds.values()):
+                entry.loaded = False
+        else:
+            self._guilds[guild_id].loaded = False
+
+    def version(self, guild_id):
+        return self._guilds[guild_id].version
+
+    async def get(self, guild_id, include_players=False):
+        """Return a copy of the guild's state (same shape as Storage.get_game_state), or None."""
+        entry = await self._ensure_loaded(guild_id)
+        if entry.core is None:
+            return None
+        state = dict(entry.core)
+        state['version'] = entry.version
+        if include_players and state.get('game_id') is not None:
+            state['user_ids'] = sorted(entry.participants)
+            state['submissions'] = dict(entry.submissions)
+            state['gallery'] = dict(entry.submissions)
+        return state
+
+    async def set(self, guild_id, state):
+        """Write the guild's state through to storage, rejecting it if the cache was stale."""
+        entry = await self._ensure_loaded(guild_id)
+        async with self._locks[guild_id]:
+            try:
+                version = await self._storage.set_game_state(state, expected_version=entry.version, guild_id=guild_id)
+            except StaleGameStateError:
+                entry.loaded = False
+                raise
+            previous_game_id = entry.core.get('game_id') if entry.core else None
+            if state is None:
+                entry.core = None
+            else:
+                entry.core = {key: value for key, value in state.items() if key not in PLAYER_KEYS and key != 'version'}
+            entry.version = version
+            game_id = entry.core.get('game_id') if entry.core else None
+            if game_id != previous_game_id:
+                entry.participants = set()
+                entry.submissions = {}
+            if state is not None:
+                entry.participants.update(int(uid) for uid in state.get('user_ids', []))
+                for uid, url in {**state.get('gallery', {}), **state.get('submissions', {})}.items():
+                    entry.submissions.setdefault(int(uid), url)
+            return version
+
+    async def is_participant(self, guild_id, game_id, user_id):
+        entry = await self._ensure_loaded(guild_id)
+        return self._is_current(entry, game_id) and user_id in entry.participants
+
+    async def has_submitted(self, guild_id, game_id, user_id):
+        entry = await self._ensure_loaded(guild_id)
+        return self._is_current(entry, game_id) and user_id in entry.submissions
+
+    async def add_participant(self, guild_id, game_id, user_id):
+        added = await self._storage.add_game_participant(game_id, user_id)
+        entry = self._guilds[guild_id]
+        if self._is_current(entry, game_id):
+            entry.participants.add(user_id)
+        return added
+
+    async def record_submission(self, guild_id, game_id, user_id, image_url):
+        """Record a submission. Returns False if the player had already submitted."""
+        if await self.has_submitted(guild_id, game_id, user_id):
+            return False
+        recorded = await self._storage.record_submission(game_id, user_id, image_url)
+        entry = self._guilds[guild_id]
+        if recorded and self._is_current(entry, game_id):
+            entry.submissions[user_id] = image_url
+        elif not recorded:
+            # Recorded by someone else; reload to pick up what they stored.
+            entry.loaded = False
+        return recorded
+
+    async def games_for_user(self, user_id):
+        """Return [(guild_id, state)] for every running game the user plays in, oldest first."""
+        if not (self._all_loaded and not self._expired(self._all_loaded_at)):
+            # Learn which guilds have a game; after that this process's own
+            # writes keep the set current.
+            guild_ids = await self._storage.get_active_game_guilds()
+            await asyncio.gather(*(self._ensure_loaded(guild_id) for guild_id in guild_ids))
+            self._all_loaded = True
+            self._all_loaded_at = time.monotonic()
+        games = []
+        for guild_id in list(self._guilds):
+            entry = await self._ensure_loaded(guild_id)
+            if entry.core and entry.core.get('game_id') is not None and user_id in entry.participants:
+                state = dict(entry.core)
+                state['version'] = entry.version
+                games.append((guild_id, state))
+        games.sort(key=lambda game: game[1]['game_id'])
+        return games
+
+    @staticmethod
+    def _is_current(entry, game_id):
+        return entry.core is not None and entry.core.get('game_id') == game_id
+
+    async def _ensure_loaded(self, guild_id):
+        entry = self._guilds[guild_id]
+        if entry.loaded and not self._expired(entry.loaded_at):
+            self.hits += 1
+            return entry
+        async with self._locks[guild_id]:
+            if entry.loaded and not self._expired(entry.loaded_at):
+                self.hits += 1
+                return entry
+            self.misses += 1
+            # Read the version first: if a write lands in between, the cache
+            # ends up behind and its next write is rejected rather than lost.
+            version = await self._storage.get_game_state_version(guild_id=guild_id)
+            state = await self._storage.get_game_state(guild_id=guild_id)
+            if state is None:
+                entry.version = version
+                entry.core = None
+                entry.participants = set()
+                entry.submissions = {}
+            else:
+                entry.version = state.get('version', 0)
+                entry.core = {key: value for key, value in state.items() if key not in PLAYER_KEYS and key != 'version'}
+                entry.participants = set(int(uid) for uid in state.get('user_ids', []))
+                entry.submissions = {int(uid): url for uid, url in state.get('submissions', {}).items()}
+            entry.loaded = True
+            entry.loaded_at = time.monotonic()
+        return entry
+
+    def _expired(self, loaded_at):
+        return self.ttl > 0 and time.monotonic() - loaded_at > self.ttl
@@ -7,3 +7,13 @@ if backend == "mysql":
     from .storage_mysql import MySQLStorage as Storage
 else:
     from .storage_sqlite import Storage
+
+from .async_storage import AsyncStorageFacade
+
+# What the cogs use: the selected backend, run off the event loop.
+AsyncStorage = AsyncStorageFacade(Storage)
+
+from .state_cache import GameStateCache
+
+# The active game, cached in-process and written through to storage.
+game_state_cache = GameStateCache(AsyncStorage)
@@ -5,64 +5,336 @@ import json
 import os
 import sys
 import tempfile
-import aiohttp
+import threading
+import time
+from functools import partial
+from ..http_client import http_client
+from .errors import CircleFullError, StaleGameStateError
+from .migrations import AUTO_MIGRATE, Migration, apply_migrations, get_schema_version, latest_version, legacy_guild_id, split_game_state_blob
 
-DB_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'storage.sqlite3')
+DB_PATH = os.environ.get(
+    'CIRCLE_SKETCH_SQLITE_PATH',
+    os.path.join(os.path.dirname(__file__), '..', '..', 'storage.sqlite3'),
+)
+
+# Compiled statements kept per connection; every query in this module fits.
+STATEMENT_CACHE_SIZE = 256
+
+# Applied once when a connection is opened. WAL lets readers run alongside the
+# writer and NORMAL sync is durable across application crashes in WAL mode.
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('busy_timeout', 5000),
+    ('temp_store', 'MEMORY'),
+    ('foreign_keys', 'ON'),
+)
+
+# Per-player parts of the game state. They live in game_participants and
+# game_submissions rather than in the game_state JSON blob, so a submission is
+# a single-row insert instead of a rewrite of the whole state.
+PLAYER_KEYS = ('user_ids', 'submissions', 'gallery')
+
+# Bookkeeping fields added to the state by get_game_state(); never stored in the blob.
+META_KEYS = ('version',)
+
+# Stay well under SQLite's bound-parameter limit for `IN (...)` lists.
+MAX_IN_PARAMS = 500
+
+# Game state, streaks and settings are kept per guild. Callers that don't pass
+# a guild (and data from before the split) use guild 0.
+DEFAULT_GUILD_ID = 0
+
+# Games per page of get_game_history() unless the caller asks for another size.
+HISTORY_PAGE_SIZE = 10
+
+# Leaderboard orderings and the (table, column) each one reads top-down from an index.
+LEADERBOARD_ORDERS = {
+    'submissions': ('user_stats', 'submissions'),
+    'best_streak': ('user_stats', 'best_streak'),
+    'streak': ('user_streaks', 'streak'),
+}
+
+def _add_game_state_version(cursor):
+    # Databases created before optimistic locking lack the version column
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(game_state)')]
+    if 'version' not in columns:
+        cursor.execute('ALTER TABLE game_state ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+
+def _key_state_by_guild(cursor):
+    # Everything that was a singleton row moves to the guild that owned it
+    guild_id = legacy_guild_id(cursor)
+    cursor.execute('SELECT state, version FROM game_state WHERE id=1')
+    row = cursor.fetchone()
+    cursor.execute('''CREATE TABLE game_state_by_guild (
+        guild_id INTEGER PRIMARY KEY,
+        game_id INTEGER,
+        state TEXT,
+        version INTEGER NOT NULL DEFAULT 0
+    )''')
+    if row:
+        game_id = json.loads(row[0]).get('game_id') if row[0] else None
+        cursor.execute('INSERT INTO game_state_by_guild (guild_id, game_id, state, version) VALUES (?, ?, ?, ?)',
+                       (guild_id, game_id, row[0], row[1]))
+    cursor.execute('DROP TABLE game_state')
+    cursor.execute('ALTER TABLE game_state_by_guild RENAME TO game_state')
+    cursor.execute('''CREATE TABLE group_streak_by_guild (
+        guild_id INTEGER PRIMARY KEY,
+        streak INTEGER DEFAULT 0
+    )''')
+    cursor.execute('INSERT INTO group_streak_by_guild (guild_id, streak) SELECT ?, streak FROM group_streak WHERE id=1', (guild_id,))
+    cursor.execute('DROP TABLE group_streak')
+    cursor.execute('ALTER TABLE group_streak_by_guild RENAME TO group_streak')
+    cursor.execute('''CREATE TABLE user_streaks_by_guild (
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        streak INTEGER DEFAULT 0,
+        PRIMARY KEY (guild_id, user_id)
+    )''')
+    cursor.execute('INSERT INTO user_streaks_by_guild (guild_id, user_id, streak) SELECT ?, user_id, streak FROM user_streaks', (guild_id,))
+    cursor.execute('DROP TABLE user_streaks')
+    cursor.execute('ALTER TABLE user_streaks_by_guild RENAME TO user_streaks')
+    cursor.execute('ALTER TABLE games ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('UPDATE games SET guild_id=?', (guild_id,))
+
+def _key_circle_by_guild(cursor):
+    # player_circle was keyed by user_id alone, so a player could only be in
+    # one guild's circle. The new key also covers the per-guild lookups, so
+    # idx_player_circle_guild goes with the old table.
+    cursor.execute('''CREATE TABLE player_circle_by_guild (
+        guild_id INTEGER,
+        user_id INTEGER NOT NULL,
+        PRIMARY KEY (guild_id, user_id)
+    )''')
+    cursor.execute('INSERT INTO player_circle_by_guild (guild_id, user_id) SELECT guild_id, user_id FROM player_circle')
+    cursor.execute('DROP TABLE player_circle')
+    cursor.execute('ALTER TABLE player_circle_by_guild RENAME TO player_circle')
+
+# Append new migrations at the end; never edit one that has shipped.
+MIGRATIONS = [
+    Migration(1, 'baseline', [
+        '''CREATE TABLE IF NOT EXISTS player_circle (
+            user_id INTEGER PRIMARY KEY,
+            guild_id INTEGER
+        )''',
+        '''CREATE TABLE IF NOT EXISTS game_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            state TEXT,
+            version INTEGER NOT NULL DEFAULT 0
+        )''',
+        _add_game_state_version,
+        '''CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            submissions INTEGER DEFAULT 0
+        )''',
+        '''CREATE TABLE IF NOT EXISTS group_streak (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            streak INTEGER DEFAULT 0
+        )''',
+        '''CREATE TABLE IF NOT EXISTS bot_flags (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )''',
+        '''CREATE TABLE IF NOT EXISTS user_streaks (
+            user_id INTEGER PRIMARY KEY,
+            streak INTEGER DEFAULT 0
+        )''',
+        '''CREATE TABLE IF NOT EXISTS games (
+            game_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            theme TEXT,
+            date TEXT
+        )''',
+        '''CREATE TABLE IF NOT EXISTS game_participants (
+            game_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            PRIMARY KEY (game_id, user_id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS game_submissions (
+            game_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            image_url TEXT NOT NULL,
+            submitted_at REAL NOT NULL,
+            PRIMARY KEY (game_id, user_id)
+        )''',
+        'INSERT OR IGNORE INTO group_streak (id, streak) VALUES (1, 0)',
+        "INSERT OR IGNORE INTO bot_flags (key, value) VALUES ('first_game_started', '0')",
+    ]),
+    # Move player lists out of a game_state blob written by older versions
+    Migration(2, 'split_game_state_blob', [
+        partial(split_game_state_blob, placeholder='?', insert_ignore='INSERT OR IGNORE'),
+    ]),
+    # Covering indexes for the circle lookups every command makes and for the
+    # gallery, which lists a game's submissions in the order they came in.
+    Migration(3, 'hot_query_indexes', [
+        'CREATE INDEX IF NOT EXISTS idx_player_circle_guild ON player_circle (guild_id, user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_game_submissions_game_time ON game_submissions (game_id, submitted_at)',
+    ]),
+    # One game, group streak and set of user streaks per guild, plus each
+    # guild's game channel and daily game time.
+    Migration(4, 'per_guild_state', [
+        _key_state_by_guild,
+        '''CREATE TABLE IF NOT EXISTS guild_settings (
+            guild_id INTEGER PRIMARY KEY,
+            channel_id INTEGER,
+            game_time TEXT
+        )''',
+    ]),
+    # Append-only record of finished games. Players are copied with the
+    # game's guild and date so every history query is a range scan on one
+    # index, newest first.
+    Migration(5, 'game_archive', [
+        '''CREATE TABLE IF NOT EXISTS archived_games (
+            game_id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            theme TEXT,
+            date TEXT NOT NULL,
+            ended_at REAL NOT NULL,
+            players INTEGER NOT NULL,
+            submissions INTEGER NOT NULL
+        )''',
+        '''CREATE TABLE IF NOT EXISTS archived_players (
+            game_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            guild_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            image_url TEXT,
+            submitted_at REAL,
+            PRIMARY KEY (game_id, user_id)
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_archived_games_guild_date ON archived_games (guild_id, date, game_id)',
+        'CREATE INDEX IF NOT EXISTS idx_archived_players_guild_user_date ON archived_players (guild_id, user_id, date, game_id)',
+        'CREATE INDEX IF NOT EXISTS idx_archived_players_user_date ON archived_players (user_id, date, game_id)',
+    ]),
+    # Per-guild player aggregates kept up to date as games are settled, so the
+    # leaderboard reads the top rows of an index instead of the archive.
+    # user_stats was never written to, so it is rebuilt from the archive.
+    Migration(6, 'player_stats', [
+        'DROP TABLE IF EXISTS user_stats',
+        '''CREATE TABLE user_stats (
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            games_played INTEGER NOT NULL DEFAULT 0,
+            submissions INTEGER NOT NULL DEFAULT 0,
+            best_streak INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (guild_id, user_id)
+        )''',
+        '''INSERT INTO user_stats (guild_id, user_id, games_played, submissions)
+            SELECT guild_id, user_id, COUNT(*), COUNT(image_url) FROM archived_players GROUP BY guild_id, user_id''',
+        '''INSERT INTO user_stats (guild_id, user_id, best_streak)
+            SELECT guild_id, user_id, streak FROM user_streaks WHERE true
+            ON CONFLICT(guild_id, user_id) DO UPDATE SET best_streak=excluded.best_streak''',
+        'CREATE INDEX IF NOT EXISTS idx_user_stats_submissions ON user_stats (guild_id, submissions DESC, user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_user_stats_best_streak ON user_stats (guild_id, best_streak DESC, user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_user_streaks_streak ON user_streaks (guild_id, streak DESC, user_id)',
+    ]),
+    # Content hash of each submitted image in the local submission store
+    # (gallery/submission_store.py), kept with the archive too.
+    Migration(7, 'submission_image_hash', [
+        'ALTER TABLE game_submissions ADD COLUMN image_hash CHAR(64)',
+        'ALTER TABLE archived_players ADD COLUMN image_hash CHAR(64)',
+    ]),
+    # One player can be in several guilds' circles.
+    Migration(8, 'player_circle_per_guild', [
+        _key_circle_by_guild,
+    ]),
+]
+
+class _PooledConnection(sqlite3.Connection):
+    """A connection that survives close() so it can be reused by its thread."""
+
+    def close(self):
+        # Callers still close() after each operation; just drop any transaction
+        # they left open instead of tearing down the handle.
+        if self.in_transaction:
+            self.rollback()
+
+    def shutdown(self):
+        super().close()
+
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+_generation = 0
+
+def _open_connection():
+    conn = sqlite3.connect(
+        DB_PATH,
+        factory=_PooledConnection,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        # Each connection is only used by the thread that opened it; this just
+        # allows close_connections() to shut them all down from one place.
+        check_same_thread=False,
+    )
+    conn.row_factory = sqlite3.Row
+    for pragma, value in PRAGMAS:
+        conn.execute(f'PRAGMA {pragma}={value}')
+    return conn
 
 class Storage:
     @staticmethod
     def _get_conn():
-        try:
-            conn = sqlite3.connect(DB_PATH)
-            conn.row_factory = sqlite3.Row
+        """Return this thread's long-lived connection, opening it on first use."""
+        conn = getattr(_local, 'conn', None)
+        if conn is not None and _local.generation == _generation:
             return conn
+        try:
+            conn = _open_connection()
         except Exception as e:
             print(f"[FATAL] Could not connect to SQLite: {e}", file=sys.stderr)
             sys.exit(1)
+        with _connections_lock:
+            _connections.append(conn)
+            _local.conn = conn
+            _local.generation = _generation
+        return conn
+
+    @staticmethod
+    def close_connections():
+        """Close every pooled connection. Threads reconnect on their next call."""
+        global _generation
+        with _connections_lock:
+            _generation += 1
+            for conn in _connections:
+                try:
+                    conn.shutdown()
+                except Exception:
+                    pass
+            _connections.clear()
 
     @staticmethod
     def init():
+        """Check the schema version and bring the database up to date if needed."""
         try:
             conn = Storage._get_conn()
-            c = conn.cursor()
-            c.execute('''CREATE TABLE IF NOT EXISTS player_circle (
-                user_id INTEGER PRIMARY KEY,
-                guild_id INTEGER
-            )''')
-            c.execute('''CREATE TABLE IF NOT EXISTS game_state (
-                id INTEGER PRIMARY KEY CHECK (id = 1),
-                state TEXT
-            )''')
-            # New: Table for per-user submission stats
-            c.execute('''CREATE TABLE IF NOT EXISTS user_stats (
-                user_id INTEGER PRIMARY KEY,
-                submissions INTEGER DEFAULT 0
-            )''')
-            # New: Table for group streak
-            c.execute('''CREATE TABLE IF NOT EXISTS group_streak (
-                id INTEGER PRIMARY KEY CHECK (id = 1),
-                streak INTEGER DEFAULT 0
-            )''')
-            # New: Table for first_game_started flag
-            c.execute('''CREATE TABLE IF NOT EXISTS bot_flags (
-                key TEXT PRIMARY KEY,
-                value TEXT
-            )''')
-            # New: Table for per-user streaks
-            c.execute('''CREATE TABLE IF NOT EXISTS user_streaks (
-                user_id INTEGER PRIMARY KEY,
-                streak INTEGER DEFAULT 0
-            )''')
-            # Ensure group_streak row exists
-            c.execute('INSERT OR IGNORE INTO group_streak (id, streak) VALUES (1, 0)')
-            # Ensure first_game_started flag exists
-            c.execute('INSERT OR IGNORE INTO bot_flags (key, value) VALUES ("first_game_started", "0")')
-            conn.commit()
+            current = get_schema_version(conn.cursor())
             conn.close()
+            if current >= latest_version(MIGRATIONS):
+                return
+            if not AUTO_MIGRATE:
+                print(f"[FATAL] SQLite schema is at version {current}, expected {latest_version(MIGRATIONS)}; "
+                      f"run `python -m circle_sketch.storage.migrate`", file=sys.stderr)
+                sys.exit(1)
+            Storage.migrate()
         except Exception as e:
             print(f"[FATAL] SQLite init failed: {e}", file=sys.stderr)
             sys.exit(1)
 
+    @staticmethod
+    def migrate():
+        """Apply pending schema migrations; returns the ones that ran."""
+        conn = Storage._get_conn()
+        try:
+            return apply_migrations(conn, MIGRATIONS, placeholder='?', begin='BEGIN IMMEDIATE')
+        finally:
+            conn.close()
+
+    @staticmethod
+    def schema_version():
+        conn = Storage._get_conn()
+        version = get_schema_version(conn.cursor())
+        conn.close()
+        return version
+
     @staticmethod
     def get_player_circle(guild_id=None):
         conn = Storage._get_conn()
@@ -89,37 +361,293 @@ class Storage:
         conn.close()
 
     @staticmethod
-    def get_game_state():
+    def add_to_circle(guild_id, user_id, limit):
+        """Add a player to a guild's circle if there is room.
+
+        Returns (added, size): added is False if they were already a member.
+        Raises CircleFullError if the circle already has `limit` players. The
+        check and the insert happen under one write lock, so concurrent joins
+        can't overshoot the limit.
+        """
+        conn = Storage._get_conn()
+        c = conn.cursor()
+        c.execute('BEGIN IMMEDIATE')
+        c.execute('SELECT COUNT(*) FROM player_circle WHERE guild_id=?', (guild_id,))
+        size = c.fetchone()[0]
+        c.execute('SELECT 1 FROM player_circle WHERE guild_id=? AND user_id=?', (guild_id, user_id))
+        if c.fetchone() is not None:
+            conn.close()
+            return False, size
+        if size >= limit:
+            conn.close()
+            raise CircleFullError(guild_id, limit)
+        c.execute('INSERT INTO player_circle (user_id, guild_id) VALUES (?, ?)', (user_id, guild_id))
+        conn.commit()
+        conn.close()
+        return True, size + 1
+
+    @staticmethod
+    def remove_from_circle(guild_id, user_id):
+        """Remove a player from a guild's circle. Returns False if they weren't in it."""
+        conn = Storage._get_conn()
+        c = conn.cursor()
+        c.execute('DELETE FROM player_circle WHERE guild_id=? AND user_id=?', (guild_id, user_id))
+        removed = c.rowcount == 1
+        conn.commit()
+        conn.close()
+        return removed
+
+    @staticmethod
+    def is_in_circle(guild_id, user_id):
         conn = Storage._get_conn()
         c = conn.cursor()
-        c.execute('SELECT state FROM game_state WHERE id=1')
+        c.execute('SELECT 1 FROM player_circle WHERE guild_id=? AND user_id=?', (guild_id, user_id))
         row = c.fetchone()
         conn.close()
-        if row and row['state']:
-            state = json.loads(row['state'])
-            # Ensure manual_game_starter_id is present for compatibility
-            if 'manual_game_starter_id' not in state:
-                state['manual_game_starter_id'] = None
-            return state
-        return None
+        return row is not None
 
     @staticmethod
-    def set_game_state(state):
+    def get_game_state(include_players=True, guild_id=DEFAULT_GUILD_ID):
+        """Return a guild's current game state, or None if nothing has been stored.
+
+        With include_players the state carries `user_ids`, `submissions` and
+        `gallery` read from their tables; leave it off when only the theme,
+        date and game id are needed. `version` is the write counter to pass
+        back to set_game_state() as expected_version.
+        """
         conn = Storage._get_conn()
         c = conn.cursor()
-        c.execute('DELETE FROM game_state')
+        c.execute('SELECT state, version FROM game_state WHERE guild_id=?', (guild_id,))
+        row = c.fetchone()
+        if not (row and row['state']):
+            conn.close()
+            return None
+        state = json.loads(row['state'])
+        state['version'] = row['version']
+        # Ensure manual_game_starter_id is present for compatibility
+        if 'manual_game_starter_id' not in state:
+            state['manual_game_starter_id'] = None
+        game_id = state.get('game_id')
+        if include_players and game_id is not None:
+            c.execute('SELECT user_id FROM game_participants WHERE game_id=? ORDER BY user_id', (game_id,))
+            state['user_ids'] = [row['user_id'] for row in c.fetchall()]
+            c.execute('SELECT user_id, image_url FROM game_submissions WHERE game_id=? ORDER BY submitted_at', (game_id,))
+            submissions = {row['user_id']: row['image_url'] for row in c.fetchall()}
+            state['submissions'] = submissions
+            state['gallery'] = dict(submissions)
+        conn.close()
+        return state
+
+    @staticmethod
+    def get_game_state_version(guild_id=DEFAULT_GUILD_ID):
+        conn = Storage._get_conn()
+        c = conn.cursor()
+        c.execute('SELECT version FROM game_state WHERE guild_id=?', (guild_id,))
+        row = c.fetchone()
+        conn.close()
+        return row['version'] if row else 0
+
+    @staticmethod
+    def get_active_game_guilds():
+        """Return the ids of guilds with a game running, oldest game first."""
+        conn = Storage._get_conn()
+        c = conn.cursor()
+        c.execute('SELECT guild_id FROM game_state WHERE game_id IS NOT NULL ORDER BY game_id')
+        result = [row['guild_id'] for row in c.fetchall()]
+        conn.close()
+        return result
+
+    @staticmethod
+    def set_game_state(state, expected_version=None, guild_id=DEFAULT_GUILD_ID):
+        """Replace a guild's game state and return its new version.
+
+        A state with a theme but no `game_id` starts a new game and gets an id
+        assigned (written back into `state`). Participants and submissions in
+        the state are added to the game's tables; existing ones are kept, so a
+        stale copy of the state can't drop a submission recorded meanwhile.
+        Replacing or clearing a game archives it and removes its live rows.
+
+        Every write bumps the version. If expected_version is given and no
+        longer matches, nothing is written and StaleGameStateError is raised.
+        """
+        conn = Storage._get_conn()
+        c = conn.cursor()
+        c.execute('BEGIN IMMEDIATE')
+        c.execute('SELECT game_id, version FROM game_state WHERE guild_id=?', (guild_id,))
+        row = c.fetchone()
+        old_game_id = row['game_id'] if row else None
+        current_version = row['version'] if row else 0
+        if expected_version is not None and expected_version != current_version:
+            conn.close()
+            raise StaleGameStateError(expected_version, current_version)
+        version = current_version + 1
+        new_game_id = None
+        core = None
         if state is not None:
             # Always include manual_game_starter_id for persistence
             if 'manual_game_starter_id' not in state:
                 state['manual_game_starter_id'] = None
-            c.execute('INSERT INTO game_state (id, state) VALUES (1, ?)', (json.dumps(state),))
+            if 'theme' in state and state.get('game_id') is None:
+                c.execute('INSERT INTO games (guild_id, theme, date) VALUES (?, ?, ?)', (guild_id, state['theme'], state.get('date')))
+                state['game_id'] = c.lastrowid
+            state['version'] = version
+            new_game_id = state.get('game_id')
+            core = json.dumps({key: value for key, value in state.items() if key not in PLAYER_KEYS + META_KEYS})
+        # The row is kept even when the state is cleared so the version never goes backwards
+        c.execute('INSERT INTO game_state (guild_id, game_id, state, version) VALUES (?, ?, ?, ?) '
+                  'ON CONFLICT(guild_id) DO UPDATE SET game_id=excluded.game_id, state=excluded.state, version=excluded.version',
+                  (guild_id, new_game_id, core, version))
+        if new_game_id is not None:
+            c.executemany('INSERT OR IGNORE INTO game_participants (game_id, user_id) VALUES (?, ?)',
+                          [(new_game_id, int(uid)) for uid in state.get('user_ids', [])])
+            submissions = {**state.get('gallery', {}), **state.get('submissions', {})}
+            now = time.time()
+            c.executemany('INSERT OR IGNORE INTO game_submissions (game_id, user_id, image_url, submitted_at) VALUES (?, ?, ?, ?)',
+                          [(new_game_id, int(uid), url, now) for uid, url in submissions.items()])
+        if old_game_id is not None and old_game_id != new_game_id:
+            Storage._archive_game(c, old_game_id)
+            c.execute('DELETE FROM game_participants WHERE game_id=?', (old_game_id,))
+            c.execute('DELETE FROM game_submissions WHERE game_id=?', (old_game_id,))
+            c.execute('DELETE FROM games WHERE game_id=?', (old_game_id,))
+        conn.commit()
+        conn.close()
+        return version
+
+    @staticmethod
+    def _archive_game(c, game_id):
+        """Copy a finished game and its players into the archive, inside the caller's transaction."""
+        c.execute('SELECT guild_id, theme, date FROM games WHERE game_id=?', (game_id,))
+        game = c.fetchone()
+        if game is None:
+            return
+        now = time.time()
+        date = game['date'] or time.strftime('%Y-%m-%d', time.localtime(now))
+        c.execute('INSERT OR IGNORE INTO archived_players (game_id, user_id, guild_id, date, image_url, image_hash, submitted_at) '
+                  'SELECT p.game_id, p.user_id, ?, ?, s.image_url, s.image_hash, s.submitted_at FROM game_participants p '
+                  'LEFT JOIN game_submissions s ON s.game_id = p.game_id AND s.user_id = p.user_id WHERE p.game_id=?',
+                  (game['guild_id'], date, game_id))
+        c.execute('SELECT COUNT(*), COUNT(image_url) FROM archived_players WHERE game_id=?', (game_id,))
+        players, submissions = c.fetchone()
+        c.execute('INSERT OR IGNORE INTO archived_games (game_id, guild_id, theme, date, ended_at, players, submissions) '
+                  'VALUES (?, ?, ?, ?, ?, ?, ?)', (game_id, game['guild_id'], game['theme'], date, now, players, submissions))
+
+    @staticmethod
+    def get_game_history(guild_id=None, user_id=None, since=None, until=None, before=None, limit=HISTORY_PAGE_SIZE):
+        """Return a page of finished games, newest first, and the cursor for the next page.
+
+        Filter by guild, by player (their games only, with their own
+        `image_url` and `image_hash`, None if they missed it) or both, and optionally by an
+        inclusive 'YYYY-MM-DD' date range. Pass the returned cursor back as
+        `before` to continue; it is None on the last page. Guild pages carry
+        each game's `submissions` as {user_id: image_url}.
+        """
+        if guild_id is None and user_id is None:
+            raise ValueError("get_game_history needs a guild_id, a user_id or both")
+        table = 'archived_players' if user_id is not None else 'archived_games'
+        where, params = [], []
+        if guild_id is not None:
+            where.append('guild_id=?')
+            params.append(guild_id)
+        if user_id is not None:
+            where.append('user_id=?')
+            params.append(user_id)
+        if since is not None:
+            where.append('date>=?')
+            params.append(since)
+        if until is not None:
+            where.append('date<=?')
+            params.append(until)
+        if before is not None:
+            # Keyset pagination: resume strictly after the last row returned
+            where.append('(date<? OR (date=? AND game_id<?))')
+            params.extend([before[0], before[0], before[1]])
+        conn = Storage._get_conn()
+        c = conn.cursor()
+        c.execute(f'SELECT game_id FROM {table} WHERE {" AND ".join(where)} ORDER BY date DESC, game_id DESC LIMIT ?',
+                  [*params, limit + 1])
+        game_ids = [row['game_id'] for row in c.fetchall()]
+        more = len(game_ids) > limit
+        game_ids = game_ids[:limit]
+        games = []
+        if game_ids:
+            placeholders = ','.join('?' * len(game_ids))
+            c.execute(f'SELECT game_id, guild_id, theme, date, ended_at, players, submissions FROM archived_games '
+                      f'WHERE game_id IN ({placeholders})', game_ids)
+            by_id = {row['game_id']: dict(row) for row in c.fetchall()}
+            if user_id is not None:
+                c.execute(f'SELECT game_id, image_url, image_hash FROM archived_players WHERE user_id=? AND game_id IN ({placeholders})',
+                          [user_id, *game_ids])
+                for row in c.fetchall():
+                    by_id[row['game_id']]['image_url'] = row['image_url']
+                    by_id[row['game_id']]['image_hash'] = row['image_hash']
+            else:
+                for game in by_id.values():
+                    game['submissions'] = {}
+                c.execute(f'SELECT game_id, user_id, image_url FROM archived_players '
+                          f'WHERE game_id IN ({placeholders}) AND image_url IS NOT NULL ORDER BY submitted_at', game_ids)
+                for row in c.fetchall():
+                    by_id[row['game_id']]['submissions'][row['user_id']] = row['image_url']
+            games = [by_id[game_id] for game_id in game_ids]
+        conn.close()
+        cursor = (games[-1]['date'], games[-1]['game_id']) if more else None
+        return games, cursor
+
+    @staticmethod
+    def add_game_participant(game_id, user_id):
+        """Add a player to a running game. Returns False if they were already in it."""
+        conn = Storage._get_conn()
+        c = conn.cursor()
+        c.execute('INSERT OR IGNORE INTO game_participants (game_id, user_id) VALUES (?, ?)', (game_id, user_id))
+        added = c.rowcount == 1
         conn.commit()
         conn.close()
+        return added
+
+    @staticmethod
+    def is_game_participant(game_id, user_id):
+        conn = Storage._get_conn()
+        c = conn.cursor()
+        c.execute('SELECT 1 FROM game_participants WHERE game_id=? AND user_id=?', (game_id, user_id))
+        row = c.fetchone()
+        conn.close()
+        return row is not None
+
+    @staticmethod
+    def record_submission(game_id, user_id, image_url):
+        """Record a player's submission. Returns False if they already submitted."""
+        conn = Storage._get_conn()
+        c = conn.cursor()
+        c.execute('INSERT INTO game_submissions (game_id, user_id, image_url, submitted_at) VALUES (?, ?, ?, ?) '
+                  'ON CONFLICT(game_id, user_id) DO NOTHING', (game_id, user_id, image_url, time.time()))
+        recorded = c.rowcount == 1
+        conn.commit()
+        conn.close()
+        return recorded
+
+    @staticmethod
+    def set_submission_image_hash(game_id, user_id, image_hash):
+        """Record the submission store hash of a player's submitted image."""
+        conn = Storage._get_conn()
+        c = conn.cursor()
+        c.execute('UPDATE game_submissions SET image_hash=? WHERE game_id=? AND user_id=?', (image_hash, game_id, user_id))
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def get_submission_image_hashes(game_id):
+        """{user_id: image_hash} for a running game's submissions that have been stored locally."""
+        conn = Storage._get_conn()
+        c = conn.cursor()
+        c.execute('SELECT user_id, image_hash FROM game_submissions WHERE game_id=? AND image_hash IS NOT NULL', (game_id,))
+        result = {row['user_id']: row['image_hash'] for row in c.fetchall()}
+        conn.close()
+        return result
 
     @staticmethod
     def reset():
-        Storage.set_player_circle([])
-        Storage.set_game_state(None)
+        Storage.set_player_circle(None, [])
+        for guild_id in {DEFAULT_GUILD_ID, *Storage.get_active_game_guilds()}:
+            Storage.set_game_state(None, guild_id=guild_id)
 
     @staticmethod
     def clear_all():
@@ -128,40 +656,69 @@ class Storage:
         c = conn.cursor()
         c.execute('DELETE FROM player_circle')
         c.execute('DELETE FROM game_state')
+        c.execute('DELETE FROM user_stats')
+        c.execute('DELETE FROM game_participants')
+        c.execute('DELETE FROM game_submissions')
+        c.execute('DELETE FROM games')
+        c.execute('DELETE FROM archived_games')
+        c.execute('DELETE FROM archived_players')
         conn.commit()
         conn.close()
 
     @staticmethod
-    def get_user_stats():
+    def get_user_stats(guild_id=DEFAULT_GUILD_ID):
+        """Return {user_id: submissions} for the guild."""
         conn = Storage._get_conn()
         c = conn.cursor()
-        c.execute('SELECT user_id, submissions FROM user_stats')
+        c.execute('SELECT user_id, submissions FROM user_stats WHERE guild_id=?', (guild_id,))
         stats = {row['user_id']: row['submissions'] for row in c.fetchall()}
         conn.close()
         return stats
 
     @staticmethod
-    def increment_user_submission(user_id):
+    def get_leaderboard(guild_id, order_by='submissions', limit=10):
+        """Return the guild's top `limit` players by `order_by` (a LEADERBOARD_ORDERS key).
+
+        Each entry has user_id, games_played, submissions, streak, best_streak
+        and participation (submissions / games played). Reads `limit` rows
+        off an index plus one lookup per player, however many players exist.
+        """
+        table, column = LEADERBOARD_ORDERS[order_by]
         conn = Storage._get_conn()
         c = conn.cursor()
-        c.execute('INSERT INTO user_stats (user_id, submissions) VALUES (?, 1) ON CONFLICT(user_id) DO UPDATE SET submissions = submissions + 1', (user_id,))
-        conn.commit()
+        c.execute(f'SELECT user_id FROM {table} WHERE guild_id=? ORDER BY {column} DESC, user_id LIMIT ?', (guild_id, limit))
+        user_ids = [row['user_id'] for row in c.fetchall()]
+        entries = {uid: {'user_id': uid, 'games_played': 0, 'submissions': 0, 'streak': 0, 'best_streak': 0} for uid in user_ids}
+        if user_ids:
+            placeholders = ','.join('?' * len(user_ids))
+            c.execute(f'SELECT user_id, games_played, submissions, best_streak FROM user_stats '
+                      f'WHERE guild_id=? AND user_id IN ({placeholders})', [guild_id, *user_ids])
+            for row in c.fetchall():
+                entries[row['user_id']].update(games_played=row['games_played'], submissions=row['submissions'],
+                                               best_streak=row['best_streak'])
+            c.execute(f'SELECT user_id, streak FROM user_streaks WHERE guild_id=? AND user_id IN ({placeholders})', [guild_id, *user_ids])
+            for row in c.fetchall():
+                entries[row['user_id']]['streak'] = row['streak']
         conn.close()
+        for entry in entries.values():
+            entry['participation'] = entry['submissions'] / entry['games_played'] if entry['games_played'] else 0.0
+        return [entries[uid] for uid in user_ids]
 
     @staticmethod
-    def get_group_streak():
+    def get_group_streak(guild_id=DEFAULT_GUILD_ID):
         conn = Storage._get_conn()
         c = conn.cursor()
-        c.execute('SELECT streak FROM group_streak WHERE id=1')
+        c.execute('SELECT streak FROM group_streak WHERE guild_id=?', (guild_id,))
         row = c.fetchone()
         conn.close()
         return row['streak'] if row else 0
 
     @staticmethod
-    def set_group_streak(streak):
+    def set_group_streak(streak, guild_id=DEFAULT_GUILD_ID):
         conn = Storage._get_conn()
         c = conn.cursor()
-        c.execute('UPDATE group_streak SET streak=? WHERE id=1', (streak,))
+        c.execute('INSERT INTO group_streak (guild_id, streak) VALUES (?, ?) ON CONFLICT(guild_id) DO UPDATE SET streak=excluded.streak',
+                  (guild_id, streak))
         conn.commit()
         conn.close()
 
@@ -183,46 +740,152 @@ class Storage:
         conn.close()
 
     @staticmethod
-    def get_user_streak(user_id):
+    def get_user_streak(user_id, guild_id=DEFAULT_GUILD_ID):
         conn = Storage._get_conn()
         c = conn.cursor()
-        c.execute('SELECT streak FROM user_streaks WHERE user_id=?', (user_id,))
+        c.execute('SELECT streak FROM user_streaks WHERE guild_id=? AND user_id=?', (guild_id, user_id))
         row = c.fetchone()
         conn.close()
         return row['streak'] if row else 0
 
     @staticmethod
-    def set_user_streak(user_id, streak):
+    def set_user_streak(user_id, streak, guild_id=DEFAULT_GUILD_ID):
         conn = Storage._get_conn()
         c = conn.cursor()
-        c.execute('INSERT INTO user_streaks (user_id, streak) VALUES (?, ?) ON CONFLICT(user_id) DO UPDATE SET streak=?', (user_id, streak, streak))
+        c.execute('INSERT INTO user_streaks (guild_id, user_id, streak) VALUES (?, ?, ?) '
+                  'ON CONFLICT(guild_id, user_id) DO UPDATE SET streak=excluded.streak', (guild_id, user_id, streak))
         conn.commit()
         conn.close()
 
     @staticmethod
-    def reset_all_streaks():
-        """Reset both group and all user streaks to zero."""
+    def get_user_streaks(user_ids=None, guild_id=DEFAULT_GUILD_ID):
+        """Return {user_id: streak} for the given users (0 if unknown), or for everyone in the guild."""
+        conn = Storage._get_conn()
+        c = conn.cursor()
+        if user_ids is None:
+            c.execute('SELECT user_id, streak FROM user_streaks WHERE guild_id=?', (guild_id,))
+            streaks = {row['user_id']: row['streak'] for row in c.fetchall()}
+        else:
+            user_ids = list(user_ids)
+            streaks = dict.fromkeys(user_ids, 0)
+            for i in range(0, len(user_ids), MAX_IN_PARAMS):
+                chunk = user_ids[i:i + MAX_IN_PARAMS]
+                placeholders = ','.join('?' * len(chunk))
+                c.execute(f'SELECT user_id, streak FROM user_streaks WHERE guild_id=? AND user_id IN ({placeholders})', [guild_id, *chunk])
+                streaks.update((row['user_id'], row['streak']) for row in c.fetchall())
+        conn.close()
+        return streaks
+
+    @staticmethod
+    def apply_streak_results(submitted, missed, guild_id=DEFAULT_GUILD_ID):
+        """Settle a finished game's streaks and player stats in a single transaction.
+
+        If anyone submitted, the guild's group streak and each submitter's
+        streak go up by one; otherwise the group streak is reset. Everyone in
+        `missed` is reset to zero. Every player's games played, submissions
+        and best streak in user_stats are updated to match. Returns
+        (previous_group_streak, group_streak, {user_id: streak}) for all
+        users passed in.
+        """
+        submitted = list(submitted)
+        missed = list(missed)
         conn = Storage._get_conn()
         c = conn.cursor()
-        # Reset group streak
-        c.execute('UPDATE group_streak SET streak=0 WHERE id=1')
-        # Reset all user streaks
-        c.execute('UPDATE user_streaks SET streak=0')
+        c.execute('BEGIN IMMEDIATE')
+        c.execute('SELECT streak FROM group_streak WHERE guild_id=?', (guild_id,))
+        row = c.fetchone()
+        previous = row['streak'] if row else 0
+        group_streak = previous + 1 if submitted else 0
+        c.execute('INSERT INTO group_streak (guild_id, streak) VALUES (?, ?) ON CONFLICT(guild_id) DO UPDATE SET streak=excluded.streak',
+                  (guild_id, group_streak))
+        c.executemany('INSERT INTO user_streaks (guild_id, user_id, streak) VALUES (?, ?, 1) '
+                      'ON CONFLICT(guild_id, user_id) DO UPDATE SET streak = streak + 1',
+                      [(guild_id, uid) for uid in submitted])
+        c.executemany('INSERT INTO user_streaks (guild_id, user_id, streak) VALUES (?, ?, 0) '
+                      'ON CONFLICT(guild_id, user_id) DO UPDATE SET streak = 0',
+                      [(guild_id, uid) for uid in missed])
+        user_streaks = dict.fromkeys(missed, 0)
+        for i in range(0, len(submitted), MAX_IN_PARAMS):
+            chunk = submitted[i:i + MAX_IN_PARAMS]
+            placeholders = ','.join('?' * len(chunk))
+            c.execute(f'SELECT user_id, streak FROM user_streaks WHERE guild_id=? AND user_id IN ({placeholders})', [guild_id, *chunk])
+            user_streaks.update((row['user_id'], row['streak']) for row in c.fetchall())
+        c.executemany('INSERT INTO user_stats (guild_id, user_id, games_played, submissions, best_streak) VALUES (?, ?, 1, 1, ?) '
+                      'ON CONFLICT(guild_id, user_id) DO UPDATE SET games_played = games_played + 1, '
+                      'submissions = submissions + 1, best_streak = MAX(best_streak, excluded.best_streak)',
+                      [(guild_id, uid, user_streaks[uid]) for uid in submitted])
+        c.executemany('INSERT INTO user_stats (guild_id, user_id, games_played) VALUES (?, ?, 1) '
+                      'ON CONFLICT(guild_id, user_id) DO UPDATE SET games_played = games_played + 1',
+                      [(guild_id, uid) for uid in missed])
         conn.commit()
         conn.close()
+        return previous, group_streak, user_streaks
+
+    @staticmethod
+    def reset_all_streaks(guild_id=None):
+        """Reset group and user streaks to zero for one guild, or for every guild."""
+        conn = Storage._get_conn()
+        c = conn.cursor()
+        if guild_id is not None:
+            c.execute('UPDATE group_streak SET streak=0 WHERE guild_id=?', (guild_id,))
+            c.execute('UPDATE user_streaks SET streak=0 WHERE guild_id=?', (guild_id,))
+        else:
+            c.execute('UPDATE group_streak SET streak=0')
+            c.execute('UPDATE user_streaks SET streak=0')
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def get_guild_settings(guild_id):
+        """Return the guild's {'channel_id', 'game_time'}; unset values are None."""
+        conn = Storage._get_conn()
+        c = conn.cursor()
+        c.execute('SELECT channel_id, game_time FROM guild_settings WHERE guild_id=?', (guild_id,))
+        row = c.fetchone()
+        conn.close()
+        if not row:
+            return {'channel_id': None, 'game_time': None}
+        return {'channel_id': row['channel_id'], 'game_time': row['game_time']}
+
+    @staticmethod
+    def set_guild_settings(guild_id, channel_id=None, game_time=None):
+        """Set a guild's game channel and/or daily game time ('HH:MM'); None keeps the current value."""
+        conn = Storage._get_conn()
+        c = conn.cursor()
+        c.execute('INSERT INTO guild_settings (guild_id, channel_id, game_time) VALUES (?, ?, ?) '
+                  'ON CONFLICT(guild_id) DO UPDATE SET channel_id=COALESCE(excluded.channel_id, channel_id), '
+                  'game_time=COALESCE(excluded.game_time, game_time)', (guild_id, channel_id, game_time))
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def get_scheduled_guilds(game_time, default_time):
+        """Return guilds with players or a running game whose daily game time is `game_time`.
+
+        Guilds that never set a time use `default_time`.
+        """
+        conn = Storage._get_conn()
+        c = conn.cursor()
+        c.execute('''SELECT guilds.guild_id FROM (
+                SELECT DISTINCT guild_id FROM player_circle WHERE guild_id IS NOT NULL
+                UNION SELECT guild_id FROM game_state WHERE game_id IS NOT NULL
+            ) AS guilds LEFT JOIN guild_settings s ON s.guild_id = guilds.guild_id
+            WHERE COALESCE(s.game_time, ?) = ?''', (default_time, game_time))
+        result = [row['guild_id'] for row in c.fetchall()]
+        conn.close()
+        return result
 
     @staticmethod
     async def download_image(url):
         """Download an image from a Discord URL to a temp file and return the file path."""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as resp:
-                    if resp.status != 200:
-                        raise Exception(f"Failed to download image: {resp.status}")
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp:
-                        tmp.write(await resp.read())
-                        return tmp.name
+            data = await http_client.get_bytes(url)
         except Exception as e:
             raise Exception(f"Error downloading image: {e}")
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp:
+            tmp.write(data)
+            return tmp.name
 
-Storage.init()
+# The migrate CLI sets this so it can report and apply migrations itself
+if os.environ.get('CIRCLE_SKETCH_SKIP_INIT') != '1':
+    Storage.init()
@@ -0,0 +1,113 @@
+# Who the players are, for the gallery.
+#
+# The gallery needs each player's display name and avatar, and used to get
+# them with one fetch_user REST call per player, each counting against the
+# global rate limit. With the members intent nearly every player is already in
+# discord.py's gateway cache, so UserResolver looks there first (guild member,
+# then user). Anyone missing is asked for in one gateway member query per 100
+# players, and only users who aren't in the guild any more are fetched over
+# REST, concurrently.
+#
+# What the gallery uses is kept as a PlayerProfile for USER_CACHE_TTL seconds,
+# so a player who can't be found in the gateway cache isn't fetched again for
+# every card. stats() counts where profiles came from.
+
+import asyncio
+import os
+import time
+from collections import Counter, namedtuple
+import discord
+
+USER_CACHE_TTL = float(os.environ.get('CIRCLE_SKETCH_USER_CACHE_TTL', 3600))
+# Discord's limit on user ids per member query
+MEMBER_QUERY_LIMIT = 100
+AVATAR_SIZE = 128
+
+# avatar_key is the avatar hash (cache key), avatar_url the image to download
+PlayerProfile = namedtuple('PlayerProfile', ['id', 'display_name', 'avatar_key', 'avatar_url'])
+
+def player_profile(user):
+    """The gallery's view of a discord User or Member."""
+    avatar = user.display_avatar
+    return PlayerProfile(user.id, user.display_name, avatar.key, avatar.with_size(AVATAR_SIZE).url)
+
+class UserResolver:
+    def __init__(self, ttl=USER_CACHE_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        # user_id -> (expires, PlayerProfile)
+        self._profiles = {}
+        self.counts = Counter()
+
+    def stats(self):
+        """How many lookups were answered by the gateway cache, the profile
+        cache, a gateway member query and REST."""
+        stats = {name: self.counts[name] for name in ('gateway_cache', 'profile_cache', 'member_query', 'rest')}
+        stats['profiles'] = len(self._profiles)
+        return stats
+
+    def remember(self, user):
+        """Cache and return the profile of a User or Member."""
+        profile = player_profile(user)
+        self._profiles[user.id] = (self._clock() + self.ttl, profile)
+        return profile
+
+    def _cached(self, user_id):
+        entry = self._profiles.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] <= self._clock():
+            del self._profiles[user_id]
+            return None
+        return entry[1]
+
+    async def resolve_many(self, bot, user_ids, guild=None):
+        """Profiles for `user_ids`.
+
+        Returns (profiles, failures): dicts keyed by user id of the
+        PlayerProfile, or of the exception for users that couldn't be found.
+        """
+        profiles = {}
+        missing = []
+        for user_id in user_ids:
+            user = (guild and guild.get_member(user_id)) or bot.get_user(user_id)
+            if user is not None:
+                self.counts['gateway_cache'] += 1
+                profiles[user_id] = self.remember(user)
+                continue
+            profile = self._cached(user_id)
+            if profile is not None:
+                self.counts['profile_cache'] += 1
+                profiles[user_id] = profile
+            else:
+                missing.append(user_id)
+        if missing and guild is not None:
+            for start in range(0, len(missing), MEMBER_QUERY_LIMIT):
+                try:
+                    members = await guild.query_members(user_ids=missing[start:start + MEMBER_QUERY_LIMIT], cache=True)
+                except (discord.ClientException, asyncio.TimeoutError):
+                    # Not available (no members intent) or no answer; REST below
+                    break
+                for member in members:
+                    self.counts['member_query'] += 1
+                    profiles[member.id] = self.remember(member)
+            missing = [user_id for user_id in missing if user_id not in profiles]
+        failures = {}
+        users = await asyncio.gather(*(bot.fetch_user(user_id) for user_id in missing), return_exceptions=True)
+        for user_id, user in zip(missing, users):
+            if isinstance(user, Exception):
+                failures[user_id] = user
+            else:
+                self.counts['rest'] += 1
+                profiles[user_id] = self.remember(user)
+        return profiles, failures
+
+    async def resolve(self, bot, user_id, guild=None):
+        """One player's profile; raises if they can't be found."""
+        profiles, failures = await self.resolve_many(bot, [user_id], guild)
+        if user_id in failures:
+            raise failures[user_id]
+        return profiles[user_id]
+
+# Shared by the cogs
+user_resolver = UserResolver()
@@ -0,0 +1,25 @@
+import asyncio
+import pytest
+from aiohttp import web
+from circle_sketch.http_client import HttpClient
+
+@pytest.fixture
+def serve():
+    """serve(app, scenario, **client_kwargs) runs `scenario(client, base_url)`
+    against `app` on a local port, with a fresh HttpClient, and returns its result."""
+    def run(app, scenario, **client_kwargs):
+        async def main():
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            base = f'http://127.0.0.1:{runner.addresses[0][1]}'
+            client = HttpClient(backoff=0.01, **client_kwargs)
+            try:
+                return await scenario(client, base)
+            finally:
+                await client.close()
+                await runner.cleanup()
+
+        return asyncio.run(main())
+    return run
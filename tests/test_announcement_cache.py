@@ -0,0 +1,45 @@
+import asyncio
+import importlib
+import os
+import sys
+import types
+from circle_sketch.gallery import announcement_cache, gallery
+from circle_sketch.gallery.announcement_cache import AnnouncementCache, announcement_key
+from circle_sketch.gallery.render_service import RenderService
+
+def test_key_covers_theme_profile_version_and_font(monkeypatch):
+    key = announcement_key("Owls", "png")
+    assert key == announcement_key("Owls", "png")
+    assert key != announcement_key("Cats", "png")
+    assert key != announcement_key("Owls", "webp")
+    monkeypatch.setattr(announcement_cache, "ANNOUNCEMENT_RENDER_VERSION", gallery.ANNOUNCEMENT_RENDER_VERSION + 1)
+    assert key != announcement_key("Owls", "png")
+    monkeypatch.undo()
+    monkeypatch.setattr(announcement_cache, "font_fingerprint", lambda: "another font")
+    assert key != announcement_key("Owls", "png")
+
+def test_second_start_is_served_from_disk(tmp_path):
+    cache = AnnouncementCache(directory=str(tmp_path))
+    service = RenderService(max_workers=1, announcements=cache)
+    try:
+        first = asyncio.run(service.theme_announcement_image("Owls")).getvalue()
+        assert (cache.hits, cache.misses) == (0, 1)
+        assert os.path.exists(cache.path("Owls"))
+        # No render pool needed for a hit
+        service.shutdown()
+        service.render = None
+        second = asyncio.run(service.theme_announcement_image("Owls")).getvalue()
+    finally:
+        service.shutdown()
+    assert first == second
+    assert cache.hits == 1
+
+def test_prerender_renders_every_prompt_once(tmp_path, monkeypatch, capsys):
+    monkeypatch.setitem(sys.modules, "circle_sketch.prompts", types.SimpleNamespace(PROMPT_LIST=["Owls", "Cats", "Owls"]))
+    sys.modules.pop("circle_sketch.gallery.prerender_announcements", None)
+    prerender = importlib.import_module("circle_sketch.gallery.prerender_announcements")
+    cache = AnnouncementCache(directory=str(tmp_path))
+    assert prerender.main(cache) == 0
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(cache.path(theme)) for theme in ["Owls", "Cats"])
+    assert prerender.main(cache) == 0
+    assert "Rendered 0 theme banners (2 already cached)" in capsys.readouterr().out
@@ -0,0 +1,74 @@
+import asyncio
+import time
+from circle_sketch.storage.async_storage import AsyncStorageFacade
+from circle_sketch.storage.storage_sqlite import Storage
+
+# The longest the event loop may go without running a ready callback while
+# storage calls are in flight. Discord's heartbeat is far more tolerant, but
+# interactions must be acknowledged within 3s and every stall adds up.
+LOOP_LATENCY_BUDGET = 0.05
+
+class SlowStorage:
+    @staticmethod
+    def get_game_state():
+        time.sleep(0.2)
+        return {"theme": "Slow"}
+
+    @staticmethod
+    async def download_image(url):
+        return url
+
+async def measure_loop_lag(coro):
+    """Run `coro` while ticking the loop; return (result, worst tick delay)."""
+    worst = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal worst
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            worst = max(worst, time.perf_counter() - start - 0.005)
+
+    tick = asyncio.create_task(ticker())
+    try:
+        result = await coro
+    finally:
+        done = True
+        await tick
+    return result, worst
+
+def test_blocking_calls_stay_off_the_event_loop():
+    facade = AsyncStorageFacade(SlowStorage, max_workers=4)
+
+    async def scenario():
+        return await asyncio.gather(*(facade.get_game_state() for _ in range(4)))
+
+    start = time.perf_counter()
+    results, lag = asyncio.run(measure_loop_lag(scenario()))
+    elapsed = time.perf_counter() - start
+    facade.shutdown()
+    assert results == [{"theme": "Slow"}] * 4
+    assert lag < LOOP_LATENCY_BUDGET
+    # The four calls ran side by side rather than one after another.
+    assert elapsed < 0.6
+
+def test_coroutines_are_passed_through():
+    facade = AsyncStorageFacade(SlowStorage, max_workers=1)
+    assert asyncio.run(facade.download_image("http://x")) == "http://x"
+    facade.shutdown()
+
+def test_sqlite_round_trips_within_latency_budget():
+    facade = AsyncStorageFacade(Storage, max_workers=2)
+
+    async def scenario():
+        for i in range(50):
+            await facade.set_game_state({"theme": f"Theme {i}"})
+            await facade.get_game_state()
+        return await facade.get_game_state()
+
+    state, lag = asyncio.run(measure_loop_lag(scenario()))
+    facade.shutdown()
+    Storage.set_game_state(None)
+    assert state["theme"] == "Theme 49"
+    assert lag < LOOP_LATENCY_BUDGET
@@ -0,0 +1,89 @@
+import asyncio
+import io
+from PIL import Image
+from circle_sketch.gallery.avatar_cache import AvatarCache
+from circle_sketch.gallery.gallery import render_avatar
+
+def avatar_bytes(color, size=(256, 256)):
+    out = io.BytesIO()
+    Image.new("RGB", size, color).save(out, format="PNG")
+    return out.getvalue()
+
+class FakeCdn:
+    def __init__(self):
+        self.avatars = {}
+        self.downloads = 0
+
+    async def fetch(self, url):
+        self.downloads += 1
+        await asyncio.sleep(0.01)
+        return self.avatars[url]
+
+async def process(raw):
+    return render_avatar(raw)
+
+def test_memory_then_disk_hits(tmp_path):
+    cdn = FakeCdn()
+    cdn.avatars['url/abc'] = avatar_bytes((255, 0, 0))
+    cache = AvatarCache(directory=str(tmp_path), fetch=cdn.fetch)
+
+    async def scenario():
+        first = await cache.get('abc', 'url/abc', process)
+        second = await cache.get('abc', 'url/abc', process)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == second
+    assert Image.open(io.BytesIO(first)).size == (64, 64)
+    assert (cache.misses, cache.memory_hits, cache.disk_hits) == (1, 1, 0)
+
+    # A fresh process still has the disk tier
+    restarted = AvatarCache(directory=str(tmp_path), fetch=cdn.fetch)
+    assert asyncio.run(restarted.get('abc', 'url/abc', process)) == first
+    assert (restarted.misses, restarted.disk_hits) == (0, 1)
+    assert cdn.downloads == 1
+
+def test_changed_avatar_hash_misses(tmp_path):
+    cdn = FakeCdn()
+    cdn.avatars['url/old'] = avatar_bytes((255, 0, 0))
+    cdn.avatars['url/new'] = avatar_bytes((0, 0, 255))
+    cache = AvatarCache(directory=str(tmp_path), fetch=cdn.fetch)
+
+    async def scenario():
+        old = await cache.get('old', 'url/old', process)
+        new = await cache.get('new', 'url/new', process)
+        return old, new
+
+    old, new = asyncio.run(scenario())
+    assert old != new
+    assert cache.misses == 2
+
+def test_concurrent_misses_download_once(tmp_path):
+    cdn = FakeCdn()
+    cdn.avatars['url/abc'] = avatar_bytes((0, 255, 0))
+    cache = AvatarCache(directory=str(tmp_path), fetch=cdn.fetch)
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get('abc', 'url/abc', process) for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert len(set(results)) == 1
+    assert cdn.downloads == 1
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    cdn = FakeCdn()
+    for key in 'abc':
+        cdn.avatars[f'url/{key}'] = avatar_bytes((ord(key), 0, 0))
+    size = len(render_avatar(cdn.avatars['url/a']))
+    # Room for two avatars on disk, one in memory
+    cache = AvatarCache(directory=str(tmp_path), max_bytes=size * 2 + size // 2, memory_items=1, fetch=cdn.fetch)
+
+    async def scenario():
+        await cache.get('a', 'url/a', process)
+        await cache.get('b', 'url/b', process)
+        await cache.get('a', 'url/a', process)  # disk hit; b is now the oldest
+        await cache.get('c', 'url/c', process)
+
+    asyncio.run(scenario())
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['a.png', 'c.png']
+    assert cache.stats()['disk_items'] == 2
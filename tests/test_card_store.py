@@ -0,0 +1,94 @@
+import asyncio
+import os
+from circle_sketch.gallery.card_store import CardStore, GalleryPrerenderer
+from circle_sketch.user_resolver import PlayerProfile
+
+def make_user(user_id, name="Player", avatar="hash"):
+    return PlayerProfile(user_id, name, avatar, f"avatar/{avatar}")
+
+class FakeRenderService:
+    def __init__(self, delay=0.0, fail=0):
+        self.delay = delay
+        self.fail = fail
+        self.renders = 0
+
+    async def gallery_card(self, theme, date_str, user, drawing_url):
+        self.renders += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            self.fail -= 1
+            raise OSError("download failed")
+        return f"card:{theme}:{user.display_name}:{drawing_url}".encode()
+
+    async def mosaic_tile(self, user, drawing_url):
+        self.renders += 1
+        return f"tile:{user.display_name}:{drawing_url}".encode()
+
+def test_card_rendered_at_submission_is_ready(tmp_path):
+    service = FakeRenderService()
+    prerenderer = GalleryPrerenderer(service, CardStore(str(tmp_path)))
+    user = make_user(1)
+
+    async def scenario():
+        await prerenderer.schedule(7, "Owls", "2025-07-07", user, "url/1", kind="card")
+        return await prerenderer.card(7, "Owls", "2025-07-07", user, "url/1")
+
+    assert asyncio.run(scenario()) == b"card:Owls:Player:url/1"
+    assert service.renders == 1
+    assert prerenderer.stats(7) == {"ready": 1, "waited": 0, "rendered_late": 0}
+
+def test_card_still_rendering_is_waited_for(tmp_path):
+    service = FakeRenderService(delay=0.05)
+    prerenderer = GalleryPrerenderer(service, CardStore(str(tmp_path)))
+    user = make_user(1)
+
+    async def scenario():
+        prerenderer.schedule(7, "Owls", "2025-07-07", user, "url/1", kind="card")
+        return await prerenderer.card(7, "Owls", "2025-07-07", user, "url/1")
+
+    assert asyncio.run(scenario()) == b"card:Owls:Player:url/1"
+    assert service.renders == 1
+    assert prerenderer.stats(7)["waited"] == 1
+
+def test_stale_card_is_rendered_again(tmp_path):
+    service = FakeRenderService()
+    store = CardStore(str(tmp_path))
+    prerenderer = GalleryPrerenderer(service, store)
+
+    async def scenario():
+        await prerenderer.schedule(7, "Owls", "2025-07-07", make_user(1, "Old name"), "url/1", kind="card")
+        return await prerenderer.card(7, "Owls", "2025-07-07", make_user(1, "New name"), "url/1")
+
+    assert asyncio.run(scenario()) == b"card:Owls:New name:url/1"
+    assert prerenderer.stats(7) == {"ready": 0, "waited": 0, "rendered_late": 1}
+    # Only the current card is kept
+    assert len(os.listdir(tmp_path / "7")) == 1
+
+def test_failed_prerender_is_retried_at_game_end(tmp_path):
+    service = FakeRenderService(fail=1)
+    prerenderer = GalleryPrerenderer(service, CardStore(str(tmp_path)))
+    user = make_user(1)
+
+    async def scenario():
+        task = prerenderer.schedule(7, "Owls", "2025-07-07", user, "url/1", kind="card")
+        await asyncio.gather(task, return_exceptions=True)
+        return await prerenderer.card(7, "Owls", "2025-07-07", user, "url/1")
+
+    assert asyncio.run(scenario()) == b"card:Owls:Player:url/1"
+    assert prerenderer.stats(7)["rendered_late"] == 1
+
+def test_cards_survive_a_restart_and_are_cleared(tmp_path):
+    user = make_user(1)
+    first = GalleryPrerenderer(FakeRenderService(), CardStore(str(tmp_path)))
+
+    async def submit():
+        await first.schedule(7, None, None, user, "url/1", kind="tile")
+
+    asyncio.run(submit())
+    service = FakeRenderService()
+    restarted = GalleryPrerenderer(service, CardStore(str(tmp_path)))
+    assert asyncio.run(restarted.tile(7, user, "url/1")) == b"tile:Player:url/1"
+    assert service.renders == 0
+    assert restarted.clear(7) == {"ready": 1, "waited": 0, "rendered_late": 0}
+    assert not (tmp_path / "7").exists()
+    assert restarted.stats() == {"ready": 1, "waited": 0, "rendered_late": 0}
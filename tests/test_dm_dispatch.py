@@ -0,0 +1,81 @@
+import asyncio
+from types import SimpleNamespace
+import discord
+from circle_sketch.dm_dispatch import DmDispatcher, summarize
+
+class FakeChannel:
+    def __init__(self, bot, user_id):
+        self.bot = bot
+        self.user_id = user_id
+
+    async def send(self, content):
+        self.bot.sending += 1
+        self.bot.max_sending = max(self.bot.max_sending, self.bot.sending)
+        await asyncio.sleep(0.02)
+        self.bot.sending -= 1
+        if self.user_id in self.bot.closed_dms:
+            raise discord.Forbidden(SimpleNamespace(status=403, reason="Forbidden"), "Cannot send messages to this user")
+        self.bot.sent.append((self.user_id, content))
+
+class FakeBot:
+    """Users 1-5 are cached (1 with an open DM channel); others are not."""
+
+    def __init__(self, closed_dms=()):
+        self.closed_dms = set(closed_dms)
+        self.sent = []
+        self.opened = []
+        self.opening = self.max_opening = 0
+        self.sending = self.max_sending = 0
+        self.users = {uid: SimpleNamespace(id=uid, dm_channel=None) for uid in range(1, 6)}
+        self.users[1].dm_channel = FakeChannel(self, 1)
+
+    def get_user(self, user_id):
+        return self.users.get(user_id)
+
+    async def fetch_user(self, user_id):
+        raise AssertionError("fetch_user should not be needed")
+
+    async def create_dm(self, user):
+        self.opening += 1
+        self.max_opening = max(self.max_opening, self.opening)
+        await asyncio.sleep(0.02)
+        self.opening -= 1
+        self.opened.append(user.id)
+        return FakeChannel(self, user.id)
+
+def test_everyone_is_sent_to_concurrently():
+    bot = FakeBot(closed_dms={3})
+    dispatcher = DmDispatcher(open_concurrency=2, send_concurrency=8)
+    user_ids = [1, 2, 3, 4, 5, 42]
+    deliveries = asyncio.run(dispatcher.send(bot, user_ids, "Theme!"))
+    assert [d.user_id for d in deliveries] == user_ids
+    assert [d.status for d in deliveries] == ['sent', 'sent', 'forbidden', 'sent', 'sent', 'sent']
+    assert isinstance(deliveries[2].error, discord.Forbidden)
+    assert sorted(uid for uid, _ in bot.sent) == [1, 2, 4, 5, 42]
+    # The open DM channel is reused; the uncached user needs no lookup
+    assert sorted(bot.opened) == [2, 3, 4, 5, 42]
+    assert bot.max_opening == 2
+    assert bot.max_sending >= 2
+    assert summarize(deliveries) == '5 sent, 1 forbidden'
+
+def test_guild_members_are_used_first():
+    bot = FakeBot()
+    member = SimpleNamespace(id=77, dm_channel=FakeChannel(bot, 77))
+    guild = SimpleNamespace(get_member=lambda user_id: member if user_id == 77 else None)
+    deliveries = asyncio.run(DmDispatcher().send(bot, [77], "Theme!", guild=guild))
+    assert deliveries[0].status == 'sent'
+    assert bot.opened == []
+
+def test_fan_out_takes_about_one_round_trip():
+    bot = FakeBot()
+    loop_time = []
+
+    async def scenario():
+        start = asyncio.get_running_loop().time()
+        await DmDispatcher(open_concurrency=8, send_concurrency=16).send(bot, list(range(100, 116)), "Theme!")
+        loop_time.append(asyncio.get_running_loop().time() - start)
+
+    asyncio.run(scenario())
+    # 16 users sequentially would be 32 * 0.02s
+    assert loop_time[0] < 0.3
+    assert summarize([]) == 'nobody to DM'
@@ -0,0 +1,49 @@
+import asyncio
+import sys
+import types
+import pytest
+
+@pytest.fixture
+def game_management(monkeypatch):
+    monkeypatch.setitem(sys.modules, "circle_sketch.prompts", types.SimpleNamespace(PROMPT_LIST=["Owls"]))
+    from circle_sketch.cogs import game_management
+    return game_management
+
+class FakeChannel:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append(content)
+
+def test_game_is_cleared_when_the_gallery_fails(game_management, monkeypatch):
+    settled, cleared = [], []
+
+    async def apply_streak_results(submitted, missed, guild_id):
+        settled.append((submitted, missed))
+        return 0, 1, {1: 1, 2: 0}
+
+    async def get_submission_image_hashes(game_id):
+        return {}
+
+    async def resolve_many(bot, user_ids, guild=None):
+        return {}, {}
+
+    async def set_state(guild_id, state):
+        cleared.append((guild_id, state))
+
+    async def broken_gallery(*args):
+        raise MemoryError("render worker ran out of memory")
+
+    monkeypatch.setattr(game_management.AsyncStorage, "apply_streak_results", apply_streak_results)
+    monkeypatch.setattr(game_management.AsyncStorage, "get_submission_image_hashes", get_submission_image_hashes)
+    monkeypatch.setattr(game_management.user_resolver, "resolve_many", resolve_many)
+    monkeypatch.setattr(game_management.game_state_cache, "set", set_state)
+    cog = game_management.GameManagement.__new__(game_management.GameManagement)
+    cog.bot = types.SimpleNamespace(get_guild=lambda guild_id: None)
+    cog.post_mosaic_gallery = cog.post_gallery_cards = broken_gallery
+    state = {'game_id': 7, 'theme': 'Owls', 'date': '2025-07-07', 'user_ids': [1, 2], 'gallery': {1: 'drawing/1'}}
+    with pytest.raises(MemoryError):
+        asyncio.run(cog.end_game_phase(5, FakeChannel(), state))
+    assert settled == [([1], [2])]
+    assert cleared == [(5, {})]
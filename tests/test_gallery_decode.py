@@ -0,0 +1,44 @@
+import asyncio
+import io
+import pytest
+from PIL import Image
+from circle_sketch.gallery import gallery
+from circle_sketch.gallery.gallery import ImageTooLarge, decode_image, render_gallery_card
+from circle_sketch.gallery.render_service import RenderService
+
+def encode(size, fmt, color=(30, 160, 90)):
+    out = io.BytesIO()
+    Image.new("RGB", size, color).save(out, format=fmt)
+    return out.getvalue()
+
+def test_large_jpeg_is_downscaled_at_decode():
+    image = decode_image(encode((4000, 3000), "JPEG"), 800)
+    assert image.size == (800, 600)
+
+def test_large_png_is_downscaled():
+    image = decode_image(encode((3000, 1000), "PNG"), 600)
+    assert image.size == (600, 200)
+
+def test_small_image_is_left_alone():
+    image = decode_image(encode((300, 200), "PNG"), 800)
+    assert image.size == (300, 200)
+
+def test_decompression_bomb_is_rejected_before_decoding():
+    with pytest.raises(ImageTooLarge):
+        decode_image(encode((400, 400), "PNG"), 800, max_pixels=100_000)
+
+def test_card_size_is_bounded():
+    avatar = encode((64, 64), "PNG")
+    card = render_gallery_card("Theme", "2025-07-07", "Player", avatar, encode((5000, 4000), "JPEG"))
+    width, height = Image.open(io.BytesIO(card)).size
+    assert width <= gallery.MAX_DRAWING_SIZE + 80
+    assert height <= gallery.MAX_DRAWING_SIZE + 300
+
+def test_workers_have_a_memory_limit():
+    resource = pytest.importorskip("resource")
+    service = RenderService(max_workers=1, memory_limit_mb=512)
+    try:
+        soft, _ = asyncio.run(service.render(resource.getrlimit, resource.RLIMIT_AS))
+    finally:
+        service.shutdown()
+    assert soft == 512 * 1024 * 1024
@@ -0,0 +1,53 @@
+import io
+import pytest
+from PIL import Image
+from circle_sketch.gallery.encoding import ENCODING_PROFILES, encode_image, image_extension, upload_batches
+from circle_sketch.gallery.gallery import render_gallery_card, render_theme_announcement
+
+def noisy_image(size=(400, 300)):
+    return Image.merge("RGB", [Image.effect_noise(size, 60)] * 3).convert("RGBA")
+
+@pytest.mark.parametrize("name", sorted(ENCODING_PROFILES))
+def test_profiles_round_trip(name):
+    profile = ENCODING_PROFILES[name]
+    data = encode_image(noisy_image(), name)
+    image = Image.open(io.BytesIO(data))
+    assert image.format == profile.format
+    assert image.size == (400, 300)
+    assert image_extension(data) == profile.extension
+
+def test_lossy_quality_steps_down_to_fit():
+    image = noisy_image()
+    best = encode_image(image, "jpeg", max_bytes=float("inf"))
+    limit = len(best) // 2
+    data = encode_image(image, "jpeg", max_bytes=limit)
+    assert len(data) <= limit
+    assert Image.open(io.BytesIO(data)).size == (400, 300)
+
+def test_lossless_falls_back_when_too_large():
+    image = noisy_image()
+    limit = len(encode_image(image, "png", max_bytes=float("inf"))) // 4
+    data = encode_image(image, "png", max_bytes=limit)
+    assert len(data) <= limit
+    assert image_extension(data) == "jpg"
+
+def test_image_is_shrunk_when_lowest_quality_is_too_large():
+    data = encode_image(noisy_image(), "webp", max_bytes=4000)
+    assert len(data) <= 4000
+    assert Image.open(io.BytesIO(data)).width < 400
+
+def test_render_functions_take_a_profile():
+    drawing = io.BytesIO()
+    noisy_image((120, 90)).save(drawing, format="PNG")
+    avatar = io.BytesIO()
+    noisy_image((64, 64)).save(avatar, format="PNG")
+    card = render_gallery_card("Theme", "2025-07-07", "Player", avatar.getvalue(), drawing.getvalue(), profile="webp")
+    assert image_extension(card) == "webp"
+    assert image_extension(io.BytesIO(render_theme_announcement("Owls", profile="jpeg"))) == "jpg"
+
+def test_upload_batches_respect_count_and_total_size():
+    pages = [io.BytesIO(b"x" * size) for size in (6, 5, 2, 2, 9, 1, 1, 1)]
+    batches = upload_batches(pages, max_files=2, max_bytes=9)
+    assert [[page.getbuffer().nbytes for page in batch] for batch in batches] == [[6], [5, 2], [2], [9], [1, 1], [1]]
+    assert [page for batch in batches for page in batch] == pages
+    assert upload_batches([], max_files=10) == []
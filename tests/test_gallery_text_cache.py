@@ -0,0 +1,70 @@
+import io
+import time
+from PIL import Image, ImageDraw
+from circle_sketch.gallery import gallery
+from circle_sketch.gallery.gallery import get_font, render_gallery_card, render_theme_announcement, text_bbox
+
+def image_bytes(size, color):
+    out = io.BytesIO()
+    Image.new("RGB", size, color).save(out, format="PNG")
+    return out.getvalue()
+
+def test_fonts_load_once_per_size():
+    get_font.cache_clear()
+    assert get_font(28) is get_font(28)
+    render_theme_announcement("Owls")
+    render_theme_announcement("Cats")
+    assert get_font.cache_info().currsize == 3  # 28, 36 and 54
+
+def test_text_bbox_matches_drawn_text():
+    draw = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+    for text, size in [("Owls - 2025-07-07", 28), ("Some Player", 32), ("Theme for today is:", 36)]:
+        assert text_bbox(text, size) == draw.textbbox((0, 0), text, font=get_font(size))
+    hits = text_bbox.cache_info().hits
+    text_bbox("Some Player", 32)
+    assert text_bbox.cache_info().hits == hits + 1
+
+def test_card_render_benchmark():
+    """Per-card render time, and the text layout part of it, with cold font and
+    text caches (the old behaviour) vs warm ones. Run with `pytest -s` to see
+    the numbers.
+    """
+    avatar = image_bytes((64, 64), (200, 10, 10))
+    drawing = image_bytes((200, 150), (10, 120, 200))
+    iterations = 20
+
+    def render():
+        return render_gallery_card("Owls", "2025-07-07", "Some Player", avatar, drawing)
+
+    def layout_uncached():
+        # What each card used to do: load both fonts and measure on a throwaway image
+        draw = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+        draw.textbbox((0, 0), "Owls - 2025-07-07", font=get_font.__wrapped__(28))
+        draw.textbbox((0, 0), "Some Player", font=get_font.__wrapped__(32))
+
+    def layout_cached():
+        get_font(28), get_font(32)
+        text_bbox("Owls - 2025-07-07", 28), text_bbox("Some Player", 32)
+
+    def per_call_ms(fn):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        return (time.perf_counter() - start) / iterations * 1000
+
+    def render_cold():
+        gallery.get_font.cache_clear()
+        gallery.text_bbox.cache_clear()
+        return render()
+
+    cold = render_cold()
+    cold_ms = per_call_ms(render_cold)
+    warm = render()
+    warm_ms = per_call_ms(render)
+    layout_cold_ms = per_call_ms(layout_uncached)
+    layout_warm_ms = per_call_ms(layout_cached)
+
+    print(f"\ngallery card: {cold_ms:.2f} ms uncached, {warm_ms:.2f} ms cached; "
+          f"text layout: {layout_cold_ms:.3f} ms uncached, {layout_warm_ms:.3f} ms cached")
+    assert cold == warm
+    assert layout_warm_ms < layout_cold_ms
@@ -0,0 +1,81 @@
+import asyncio
+from types import SimpleNamespace
+import discord
+import pytest
+from circle_sketch.cogs import events_cog
+from circle_sketch.cogs.events_cog import EventsCog, GamePicker
+from circle_sketch.storage.async_storage import AsyncStorageFacade
+from circle_sketch.storage.state_cache import GameStateCache
+from circle_sketch.storage.storage_sqlite import Storage
+
+class FakeResponse:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_message(self, **kwargs):
+        self.edits.append(kwargs)
+
+def test_picked_game_is_returned():
+    async def scenario():
+        picker = GamePicker([("Server A: 'Owls'", (1, {"theme": "Owls"})), ("Server B: 'Cats'", (2, {"theme": "Cats"}))])
+        assert [option.label for option in picker.children[0].options] == ["Server A: 'Owls'", "Server B: 'Cats'"]
+        interaction = SimpleNamespace(data={"values": ["1"]}, response=FakeResponse())
+        await picker.picked(interaction)
+        timed_out = await picker.wait()
+        return picker.choice, timed_out, interaction.response.edits
+
+    choice, timed_out, edits = asyncio.run(scenario())
+    assert choice == (2, {"theme": "Cats"})
+    assert not timed_out
+    assert edits == [{"content": "Submitting your drawing to Server B: 'Cats'.", "view": None}]
+
+class FakeDM:
+    def __init__(self, on_view):
+        self.sent = []
+        self.on_view = on_view
+
+    async def send(self, content, view=None):
+        self.sent.append(content)
+        if view is not None:
+            await self.on_view(view)
+
+@pytest.fixture
+def facade():
+    Storage.reset()
+    facade = AsyncStorageFacade(Storage, max_workers=2)
+    yield facade
+    facade.shutdown()
+    Storage.reset()
+
+def test_game_that_ends_while_picking_is_not_submitted_to(facade, monkeypatch):
+    cache = GameStateCache(facade)
+
+    class FakeStore:
+        async def save(self, url):
+            return "hash"
+
+    monkeypatch.setattr(events_cog, "game_state_cache", cache)
+    monkeypatch.setattr(events_cog, "submission_store", FakeStore())
+    monkeypatch.setattr(discord, "DMChannel", FakeDM)
+    bot = SimpleNamespace(get_guild=lambda guild_id: SimpleNamespace(name=f"Server {guild_id}"))
+
+    async def scenario():
+        await cache.set(1, {"theme": "Owls", "user_ids": [7]})
+        ended = {"theme": "Cats", "user_ids": [7]}
+        await cache.set(2, ended)
+
+        async def pick_then_end(view):
+            view.choice = next(choice for _, choice in view.games if choice[0] == 2)
+            await cache.set(2, {})
+            view.stop()
+
+        channel = FakeDM(pick_then_end)
+        attachment = SimpleNamespace(url="https://cdn.example/cats.png", size=1000, content_type="image/png", width=10, height=10)
+        message = SimpleNamespace(author=SimpleNamespace(id=7, bot=False), channel=channel, attachments=[attachment], type="default")
+        await EventsCog(bot).on_message(message)
+        return channel.sent, ended["game_id"]
+
+    sent, game_id = asyncio.run(scenario())
+    assert sent[-1] == "The game for Server 2: 'Cats' has ended, so your drawing was not submitted."
+    assert Storage.get_submission_image_hashes(game_id) == {}
+    assert not Storage.get_game_history(guild_id=2)[0][0]["submissions"]
@@ -0,0 +1,64 @@
+import asyncio
+import pytest
+from aiohttp import web
+from circle_sketch.http_client import HttpError
+
+def run_with_server(serve, scenario, **client_kwargs):
+    stats = {'peers': set(), 'flaky': 0, 'active': 0, 'max_active': 0}
+
+    async def ok(request):
+        stats['peers'].add(request.transport.get_extra_info('peername'))
+        return web.Response(body=b'image-bytes')
+
+    async def flaky(request):
+        stats['flaky'] += 1
+        if stats['flaky'] < 3:
+            return web.Response(status=503)
+        return web.Response(body=b'finally')
+
+    async def missing(request):
+        return web.Response(status=404)
+
+    async def slow(request):
+        stats['active'] += 1
+        stats['max_active'] = max(stats['max_active'], stats['active'])
+        await asyncio.sleep(0.05)
+        stats['active'] -= 1
+        return web.Response(body=request.match_info['n'].encode())
+
+    app = web.Application()
+    app.add_routes([web.get('/ok', ok), web.get('/flaky', flaky), web.get('/missing', missing), web.get('/slow/{n}', slow)])
+    return serve(app, scenario, **client_kwargs), stats
+
+def test_connections_are_reused(serve):
+    async def scenario(client, base):
+        return [await client.get_bytes(f'{base}/ok') for _ in range(5)]
+
+    bodies, stats = run_with_server(serve, scenario)
+    assert bodies == [b'image-bytes'] * 5
+    assert len(stats['peers']) == 1
+
+def test_transient_errors_are_retried(serve):
+    async def scenario(client, base):
+        return await client.get_bytes(f'{base}/flaky')
+
+    body, stats = run_with_server(serve, scenario, retries=3)
+    assert body == b'finally'
+    assert stats['flaky'] == 3
+
+def test_client_errors_are_not_retried(serve):
+    async def scenario(client, base):
+        with pytest.raises(HttpError) as error:
+            await client.get_bytes(f'{base}/missing')
+        return error.value.status
+
+    status, _ = run_with_server(serve, scenario)
+    assert status == 404
+
+def test_concurrent_fetches_respect_per_host_limit(serve):
+    async def scenario(client, base):
+        return await client.get_many([f'{base}/slow/{n}' for n in range(6)])
+
+    bodies, stats = run_with_server(serve, scenario, max_per_host=2)
+    assert bodies == [str(n).encode() for n in range(6)]
+    assert stats['max_active'] == 2
@@ -0,0 +1,100 @@
+import asyncio
+import io
+import time
+from types import SimpleNamespace
+import pytest
+from aiohttp import web
+from PIL import Image
+from circle_sketch.gallery.ingest import (PROBE_BYTES, SubmissionRejected, check_attachment,
+                                          download_submission, probe_header)
+
+def encode(size, fmt, mode="RGB"):
+    out = io.BytesIO()
+    Image.new(mode, size).save(out, format=fmt)
+    return out.getvalue()
+
+def attachment(size=1000, content_type="image/png", width=800, height=600):
+    return SimpleNamespace(size=size, content_type=content_type, width=width, height=height)
+
+def test_attachment_metadata_is_checked():
+    check_attachment(attachment())
+    check_attachment(attachment(content_type=None, width=None, height=None))
+    with pytest.raises(SubmissionRejected, match="under"):
+        check_attachment(attachment(size=30 * 1024 ** 2), max_bytes=25 * 1024 ** 2)
+    with pytest.raises(SubmissionRejected, match="PNG, JPEG"):
+        check_attachment(attachment(content_type="video/mp4"))
+    with pytest.raises(SubmissionRejected, match="megapixels"):
+        check_attachment(attachment(width=20000, height=20000), max_pixels=64_000_000)
+
+def test_header_is_enough_to_accept_or_reject():
+    png = encode((9000, 9000), "PNG", mode="1")
+    # The dimensions are in the first few bytes of a PNG
+    with pytest.raises(SubmissionRejected, match="9000x9000"):
+        probe_header(png[:64], False, max_pixels=64_000_000)
+    assert probe_header(encode((300, 200), "JPEG")[:2048], False)
+    with pytest.raises(SubmissionRejected, match="PNG, JPEG"):
+        probe_header(encode((30, 20), "BMP"), True)
+
+def test_partial_header_waits_for_more():
+    assert probe_header(encode((300, 200), "PNG")[:8], False) is False
+    with pytest.raises(SubmissionRejected):
+        probe_header(b"not an image", True)
+    with pytest.raises(SubmissionRejected):
+        probe_header(b"\0" * PROBE_BYTES, False)
+
+def run_with_server(serve, scenario):
+    stats = {'sent': 0}
+    drawing = encode((300, 200), "PNG")
+
+    async def image(request):
+        return web.Response(body=drawing, content_type="image/png")
+
+    async def streamed(request):
+        # Chunked, so there's no Content-Length to check up front
+        response = web.StreamResponse()
+        await response.prepare(request)
+        first = {'gif': encode((300, 200), 'GIF'), 'junk': b'junk'}[request.match_info['first']]
+        try:
+            for i in range(400):
+                await response.write(first if i == 0 else b"\0" * 64 * 1024)
+                stats['sent'] += 1
+        except (ConnectionError, RuntimeError):
+            pass
+        return response
+
+    async def stalled(request):
+        await asyncio.sleep(1)
+        return web.Response(body=drawing)
+
+    app = web.Application()
+    app.add_routes([web.get('/image', image), web.get('/streamed/{first}', streamed), web.get('/stalled', stalled)])
+    return serve(app, lambda client, base: scenario(client, base, drawing)), stats
+
+def test_download_is_capped(serve):
+    async def scenario(client, base, drawing):
+        assert await download_submission(f'{base}/image', client=client) == drawing
+        with pytest.raises(SubmissionRejected, match="over"):
+            await download_submission(f'{base}/image', max_bytes=len(drawing) - 1, client=client)
+        with pytest.raises(SubmissionRejected, match="over"):
+            await download_submission(f'{base}/streamed/gif', max_bytes=1024 ** 2, client=client)
+
+    run_with_server(serve, scenario)
+
+def test_non_image_is_abandoned_after_the_header(serve):
+    async def scenario(client, base, drawing):
+        with pytest.raises(SubmissionRejected, match="PNG, JPEG"):
+            await download_submission(f'{base}/streamed/junk', client=client)
+
+    _, stats = run_with_server(serve, scenario)
+    # 400 chunks (25 MB) would have been sent in full
+    assert stats['sent'] < 100
+
+def test_download_gives_up_in_time_for_the_player(serve):
+    async def scenario(client, base, drawing):
+        start = time.monotonic()
+        with pytest.raises(asyncio.TimeoutError):
+            await download_submission(f'{base}/stalled', client=client, timeout=0.2)
+        return time.monotonic() - start
+
+    elapsed, _ = run_with_server(serve, scenario)
+    assert elapsed < 2
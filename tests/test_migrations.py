@@ -0,0 +1,69 @@
+import json
+import sqlite3
+import pytest
+from circle_sketch.storage import storage_sqlite
+from circle_sketch.storage.migrations import get_schema_version, latest_version
+from circle_sketch.storage.storage_sqlite import MIGRATIONS, Storage
+
+@pytest.fixture
+def legacy_db(tmp_path, monkeypatch):
+    # A database as written by the last release before migrations existed
+    path = str(tmp_path / 'legacy.sqlite3')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE player_circle (user_id INTEGER PRIMARY KEY, guild_id INTEGER)')
+    conn.execute('CREATE TABLE game_state (id INTEGER PRIMARY KEY CHECK (id = 1), state TEXT)')
+    conn.execute('CREATE TABLE user_streaks (user_id INTEGER PRIMARY KEY, streak INTEGER DEFAULT 0)')
+    conn.executemany('INSERT INTO player_circle (user_id, guild_id) VALUES (?, ?)', [(1, 10), (2, 10), (3, 10)])
+    conn.execute('INSERT INTO user_streaks (user_id, streak) VALUES (1, 7)')
+    legacy = {"theme": "Legacy", "date": "2025-07-07", "user_ids": [1, 2], "submissions": {"1": "http://img/1.png"}, "gallery": {"1": "http://img/1.png"}}
+    conn.execute('INSERT INTO game_state (id, state) VALUES (1, ?)', (json.dumps(legacy),))
+    conn.commit()
+    conn.close()
+    Storage.close_connections()
+    monkeypatch.setattr(storage_sqlite, 'DB_PATH', path)
+    yield path
+    Storage.close_connections()
+
+def test_legacy_database_is_migrated(legacy_db):
+    assert Storage.schema_version() == 0
+    applied = Storage.migrate()
+    assert [m.version for m in applied] == [m.version for m in MIGRATIONS]
+    assert Storage.schema_version() == latest_version(MIGRATIONS)
+    assert Storage.get_player_circle(10) == [1, 2, 3]
+    # Single-guild data belongs to the only guild with players
+    assert Storage.get_user_streak(1, guild_id=10) == 7
+    assert Storage.get_active_game_guilds() == [10]
+    loaded = Storage.get_game_state(guild_id=10)
+    assert loaded["theme"] == "Legacy"
+    assert loaded["user_ids"] == [1, 2]
+    assert loaded["submissions"] == {1: "http://img/1.png"}
+    row = Storage._get_conn().execute('SELECT state FROM game_state WHERE guild_id=10').fetchone()
+    assert "submissions" not in json.loads(row["state"])
+
+def test_migrations_run_once(legacy_db):
+    Storage.migrate()
+    assert Storage.migrate() == []
+    Storage.init()
+    conn = Storage._get_conn()
+    assert conn.execute('SELECT COUNT(*) FROM schema_version').fetchone()[0] == len(MIGRATIONS)
+
+def test_circle_lookup_uses_index(legacy_db):
+    Storage.migrate()
+    conn = Storage._get_conn()
+    plan = ' '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN SELECT user_id FROM player_circle WHERE guild_id=?', (10,)))
+    # The (guild_id, user_id) primary key covers it
+    assert 'USING COVERING INDEX' in plan and '(guild_id=?)' in plan
+    plan = ' '.join(row[3] for row in conn.execute(
+        'EXPLAIN QUERY PLAN SELECT user_id, image_url FROM game_submissions WHERE game_id=? ORDER BY submitted_at', (1,)))
+    assert 'idx_game_submissions_game_time' in plan
+    assert 'TEMP B-TREE' not in plan
+
+def test_new_database_starts_at_latest_version(tmp_path, monkeypatch):
+    Storage.close_connections()
+    monkeypatch.setattr(storage_sqlite, 'DB_PATH', str(tmp_path / 'fresh.sqlite3'))
+    try:
+        Storage.init()
+        assert get_schema_version(Storage._get_conn().cursor()) == latest_version(MIGRATIONS)
+        assert Storage.get_group_streak() == 0
+    finally:
+        Storage.close_connections()
@@ -0,0 +1,81 @@
+import asyncio
+import io
+import pytest
+from PIL import Image
+from circle_sketch.gallery import mosaic, render_service as render_service_module
+from circle_sketch.gallery.avatar_cache import AvatarCache
+from circle_sketch.gallery.gallery import render_avatar
+from circle_sketch.gallery.mosaic import mosaic_layout, render_mosaic, render_mosaic_tile, tile_height
+from circle_sketch.gallery.render_service import RenderService
+from circle_sketch.gallery.submission_store import SubmissionStore
+from circle_sketch.user_resolver import PlayerProfile
+
+def image_bytes(size, color):
+    out = io.BytesIO()
+    Image.new("RGB", size, color).save(out, format="PNG")
+    return out.getvalue()
+
+@pytest.mark.parametrize("count,max_tiles,expected", [
+    (0, 16, []),
+    (1, 16, [(1, 1, 1)]),
+    (5, 16, [(5, 3, 2)]),
+    (16, 16, [(16, 4, 4)]),
+    (17, 16, [(9, 3, 3), (8, 3, 3)]),
+    (40, 16, [(14, 4, 4), (14, 4, 4), (12, 4, 3)]),
+])
+def test_layout_spreads_tiles_evenly(count, max_tiles, expected):
+    layout = mosaic_layout(count, max_tiles)
+    assert [(page.tiles.stop - page.tiles.start, page.columns, page.rows) for page in layout] == expected
+    assert sum(page.tiles.stop - page.tiles.start for page in layout) == count
+
+def test_mosaic_grid_size():
+    avatar = render_avatar(image_bytes((64, 64), (200, 10, 10)))
+    tiles = [render_mosaic_tile(f"Player {i}", avatar, image_bytes((300 + 50 * i, 200), (10, 20 * i, 200)), tile_size=200)
+             for i in range(5)]
+    assert all(len(tile) == 200 * tile_height(200) * 4 for tile in tiles)
+    image = Image.open(io.BytesIO(render_mosaic("Owls", "2025-07-07", tiles, columns=3, tile_size=200, profile="png")))
+    cell = 200 + mosaic.PAD
+    assert image.width == 3 * cell + mosaic.PAD
+    assert image.height > 2 * (tile_height(200) + mosaic.PAD)
+
+def test_render_service_builds_pages(tmp_path, monkeypatch):
+    images = {f"avatar/{i}": image_bytes((128, 128), (i * 20, 0, 0)) for i in range(5)}
+    images.update({f"drawing/{i}": image_bytes((320, 240), (0, i * 20, 0)) for i in range(5)})
+    images["drawing/4"] = b"not an image"
+
+    async def fetch(url):
+        return images[url]
+
+    monkeypatch.setattr(render_service_module.mosaic, "mosaic_layout",
+                        lambda count: mosaic_layout(count, max_tiles=2))
+    users = [PlayerProfile(i, f"Player {i}", f"hash{i}", f"avatar/{i}") for i in range(5)]
+    service = RenderService(max_workers=2, avatars=AvatarCache(directory=str(tmp_path / "avatars"), fetch=fetch),
+                            drawings=SubmissionStore(directory=str(tmp_path / "submissions"), fetch=fetch))
+    try:
+        pages, failures = asyncio.run(service.gallery_mosaics("Owls", "2025-07-07", [(u, f"drawing/{u.id}") for u in users]))
+    finally:
+        service.shutdown()
+    assert list(failures) == [4]
+    assert len(pages) == 2
+    assert all(Image.open(page).format == "PNG" for page in pages)
+
+def test_failed_page_reports_its_players(monkeypatch):
+    monkeypatch.setattr(render_service_module.mosaic, "mosaic_layout",
+                        lambda count: mosaic_layout(count, max_tiles=2))
+    service = RenderService(max_workers=1)
+
+    async def render(fn, *args, page, **kwargs):
+        if page[0] == 2:
+            raise render_service_module.RenderTimeout("render_mosaic took longer than 30s")
+        return image_bytes((10, 10), (0, 0, 0))
+
+    async def tile(user, drawing_url):
+        return b"tile"
+
+    monkeypatch.setattr(service, "render", render)
+    users = [PlayerProfile(i, f"Player {i}", f"hash{i}", f"avatar/{i}") for i in range(5)]
+    pages, failures = asyncio.run(service.gallery_mosaics("Owls", "2025-07-07", [(u, f"drawing/{u.id}") for u in users], tile=tile))
+    # Tiles 0-1 and 4 render on pages 1 and 3; page 2 held players 2 and 3
+    assert len(pages) == 2
+    assert sorted(failures) == [2, 3]
+    assert all(isinstance(error, render_service_module.RenderTimeout) for error in failures.values())
@@ -0,0 +1,38 @@
+import time
+import numpy as np
+from PIL import Image
+from circle_sketch.gallery.palette import FALLBACK_COLOR, dominant_color, dominant_colors
+
+def noisy(size, base, spread=6, seed=0):
+    rng = np.random.default_rng(seed)
+    pixels = np.clip(rng.normal(base, spread, size=(size[1], size[0], 3)), 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels, "RGB")
+
+def close(color, expected, tolerance=8):
+    return all(abs(a - b) <= tolerance for a, b in zip(color, expected))
+
+def test_solid_color():
+    assert dominant_color(Image.new("RGB", (50, 40), (12, 200, 90))) == (12, 200, 90)
+
+def test_noisy_photo_of_paper_with_a_sketch():
+    image = noisy((400, 300), (236, 232, 220))
+    image.paste(noisy((120, 80), (30, 30, 35), seed=1), (50, 50))
+    assert close(dominant_color(image), (236, 232, 220))
+
+def test_transparent_pixels_are_ignored():
+    image = Image.new("RGBA", (100, 100), (255, 0, 0, 0))
+    image.paste(Image.new("RGBA", (30, 30), (0, 0, 255, 255)), (10, 10))
+    assert dominant_color(image) == (0, 0, 255)
+    assert dominant_color(Image.new("RGBA", (10, 10), (0, 0, 0, 0))) == FALLBACK_COLOR
+
+def test_batch_matches_single_images():
+    images = [noisy((200, 150), (40 * i, 100, 200 - 30 * i), seed=i) for i in range(5)]
+    images.append(Image.new("RGBA", (10, 10), (0, 0, 0, 0)))
+    assert dominant_colors(images) == [dominant_color(image) for image in images]
+
+def test_cost_is_bounded_by_the_sample_size():
+    image = noisy((4000, 3000), (120, 80, 40))
+    start = time.perf_counter()
+    color = dominant_color(image)
+    assert time.perf_counter() - start < 0.5
+    assert close(color, (120, 80, 40))
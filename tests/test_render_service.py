@@ -0,0 +1,109 @@
+import asyncio
+import io
+import os
+import time
+import pytest
+from PIL import Image
+from circle_sketch.gallery.announcement_cache import AnnouncementCache
+from circle_sketch.gallery.gallery import render_gallery_card
+from circle_sketch.gallery.render_service import RenderService, RenderTimeout
+
+def image_bytes(size, color):
+    out = io.BytesIO()
+    Image.new("RGB", size, color).save(out, format="PNG")
+    return out.getvalue()
+
+@pytest.fixture
+def service(tmp_path):
+    service = RenderService(max_workers=2, max_queue=4, timeout=30, announcements=AnnouncementCache(directory=str(tmp_path)))
+    yield service
+    service.shutdown()
+
+def test_cards_render_in_worker_processes(service):
+    avatar = image_bytes((64, 64), (200, 10, 10))
+    drawings = [image_bytes((120, 90 + 10 * i), (10, 10 * i, 200)) for i in range(6)]
+
+    async def scenario():
+        jobs = [service.render(render_gallery_card, "Theme", "2025-07-07", f"Player {i}", avatar, drawing)
+                for i, drawing in enumerate(drawings)]
+        return await asyncio.gather(*jobs, service.render(os.getpid))
+
+    *cards, worker_pid = asyncio.run(scenario())
+    assert worker_pid != os.getpid()
+    heights = [Image.open(io.BytesIO(card)).height for card in cards]
+    assert heights == sorted(heights) and len(set(heights)) == len(heights)
+
+def test_theme_announcement_is_png(service):
+    image = asyncio.run(service.theme_announcement_image("Owls"))
+    assert Image.open(image).size == (1000, 300)
+
+def test_slow_job_times_out():
+    service = RenderService(max_workers=1, max_queue=1, timeout=0.2)
+    try:
+        with pytest.raises(RenderTimeout):
+            asyncio.run(service.render(time.sleep, 1))
+    finally:
+        service.shutdown(wait=False)
+
+def test_queue_is_bounded():
+    service = RenderService(max_workers=1, max_queue=2, timeout=30)
+
+    async def scenario():
+        jobs = [asyncio.ensure_future(service.render(time.sleep, 0.2)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        # Two jobs hold the queue's slots; the third waits for one to free up
+        waiting = service.waiting
+        await asyncio.gather(*jobs)
+        return waiting
+
+    try:
+        assert asyncio.run(scenario()) == 1
+    finally:
+        service.shutdown()
+
+def test_timed_out_job_keeps_its_queue_slot():
+    service = RenderService(max_workers=2, max_queue=1, timeout=0.2)
+
+    async def scenario():
+        with pytest.raises(RenderTimeout):
+            await service.render(time.sleep, 1)
+        service.timeout = 30
+        job = asyncio.ensure_future(service.render(time.sleep, 0))
+        await asyncio.sleep(0.05)
+        # The first job is still running in a worker, so this one waits for its slot
+        waiting = service.waiting
+        await job
+        return waiting
+
+    try:
+        assert asyncio.run(scenario()) == 1
+    finally:
+        service.shutdown()
+
+LAUNCHER = '''
+import asyncio, os, sys
+sys.path.insert(0, {root!r})
+import circle_sketch.main  # imported at module level, like run_bot.py
+from circle_sketch.gallery.render_service import RenderService
+
+if __name__ == "__main__":
+    service = RenderService(max_workers=1, timeout=20)
+    try:
+        print("worker", asyncio.run(service.render(os.getpid)), "parent", os.getpid())
+    finally:
+        service.shutdown()
+'''
+
+def test_workers_do_not_start_the_bot(tmp_path):
+    # Spawned workers re-import the launching script as __mp_main__, which
+    # imports circle_sketch.main; that must not run the bot
+    import subprocess
+    import sys
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = tmp_path / "launcher.py"
+    script.write_text(LAUNCHER.format(root=root))
+    result = subprocess.run([sys.executable, str(script)], cwd=tmp_path, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    words = result.stdout.splitlines()[-1].split()
+    assert words[0] == "worker" and words[1] != words[3]
+    assert "Startup Settings" not in result.stdout + result.stderr
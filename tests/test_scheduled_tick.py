@@ -0,0 +1,72 @@
+import asyncio
+import sys
+import types
+import pytest
+
+@pytest.fixture
+def game_management(monkeypatch):
+    monkeypatch.setitem(sys.modules, "circle_sketch.prompts", types.SimpleNamespace(PROMPT_LIST=["Owls"]))
+    from circle_sketch.cogs import game_management
+    return game_management
+
+def test_slow_guild_does_not_hold_up_the_next_minute(game_management, monkeypatch):
+    # Guild 1 is scheduled for one minute and guild 2 for the next
+    minutes = [[1], [2]]
+
+    async def get_scheduled_guilds(now, default_time):
+        return minutes.pop(0)
+
+    monkeypatch.setattr(game_management.AsyncStorage, "get_scheduled_guilds", get_scheduled_guilds)
+    # Without __init__, so no scheduler is started
+    cog = game_management.GameManagement.__new__(game_management.GameManagement)
+    cog.schedule_tasks = {}
+    ran = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def run_schedule(guild_id):
+            ran.append(guild_id)
+            if guild_id == 1:
+                await release.wait()
+
+        cog.run_schedule = run_schedule
+        await asyncio.wait_for(cog.scheduled_tick(), 1)
+        await asyncio.wait_for(cog.scheduled_tick(), 1)
+        await asyncio.sleep(0)
+        # Guild 2 has had its game while guild 1's is still going
+        assert ran == [1, 2]
+        assert list(cog.schedule_tasks) == [1]
+        release.set()
+        await cog.schedule_tasks[1]
+        await asyncio.sleep(0)
+        assert cog.schedule_tasks == {}
+
+    asyncio.run(scenario())
+
+def test_guild_still_running_is_not_started_twice(game_management, monkeypatch):
+    async def get_scheduled_guilds(now, default_time):
+        return [1]
+
+    monkeypatch.setattr(game_management.AsyncStorage, "get_scheduled_guilds", get_scheduled_guilds)
+    cog = game_management.GameManagement.__new__(game_management.GameManagement)
+    cog.schedule_tasks = {}
+    ran = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def run_schedule(guild_id):
+            ran.append(guild_id)
+            await release.wait()
+
+        cog.run_schedule = run_schedule
+        await cog.scheduled_tick()
+        await asyncio.sleep(0)
+        await cog.scheduled_tick()
+        await asyncio.sleep(0)
+        release.set()
+        await cog.schedule_tasks[1]
+
+    asyncio.run(scenario())
+    assert ran == [1]
@@ -0,0 +1,113 @@
+import asyncio
+import pytest
+from circle_sketch.storage.async_storage import AsyncStorageFacade
+from circle_sketch.storage.errors import StaleGameStateError
+from circle_sketch.storage.state_cache import GameStateCache
+from circle_sketch.storage.storage_sqlite import Storage
+
+GUILD = 1234
+
+@pytest.fixture
+def facade():
+    Storage.reset()
+    facade = AsyncStorageFacade(Storage, max_workers=2)
+    yield facade
+    facade.shutdown()
+    Storage.reset()
+
+def test_reads_are_served_from_cache(facade):
+    async def scenario():
+        cache = GameStateCache(facade)
+        await cache.set(GUILD, {"theme": "Cached", "date": "2025-07-07", "user_ids": [1, 2]})
+        for _ in range(5):
+            state = await cache.get(GUILD)
+        return cache, state
+
+    cache, state = asyncio.run(scenario())
+    assert state["theme"] == "Cached"
+    assert cache.misses == 1
+    assert cache.hits >= 5
+    stored = Storage.get_game_state(guild_id=GUILD)
+    assert stored["theme"] == "Cached"
+    assert stored["version"] == state["version"]
+
+def test_players_and_submissions_are_tracked(facade):
+    async def scenario():
+        cache = GameStateCache(facade)
+        state = {"theme": "Cached", "user_ids": [1]}
+        await cache.set(GUILD, state)
+        game_id = state["game_id"]
+        await cache.add_participant(GUILD, game_id, 2)
+        assert await cache.is_participant(GUILD, game_id, 2)
+        assert not await cache.is_participant(GUILD, game_id, 3)
+        assert await cache.record_submission(GUILD, game_id, 2, "http://img/2.png")
+        assert not await cache.record_submission(GUILD, game_id, 2, "http://img/again.png")
+        return await cache.get(GUILD, include_players=True)
+
+    state = asyncio.run(scenario())
+    assert state["user_ids"] == [1, 2]
+    assert state["submissions"] == {2: "http://img/2.png"}
+    assert Storage.get_game_state(guild_id=GUILD)["submissions"] == {2: "http://img/2.png"}
+
+def test_stale_write_is_rejected_and_reloaded(facade):
+    async def scenario():
+        ours = GameStateCache(facade)
+        theirs = GameStateCache(facade)
+        await ours.set(GUILD, {"theme": "Ours"})
+        await theirs.set(GUILD, {"theme": "Theirs"})
+        with pytest.raises(StaleGameStateError):
+            await ours.set(GUILD, {"theme": "Ours again"})
+        return await ours.get(GUILD)
+
+    state = asyncio.run(scenario())
+    assert state["theme"] == "Theirs"
+
+def test_invalidate_picks_up_external_writes(facade):
+    async def scenario():
+        cache = GameStateCache(facade)
+        await cache.set(GUILD, {"theme": "Before"})
+        Storage.set_game_state({"theme": "After"}, guild_id=GUILD)
+        stale = await cache.get(GUILD)
+        cache.invalidate()
+        fresh = await cache.get(GUILD)
+        return stale, fresh
+
+    stale, fresh = asyncio.run(scenario())
+    assert stale["theme"] == "Before"
+    assert fresh["theme"] == "After"
+
+def test_clearing_keeps_version_increasing(facade):
+    async def scenario():
+        cache = GameStateCache(facade)
+        first = await cache.set(GUILD, {"theme": "One"})
+        cleared = await cache.set(GUILD, None)
+        assert await cache.get(GUILD) is None
+        fresh = GameStateCache(facade)
+        second = await fresh.set(GUILD, {"theme": "Two"})
+        return first, cleared, second
+
+    first, cleared, second = asyncio.run(scenario())
+    assert first < cleared < second
+
+def test_guilds_are_cached_separately(facade):
+    async def scenario():
+        cache = GameStateCache(facade)
+        await cache.set(GUILD, {"theme": "Here", "user_ids": [1, 2]})
+        await cache.set(GUILD + 1, {"theme": "There", "user_ids": [2, 3]})
+        here, there = await cache.get(GUILD), await cache.get(GUILD + 1)
+        return here, there, await cache.games_for_user(2), await cache.games_for_user(3)
+
+    here, there, both, one = asyncio.run(scenario())
+    assert (here["theme"], there["theme"]) == ("Here", "There")
+    assert [guild_id for guild_id, _ in both] == [GUILD, GUILD + 1]
+    assert [(guild_id, state["theme"]) for guild_id, state in one] == [(GUILD + 1, "There")]
+    assert Storage.get_game_state() is None
+
+def test_games_for_user_loads_other_guilds(facade):
+    Storage.set_game_state({"theme": "Elsewhere", "user_ids": [7]}, guild_id=GUILD)
+
+    async def scenario():
+        return await GameStateCache(facade).games_for_user(7)
+
+    games = asyncio.run(scenario())
+    assert [(guild_id, state["theme"]) for guild_id, state in games] == [(GUILD, "Elsewhere")]
@@ -1,5 +1,7 @@
 import pytest
+import threading
 from circle_sketch.storage.storage_sqlite import Storage
+from circle_sketch.storage.errors import CircleFullError
 
 @pytest.fixture(autouse=True)
 def setup_and_teardown():
@@ -8,10 +10,10 @@ def setup_and_teardown():
     Storage.reset()
 
 def test_player_circle_add_and_remove():
-    Storage.set_player_circle([1, 2, 3])
+    Storage.set_player_circle(None, [1, 2, 3])
     circle = Storage.get_player_circle()
     assert circle == [1, 2, 3]
-    Storage.set_player_circle([2, 3])
+    Storage.set_player_circle(None, [2, 3])
     circle = Storage.get_player_circle()
     assert circle == [2, 3]
 
@@ -24,3 +26,229 @@ def test_game_state_set_and_get():
     assert loaded["submissions"] == {}
     Storage.set_game_state(None)
     assert Storage.get_game_state() is None
+
+
+def test_connection_is_reused_per_thread():
+    conn = Storage._get_conn()
+    conn.close()
+    assert Storage._get_conn() is conn
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    other = []
+    t = threading.Thread(target=lambda: other.append(Storage._get_conn()))
+    t.start()
+    t.join()
+    assert other[0] is not conn
+
+def test_close_connections_reopens():
+    conn = Storage._get_conn()
+    Storage.close_connections()
+    assert Storage._get_conn() is not conn
+    Storage.set_game_state({"theme": "After reconnect"})
+    assert Storage.get_game_state()["theme"] == "After reconnect"
+
+def test_submissions_are_recorded_once():
+    state = {"theme": "Test", "date": "2025-07-07", "user_ids": [1, 2]}
+    Storage.set_game_state(state)
+    game_id = state["game_id"]
+    assert Storage.is_game_participant(game_id, 1)
+    assert not Storage.is_game_participant(game_id, 3)
+    assert Storage.add_game_participant(game_id, 3)
+    assert not Storage.add_game_participant(game_id, 3)
+    assert Storage.record_submission(game_id, 1, "http://img/1.png")
+    assert not Storage.record_submission(game_id, 1, "http://img/other.png")
+    loaded = Storage.get_game_state()
+    assert loaded["user_ids"] == [1, 2, 3]
+    assert loaded["submissions"] == {1: "http://img/1.png"}
+    assert loaded["gallery"] == {1: "http://img/1.png"}
+    assert "user_ids" not in Storage.get_game_state(include_players=False)
+
+def test_concurrent_submissions_are_not_lost():
+    state = {"theme": "Test", "date": "2025-07-07", "user_ids": list(range(20))}
+    Storage.set_game_state(state)
+    game_id = state["game_id"]
+    threads = [threading.Thread(target=Storage.record_submission, args=(game_id, uid, f"http://img/{uid}.png")) for uid in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(Storage.get_game_state()["submissions"]) == 20
+
+def test_new_game_replaces_previous_players():
+    first = {"theme": "First", "user_ids": [1], "submissions": {1: "http://img/1.png"}}
+    Storage.set_game_state(first)
+    second = {"theme": "Second", "user_ids": [2]}
+    Storage.set_game_state(second)
+    assert second["game_id"] != first["game_id"]
+    loaded = Storage.get_game_state()
+    assert loaded["user_ids"] == [2]
+    assert loaded["submissions"] == {}
+    assert not Storage.is_game_participant(first["game_id"], 1)
+
+def test_apply_streak_results_settles_everything_at_once():
+    Storage.reset_all_streaks()
+    Storage.set_user_streak(1, 4)
+    previous, group, streaks = Storage.apply_streak_results([1, 2], [3])
+    assert (previous, group) == (0, 1)
+    assert streaks == {1: 5, 2: 1, 3: 0}
+    assert Storage.get_user_streaks([1, 2, 3, 99]) == {1: 5, 2: 1, 3: 0, 99: 0}
+    previous, group, streaks = Storage.apply_streak_results([], [1, 2])
+    assert (previous, group) == (1, 0)
+    assert streaks == {1: 0, 2: 0}
+    assert Storage.get_group_streak() == 0
+    assert Storage.get_user_streaks()[1] == 0
+
+def test_add_and_remove_single_circle_member():
+    assert Storage.add_to_circle(1, 10, limit=3) == (True, 1)
+    assert Storage.add_to_circle(1, 10, limit=3) == (False, 1)
+    assert Storage.add_to_circle(1, 11, limit=3) == (True, 2)
+    assert Storage.is_in_circle(1, 10)
+    assert not Storage.is_in_circle(2, 10)
+    assert Storage.remove_from_circle(1, 10)
+    assert not Storage.remove_from_circle(1, 10)
+    assert Storage.get_player_circle(1) == [11]
+
+def test_concurrent_joins_respect_circle_limit():
+    results = []
+    lock = threading.Lock()
+
+    def join(user_id):
+        try:
+            outcome = Storage.add_to_circle(1, user_id, limit=10)[0]
+        except CircleFullError:
+            outcome = 'full'
+        with lock:
+            results.append(outcome)
+
+    threads = [threading.Thread(target=join, args=(uid,)) for uid in range(100, 130)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 10
+    assert results.count('full') == 20
+    assert len(Storage.get_player_circle(1)) == 10
+
+def test_concurrent_joins_lose_no_members():
+    threads = [threading.Thread(target=Storage.add_to_circle, args=(1, uid, 10)) for uid in range(200, 208)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(Storage.get_player_circle(1)) == list(range(200, 208))
+
+def test_game_state_and_streaks_are_per_guild():
+    Storage.set_game_state({"theme": "A"}, guild_id=1)
+    Storage.set_game_state({"theme": "B"}, guild_id=2)
+    assert Storage.get_game_state(guild_id=1)["theme"] == "A"
+    assert Storage.get_game_state(guild_id=2)["theme"] == "B"
+    assert Storage.get_active_game_guilds() == [1, 2]
+    Storage.apply_streak_results([5], [], guild_id=1)
+    Storage.apply_streak_results([], [5], guild_id=2)
+    assert Storage.get_group_streak(guild_id=1) == 1
+    assert Storage.get_group_streak(guild_id=2) == 0
+    assert Storage.get_user_streaks([5], guild_id=1) == {5: 1}
+    assert Storage.get_user_streaks([5], guild_id=2) == {5: 0}
+    Storage.set_game_state({}, guild_id=1)
+    assert Storage.get_active_game_guilds() == [2]
+
+def test_player_can_join_several_guilds_circles():
+    Storage.clear_all()
+    assert Storage.add_to_circle(1, 42, 10) == (True, 1)
+    assert Storage.add_to_circle(2, 42, 10) == (True, 1)
+    assert Storage.get_player_circle(1) == [42]
+    assert Storage.get_player_circle(2) == [42]
+    Storage.remove_from_circle(1, 42)
+    assert Storage.get_player_circle(1) == []
+    assert Storage.get_player_circle(2) == [42]
+    Storage.clear_all()
+
+def test_scheduled_guilds_follow_their_game_time():
+    Storage.set_player_circle(1, [10])
+    Storage.set_player_circle(2, [20])
+    Storage.set_game_state({"theme": "Running"}, guild_id=3)
+    Storage.set_guild_settings(2, game_time='09:30')
+    Storage.set_guild_settings(2, channel_id=555)
+    assert Storage.get_guild_settings(2) == {'channel_id': 555, 'game_time': '09:30'}
+    assert sorted(Storage.get_scheduled_guilds('17:00', '17:00')) == [1, 3]
+    assert Storage.get_scheduled_guilds('09:30', '17:00') == [2]
+    Storage.set_player_circle(2, [])
+
+def _play(guild_id, date, players, submitted):
+    state = {"theme": f"Theme {date}", "date": date, "user_ids": players}
+    Storage.set_game_state(state, guild_id=guild_id)
+    for uid in submitted:
+        Storage.record_submission(state["game_id"], uid, f"http://img/{date}/{uid}.png")
+    Storage.set_game_state({}, guild_id=guild_id)
+    return state["game_id"]
+
+def test_finished_games_are_archived_and_paginated():
+    Storage.clear_all()
+    for day in range(1, 8):
+        _play(1, f"2025-01-0{day}", [1, 2], [1] if day % 2 else [1, 2])
+    _play(2, "2025-01-03", [1, 3], [3])
+    page, cursor = Storage.get_game_history(guild_id=1, limit=3)
+    assert [game["date"] for game in page] == ["2025-01-07", "2025-01-06", "2025-01-05"]
+    assert page[1]["submissions"] == {1: "http://img/2025-01-06/1.png", 2: "http://img/2025-01-06/2.png"}
+    assert (page[0]["players"], page[0]["submissions"]) == (2, {1: "http://img/2025-01-07/1.png"})
+    seen = [game["date"] for game in page]
+    while cursor:
+        page, cursor = Storage.get_game_history(guild_id=1, limit=3, before=cursor)
+        seen += [game["date"] for game in page]
+    assert seen == [f"2025-01-0{day}" for day in range(7, 0, -1)]
+    # A player's own games, across guilds, with what they submitted
+    page, cursor = Storage.get_game_history(user_id=2, since="2025-01-03", until="2025-01-05")
+    assert [(game["date"], game["image_url"]) for game in page] == [
+        ("2025-01-05", None), ("2025-01-04", "http://img/2025-01-04/2.png"), ("2025-01-03", None)]
+    assert cursor is None
+    page, _ = Storage.get_game_history(user_id=3)
+    assert [(game["guild_id"], game["theme"]) for game in page] == [(2, "Theme 2025-01-03")]
+
+def test_submission_image_hash_is_kept_in_the_archive():
+    Storage.clear_all()
+    state = {"theme": "Owls", "date": "2025-02-01", "user_ids": [1, 2]}
+    Storage.set_game_state(state, guild_id=4)
+    Storage.record_submission(state["game_id"], 1, "http://img/1.png")
+    Storage.record_submission(state["game_id"], 2, "http://img/2.png")
+    Storage.set_submission_image_hash(state["game_id"], 1, "ab" * 32)
+    assert Storage.get_submission_image_hashes(state["game_id"]) == {1: "ab" * 32}
+    Storage.set_game_state({}, guild_id=4)
+    page, _ = Storage.get_game_history(guild_id=4, user_id=1)
+    assert (page[0]["image_url"], page[0]["image_hash"]) == ("http://img/1.png", "ab" * 32)
+    page, _ = Storage.get_game_history(guild_id=4, user_id=2)
+    assert page[0]["image_hash"] is None
+
+def test_history_queries_use_indexes():
+    conn = Storage._get_conn()
+    queries = [
+        ('SELECT game_id FROM archived_games WHERE guild_id=? AND (date<? OR (date=? AND game_id<?)) '
+         'ORDER BY date DESC, game_id DESC LIMIT 11', (1, '2025-01-01', '2025-01-01', 5)),
+        ('SELECT game_id FROM archived_players WHERE guild_id=? AND user_id=? ORDER BY date DESC, game_id DESC LIMIT 11', (1, 2)),
+        ('SELECT game_id FROM archived_players WHERE user_id=? ORDER BY date DESC, game_id DESC LIMIT 11', (2,)),
+    ]
+    for sql, params in queries:
+        plan = ' '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params))
+        assert 'USING COVERING INDEX idx_archived' in plan
+        assert 'TEMP B-TREE' not in plan
+
+def test_leaderboard_is_maintained_when_games_settle():
+    Storage.clear_all()
+    Storage.reset_all_streaks(guild_id=9)
+    Storage.apply_streak_results([1, 2], [3], guild_id=9)
+    Storage.apply_streak_results([1], [2, 3], guild_id=9)
+    Storage.apply_streak_results([1, 3], [2], guild_id=9)
+    top = Storage.get_leaderboard(9, limit=2)
+    assert [entry['user_id'] for entry in top] == [1, 2]
+    assert top[0] == {'user_id': 1, 'games_played': 3, 'submissions': 3, 'streak': 3, 'best_streak': 3, 'participation': 1.0}
+    assert top[1]['participation'] == pytest.approx(1 / 3)
+    assert top[1]['best_streak'] == 1 and top[1]['streak'] == 0
+    by_streak = Storage.get_leaderboard(9, order_by='streak')
+    assert [(entry['user_id'], entry['streak']) for entry in by_streak] == [(1, 3), (3, 1), (2, 0)]
+    assert Storage.get_leaderboard(10) == []
+
+def test_leaderboard_reads_top_rows_from_an_index():
+    conn = Storage._get_conn()
+    for table, column in [('user_stats', 'submissions'), ('user_stats', 'best_streak'), ('user_streaks', 'streak')]:
+        sql = f'EXPLAIN QUERY PLAN SELECT user_id FROM {table} WHERE guild_id=? ORDER BY {column} DESC, user_id LIMIT 10'
+        plan = ' '.join(row[3] for row in conn.execute(sql, (9,)))
+        assert 'COVERING INDEX' in plan
+        assert 'TEMP B-TREE' not in plan
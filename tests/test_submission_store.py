@@ -0,0 +1,65 @@
+import asyncio
+import hashlib
+import os
+import time
+from circle_sketch.gallery.submission_store import SubmissionStore
+
+class FakeCdn:
+    def __init__(self, images):
+        self.images = images
+        self.downloads = []
+
+    async def fetch(self, url):
+        self.downloads.append(url)
+        await asyncio.sleep(0.01)
+        return self.images[url]
+
+def test_identical_images_are_stored_once(tmp_path):
+    cdn = FakeCdn({"url/a": b"same drawing", "url/b": b"same drawing", "url/c": b"other drawing"})
+    store = SubmissionStore(directory=str(tmp_path), fetch=cdn.fetch)
+
+    async def scenario():
+        return await asyncio.gather(*(store.save(url) for url in ["url/a", "url/b", "url/c"]))
+
+    hash_a, hash_b, hash_c = asyncio.run(scenario())
+    assert hash_a == hash_b == hashlib.sha256(b"same drawing").hexdigest()
+    assert hash_c != hash_a
+    files = [name for _, _, names in os.walk(tmp_path) for name in names]
+    assert sorted(files) == sorted([hash_a, hash_c])
+
+def test_kept_submissions_are_read_locally(tmp_path):
+    cdn = FakeCdn({"url/a": b"drawing"})
+    store = SubmissionStore(directory=str(tmp_path), fetch=cdn.fetch)
+
+    async def scenario():
+        saving = asyncio.ensure_future(store.save("url/a"))
+        # Asked for while the save is still downloading
+        first, second = await asyncio.gather(store.get_bytes("url/a"), store.save("url/a"))
+        await saving
+        return first, await store.get_bytes("url/a")
+
+    assert asyncio.run(scenario()) == (b"drawing", b"drawing")
+    assert cdn.downloads == ["url/a"]
+
+def test_remembered_hash_survives_a_restart(tmp_path):
+    cdn = FakeCdn({"url/a": b"drawing"})
+    image_hash = asyncio.run(SubmissionStore(directory=str(tmp_path), fetch=cdn.fetch).save("url/a"))
+    restarted = SubmissionStore(directory=str(tmp_path), fetch=cdn.fetch)
+    restarted.remember("url/a", image_hash)
+    # The URL has expired by now, but the local copy is used
+    cdn.images.clear()
+    assert asyncio.run(restarted.get_bytes("url/a")) == b"drawing"
+
+def test_prune_by_age_then_size(tmp_path):
+    images = {f"url/{i}": bytes([i]) * 100 for i in range(5)}
+    cdn = FakeCdn(images)
+    store = SubmissionStore(directory=str(tmp_path), retention_days=10, max_bytes=250, fetch=cdn.fetch)
+    hashes = [asyncio.run(store.save(f"url/{i}")) for i in range(5)]
+    now = time.time()
+    for i, image_hash in enumerate(hashes):
+        # url/0 is 20 days old, the rest progressively newer
+        age = 20 * 86400 if i == 0 else (5 - i) * 3600
+        os.utime(store.path(image_hash), (now - age, now - age))
+    assert store.prune(now=now) == (3, 300)
+    remaining = [image_hash for image_hash in hashes if os.path.exists(store.path(image_hash))]
+    assert remaining == hashes[3:]
@@ -0,0 +1,91 @@
+import asyncio
+from types import SimpleNamespace
+import discord
+from circle_sketch.gallery.card_store import card_fingerprint
+from circle_sketch.user_resolver import PlayerProfile, UserResolver, player_profile
+
+def make_user(user_id, name=None, avatar=None):
+    avatar = avatar or f"hash{user_id}"
+    return SimpleNamespace(id=user_id, display_name=name or f"Player {user_id}", display_avatar=SimpleNamespace(
+        key=avatar, with_size=lambda size: SimpleNamespace(url=f"avatars/{avatar}?size={size}")))
+
+class FakeBot:
+    def __init__(self, cached=(), rest=()):
+        self.cached = {uid: make_user(uid) for uid in cached}
+        self.rest = {uid: make_user(uid) for uid in rest}
+        self.fetched = []
+
+    def get_user(self, user_id):
+        return self.cached.get(user_id)
+
+    async def fetch_user(self, user_id):
+        self.fetched.append(user_id)
+        if user_id not in self.rest:
+            raise discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), "Unknown User")
+        return self.rest[user_id]
+
+class FakeGuild:
+    def __init__(self, members=(), queryable=()):
+        self.members = {uid: make_user(uid, name=f"Member {uid}") for uid in members}
+        self.queryable = {uid: make_user(uid, name=f"Queried {uid}") for uid in queryable}
+        self.queries = []
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+    async def query_members(self, user_ids, cache):
+        self.queries.append(list(user_ids))
+        return [self.queryable[uid] for uid in user_ids if uid in self.queryable]
+
+class Clock:
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_profile_has_what_the_gallery_uses():
+    assert player_profile(make_user(5, "Ann", "abc")) == PlayerProfile(5, "Ann", "abc", "avatars/abc?size=128")
+
+def test_gateway_cache_comes_before_rest():
+    bot = FakeBot(cached=[2], rest=[4])
+    guild = FakeGuild(members=[1], queryable=[3])
+    resolver = UserResolver()
+    profiles, failures = asyncio.run(resolver.resolve_many(bot, [1, 2, 3, 4, 5], guild=guild))
+    assert profiles[1].display_name == "Member 1"
+    assert profiles[3].display_name == "Queried 3"
+    assert sorted(profiles) == [1, 2, 3, 4]
+    assert list(failures) == [5] and isinstance(failures[5], discord.NotFound)
+    # One member query for everyone missing from the cache, REST only for the rest
+    assert guild.queries == [[3, 4, 5]]
+    assert sorted(bot.fetched) == [4, 5]
+    assert resolver.stats() == {'gateway_cache': 2, 'profile_cache': 0, 'member_query': 1, 'rest': 1, 'profiles': 4}
+
+def test_profiles_are_kept_for_the_ttl():
+    clock = Clock()
+    bot = FakeBot(rest=[7])
+    resolver = UserResolver(ttl=60, clock=clock)
+    asyncio.run(resolver.resolve(bot, 7))
+    clock.now = 59
+    assert asyncio.run(resolver.resolve(bot, 7)).id == 7
+    assert bot.fetched == [7]
+    clock.now = 61
+    asyncio.run(resolver.resolve(bot, 7))
+    assert bot.fetched == [7, 7]
+    assert resolver.stats()['profile_cache'] == 1
+    assert resolver.stats()['rest'] == 2
+
+def test_submission_and_game_end_agree_on_a_nicknamed_member():
+    dm_author = make_user(9, name="Global name", avatar="global")
+    bot = FakeBot()
+    bot.cached[9] = dm_author
+    guild = FakeGuild()
+    guild.members[9] = make_user(9, name="Server nickname", avatar="server")
+    resolver = UserResolver()
+    at_submission = asyncio.run(resolver.resolve(bot, 9, guild=guild))
+    at_game_end, _ = asyncio.run(resolver.resolve_many(bot, [9], guild=guild))
+    assert at_submission == at_game_end[9]
+    assert at_submission.display_name == "Server nickname"
+    assert card_fingerprint("card", at_submission, "url", "Owls", "2025-07-07") == \
+        card_fingerprint("card", at_game_end[9], "url", "Owls", "2025-07-07")
+    assert card_fingerprint("card", player_profile(dm_author), "url", "Owls", "2025-07-07") != \
+        card_fingerprint("card", at_game_end[9], "url", "Owls", "2025-07-07")